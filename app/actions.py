@@ -0,0 +1,86 @@
+from typing import Any, Dict, List
+
+from app.notifications import state_notifier
+from app.ws.offline_queue import offline_queue
+from config import DB
+
+ON_OFF = "devices.capabilities.on_off"
+
+
+def on_off_command(value: bool) -> Dict[str, Any]:
+    return {'action': 'turn_on' if value else 'turn_off'}
+
+
+class DevicePlan:
+    __slots__ = ("device_id", "owned", "caps")
+
+    def __init__(self, device_id: str, owned: bool):
+        self.device_id = device_id
+        self.owned = owned
+        self.caps: Dict[str, Any] = {}  # тип умения -> итоговое значение
+
+
+class ActionPlan:
+    """
+    План запроса action: по одной записи на устройство, сколько бы раз оно ни встретилось.
+    Повторы одного умения схлопываются (побеждает последнее значение), умения устройства
+    собираются в один кадр, так что устройство получает одну команду и отвечает одним ack.
+    """
+
+    def __init__(self):
+        self.devices: Dict[str, DevicePlan] = {}
+        self.collapsed = 0
+
+    @classmethod
+    def build(cls, devices: List[Dict[str, Any]], owned: set) -> "ActionPlan":
+        plan = cls()
+        for dev in devices:
+            dev_id = dev["id"]
+            entry = plan.devices.get(dev_id)
+            if entry is None:
+                entry = plan.devices[dev_id] = DevicePlan(dev_id, dev_id in owned)
+            for cap in dev.get("capabilities", []):
+                ctype = cap.get("type", "")
+                if ctype in entry.caps:
+                    plan.collapsed += 1
+                entry.caps[ctype] = bool(cap.get("state", {}).get("value"))
+        return plan
+
+    def frames(self) -> Dict[str, Dict[str, Any]]:
+        """device_id -> единственный кадр команды; устройства без поддерживаемых умений не трогаем."""
+        return {p.device_id: on_off_command(p.caps[ON_OFF])
+                for p in self.devices.values() if p.owned and ON_OFF in p.caps}
+
+    def results(self, errors: Dict[str, str | None]) -> List[Dict[str, Any]]:
+        """Ответ Алисе по ack; подтверждённое состояние сохраняется в DB."""
+        results = []
+        for p in self.devices.values():
+            if not p.owned:
+                # По спецификации лучше вернуть ошибку по устройству
+                results.append({"id": p.device_id, "error_code": "DEVICE_NOT_FOUND"})
+                continue
+
+            caps_results = []
+            for ctype, value in p.caps.items():
+                if ctype != ON_OFF:
+                    caps_results.append(
+                        {"type": ctype, "state": {"action_result": {"status": "ERROR", "error_code": "NOT_SUPPORTED"}}})
+                elif errors.get(p.device_id) is None:
+                    offline_queue.discard(p.device_id, ON_OFF)
+                    _store_on(p.device_id, value)
+                    caps_results.append({"type": ctype, "state": {"instance": "on", "action_result": {"status": "DONE"}}})
+                else:
+                    if errors[p.device_id] == "DEVICE_UNREACHABLE":
+                        # Устройство офлайн или не ответило: доставим при переподключении
+                        offline_queue.put(p.device_id, ON_OFF, on_off_command(value))
+                    caps_results.append({"type": ctype, "state": {
+                        "instance": "on", "action_result": {"status": "ERROR", "error_code": errors[p.device_id]}}})
+            results.append({"id": p.device_id, "capabilities": caps_results})
+        return results
+
+
+def _store_on(dev_id: str, value: bool):
+    d = DB["devices"][dev_id]
+    d["state"]["on"] = value
+    DB["devices"][dev_id] = d  # сохраняем изменение в хранилище
+    state_notifier.known_by_alice(d)
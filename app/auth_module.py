@@ -1,4 +1,3 @@
-import secrets
 from typing import Dict, Any
 
 from fastapi import HTTPException, APIRouter
@@ -6,26 +5,33 @@ from fastapi.params import Header
 from starlette.requests import Request
 from starlette.responses import JSONResponse, RedirectResponse, HTMLResponse
 
-from config import auth_codes, now, ensure_user_initialized, access_tokens, ACCESS_TTL, refresh_tokens, REFRESH_TTL
+from app.logger_module.utils import get_logger_factory
+from app.metrics import AUTH_FAILURES
+from app.tokens import token_service
+from config import ensure_user_initialized
 from config import DB
 
+get_logger = get_logger_factory(__name__)
+logger = get_logger()
+
 router = APIRouter()
 
 
 # ====== АУТЕНТИФИКАЦИЯ ДЛЯ АЛИСЫ ======
 def auth_yandex(authorization: str = Header(default="")) -> Dict[str, Any]:
     """
-    Ожидаем заголовок вида: Authorization: Bearer alice-demo
-    В реале тут ты проверяешь токен через OAuth/линковку аккаунта.
+    Ожидаем заголовок вида: Authorization: Bearer <access_token>,
+    выданный /token при линковке аккаунта.
     """
-    print(authorization)
     if not authorization.startswith("Bearer "):
+        AUTH_FAILURES.labels("alice", "missing_bearer").inc()
         raise HTTPException(status_code=401, detail="Missing Bearer token")
     token = authorization.split(" ", 1)[1].strip()
-    user_id = DB["tokens"].get(token)
+    user_id = token_service.user_id(token)
     if not user_id:
+        AUTH_FAILURES.labels("alice", "invalid_token").inc()
         raise HTTPException(status_code=401, detail="Invalid token")
-    return DB["users"][user_id]
+    return DB["users"].get(user_id) or {"id": user_id, "name": user_id}
 
 
 # ====== ЭНДПОИНТЫ АЛИСЫ ======
@@ -65,13 +71,7 @@ async def authorize(request: Request):
         return HTMLResponse(html)
 
     # «Логин успешен» -> выдаём одноразовый code
-    code = secrets.token_urlsafe(24)
-    auth_codes[code] = {
-        "user_id": username,
-        "client_id": client_id,
-        "redirect_uri": redirect_uri,
-        "exp": now() + 600,  # 10 минут
-    }
+    code = token_service.issue_code(username, client_id, redirect_uri)
     sep = "&" if "?" in redirect_uri else "?"
     location = f"{redirect_uri}{sep}code={code}" + (f"&state={state}" if state else "")
     return RedirectResponse(location, status_code=302)
@@ -80,66 +80,29 @@ async def authorize(request: Request):
 # --------- OAUTH2: /token + /token/refresh ---------
 @router.post("/token")
 async def token(request: Request):
-    print('Алиса сделала запрос на сервер!')
     form = dict(await request.form())
     grant_type = form.get("grant_type")
+    # Форма целиком не логируется: в ней client_secret и код авторизации
+    logger.info("Token request: grant_type=%s", grant_type)
     client_id = form.get("client_id")
     client_secret = form.get("client_secret")
 
     if client_id != 'my-smart-home' or client_secret != 'supersecret123':
+        AUTH_FAILURES.labels("oauth", "invalid_client").inc()
         raise HTTPException(status_code=401, detail="Invalid client")
 
     if grant_type == "authorization_code":
-        code = form.get("code")
-        data = auth_codes.pop(code, None)
-        if not data or data["exp"] < now():
+        data = token_service.consume_code(form.get("code"), client_id)
+        if not data:
+            AUTH_FAILURES.labels("oauth", "invalid_code").inc()
             raise HTTPException(status_code=400, detail="Invalid or expired code")
 
-        user_id = data["user_id"]
-        ensure_user_initialized(user_id)
-        access = 'alice-demo'
-        refresh = 'alice-demo'
-        access_tokens[access] = {
-            "user_id": user_id, "client_id": client_id,
-            "exp": now() + ACCESS_TTL, "refresh_token": refresh
-        }
-        refresh_tokens[refresh] = {
-            "user_id": user_id, "client_id": client_id,
-            "exp": now() + REFRESH_TTL
-        }
-        return JSONResponse({
-            "token_type": "bearer",
-            "access_token": access,
-            "expires_in": ACCESS_TTL,
-            "refresh_token": refresh,
-            "scope": "devices"
-        })
+        ensure_user_initialized(data["user_id"])
+        return JSONResponse(token_service.issue_pair(data["user_id"], client_id))
 
     elif grant_type == "refresh_token":
         # допускаем refresh и тут (на случай если Яндекс будет слать сюда)
-        refresh = form.get("refresh_token")
-        info = refresh_tokens.get(refresh)
-        if not info or info["exp"] < now():
-            raise HTTPException(status_code=400, detail="Invalid or expired refresh_token")
-
-        user_id = info["user_id"]
-        access = 'alice-demo'
-        new_refresh = 'alice-demo'
-        access_tokens[access] = {
-            "user_id": user_id, "client_id": client_id,
-            "exp": now() + ACCESS_TTL, "refresh_token": new_refresh
-        }
-        refresh_tokens[new_refresh] = {
-            "user_id": user_id, "client_id": client_id,
-            "exp": now() + REFRESH_TTL
-        }
-        return JSONResponse({
-            "token_type": "bearer",
-            "access_token": access,
-            "expires_in": ACCESS_TTL,
-            "refresh_token": new_refresh,
-            "scope": "devices"
-        })
+        return _refresh(form.get("refresh_token"), client_id)
 
     else:
         raise HTTPException(status_code=400, detail="Unsupported grant_type")
@@ -148,18 +111,21 @@ async def token(request: Request):
 @router.post("/token/refresh")
 async def token_refresh(request: Request):
     form = dict(await request.form())
-    print(form)
     client_id = form.get("client_id")
+    logger.debug("Token refresh from client %s", client_id)
     client_secret = form.get("client_secret")
     refresh = form.get("refresh_token")
 
     if client_id != 'my-smart-home' or client_secret != 'supersecret123':
+        AUTH_FAILURES.labels("oauth", "invalid_client").inc()
         raise HTTPException(status_code=401, detail="Invalid client")
 
-    return JSONResponse({
-        "token_type": "bearer",
-        "access_token": 'alice-demo',
-        "expires_in": ACCESS_TTL,
-        "refresh_token": 'alice-demo',
-        "scope": "devices"
-    })
+    return _refresh(refresh, client_id)
+
+
+def _refresh(refresh: str | None, client_id: str) -> JSONResponse:
+    pair = token_service.rotate(refresh, client_id) if refresh else None
+    if not pair:
+        AUTH_FAILURES.labels("oauth", "invalid_refresh_token").inc()
+        raise HTTPException(status_code=400, detail="Invalid or expired refresh_token")
+    return JSONResponse(pair)
@@ -0,0 +1,47 @@
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable
+
+from app.ws.command_tracker import CommandError
+
+# Обработчик команды на воркере-владельце сокета: (device_id, data, timeout) -> ack
+CommandHandler = Callable[[str, dict, float], Awaitable[dict]]
+
+
+class Broker(ABC):
+    """
+    Маршрутизация команд между воркерами uvicorn.
+    Сокет устройства живёт в одном воркере; таблица присутствия говорит, в каком.
+    HTTP-воркер, к которому пришла Алиса, пересылает команду владельцу и ждёт ack.
+    """
+
+    def __init__(self, worker_id: str):
+        self.worker_id = worker_id
+
+    @abstractmethod
+    async def start(self, handler: CommandHandler):
+        ...
+
+    async def close(self):
+        pass
+
+    @abstractmethod
+    async def register(self, device_id: str):
+        ...
+
+    @abstractmethod
+    async def unregister(self, device_id: str):
+        ...
+
+    @abstractmethod
+    async def owner(self, device_id: str) -> str | None:
+        ...
+
+    @abstractmethod
+    async def forward(self, worker_id: str, device_id: str, data: dict, timeout: float) -> dict:
+        ...
+
+    async def route(self, device_id: str, data: dict, timeout: float) -> dict:
+        owner = await self.owner(device_id)
+        if owner is None or owner == self.worker_id:
+            raise CommandError("DEVICE_UNREACHABLE", f"{device_id}: offline")
+        return await self.forward(owner, device_id, data, timeout)
@@ -0,0 +1,17 @@
+import os
+import socket
+
+from app.broker.base import Broker
+from app.broker.local import LocalBroker
+from app.broker.presence import SQLitePresence
+from app.broker.unix_socket import UnixSocketBroker
+from config import BrokerSettings
+
+
+def create_broker(settings: BrokerSettings) -> Broker:
+    worker_id = settings.worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    if settings.backend == "local":
+        return LocalBroker(worker_id)
+    if settings.backend == "unix":
+        return UnixSocketBroker(worker_id, settings.socket_dir, SQLitePresence(settings.presence_path))
+    raise ValueError(f"Unknown broker backend: {settings.backend}")
@@ -0,0 +1,42 @@
+from app.broker.base import Broker, CommandHandler
+from app.ws.command_tracker import CommandError
+
+
+class LocalHub:
+    """Общая таблица присутствия и обработчиков для брокеров одного процесса."""
+
+    def __init__(self):
+        self.presence: dict[str, str] = {}
+        self.handlers: dict[str, CommandHandler] = {}
+
+
+class LocalBroker(Broker):
+    """In-process бэкенд: один воркер (по умолчанию) или несколько «воркеров» в тестах."""
+
+    def __init__(self, worker_id: str, hub: LocalHub | None = None):
+        super().__init__(worker_id)
+        self.hub = hub or LocalHub()
+
+    async def start(self, handler: CommandHandler):
+        self.hub.handlers[self.worker_id] = handler
+
+    async def close(self):
+        self.hub.handlers.pop(self.worker_id, None)
+        for device_id in [d for d, w in self.hub.presence.items() if w == self.worker_id]:
+            del self.hub.presence[device_id]
+
+    async def register(self, device_id: str):
+        self.hub.presence[device_id] = self.worker_id
+
+    async def unregister(self, device_id: str):
+        if self.hub.presence.get(device_id) == self.worker_id:
+            del self.hub.presence[device_id]
+
+    async def owner(self, device_id: str) -> str | None:
+        return self.hub.presence.get(device_id)
+
+    async def forward(self, worker_id: str, device_id: str, data: dict, timeout: float) -> dict:
+        handler = self.hub.handlers.get(worker_id)
+        if handler is None:
+            raise CommandError("DEVICE_UNREACHABLE", f"{device_id}: worker {worker_id} is gone")
+        return await handler(device_id, data, timeout)
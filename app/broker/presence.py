@@ -0,0 +1,107 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from app.logger_module.utils import get_logger_factory
+
+get_logger = get_logger_factory(__name__)
+logger = get_logger()
+
+_STOP = object()
+
+
+class SQLitePresence:
+    """
+    Таблица присутствия device_id -> worker_id в общем файле SQLite.
+    Её видят все воркеры одной машины; запись удаляется только её владельцем,
+    чтобы поздний disconnect старого воркера не стёр свежее подключение.
+
+    set / delete не ждут SQLite: операции уходят в очередь, а поток записи
+    применяет всё накопившееся одной транзакцией в порядке постановки (disconnect
+    и следующий connect одного устройства не переставляются). Ожидание блокировки
+    WAL соседними воркерами (timeout) достаётся этому потоку, а не event loop.
+    get читает через своё соединение (в WAL читатель не ждёт писателя) и вместе
+    с flush блокирует — из async-кода их вызывают через asyncio.to_thread.
+    """
+
+    def __init__(self, path: str, busy_timeout: float = 5):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=busy_timeout)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS presence ("
+            " device_id TEXT PRIMARY KEY, worker_id TEXT NOT NULL, updated REAL NOT NULL)"
+        )
+        self._read_lock = threading.Lock()
+        self._reader = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=busy_timeout)
+        self.batches = 0
+        self._ops: queue.SimpleQueue = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._write, name="presence-writer", daemon=True)
+        self._writer.start()
+
+    def set(self, device_id: str, worker_id: str):
+        self._ops.put(("INSERT INTO presence (device_id, worker_id, updated) VALUES (?, ?, ?) "
+                       "ON CONFLICT (device_id) DO UPDATE SET worker_id = excluded.worker_id, updated = excluded.updated",
+                       (device_id, worker_id, time.time())))
+
+    def delete(self, device_id: str, worker_id: str):
+        self._ops.put(("DELETE FROM presence WHERE device_id = ? AND worker_id = ?", (device_id, worker_id)))
+
+    def get(self, device_id: str) -> str | None:
+        with self._read_lock:
+            row = self._reader.execute("SELECT worker_id FROM presence WHERE device_id = ?", (device_id,)).fetchone()
+        return row[0] if row else None
+
+    def clear_worker(self, worker_id: str):
+        self._ops.put(("DELETE FROM presence WHERE worker_id = ?", (worker_id,)))
+        self.flush()
+
+    def flush(self):
+        """Ждёт, пока поток запишет всё поставленное до вызова."""
+        done = threading.Event()
+        self._ops.put(done)
+        done.wait()
+
+    def close(self):
+        if self._writer.is_alive():
+            self._ops.put(_STOP)
+            self._writer.join()
+        with self._lock:
+            self._conn.close()
+        with self._read_lock:
+            self._reader.close()
+
+    def _write(self):
+        while True:
+            batch = [self._ops.get()]
+            while True:
+                try:
+                    batch.append(self._ops.get_nowait())
+                except queue.Empty:
+                    break
+            statements = [op for op in batch if isinstance(op, tuple)]
+            if statements:
+                self._apply(statements)
+            for op in batch:
+                if isinstance(op, threading.Event):
+                    op.set()
+            if _STOP in batch:
+                return
+
+    def _apply(self, statements: list[tuple[str, tuple]]):
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                for sql, params in statements:
+                    self._conn.execute(sql, params)
+                self._conn.execute("COMMIT")
+                self.batches += 1
+            except sqlite3.Error:
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                # Присутствие восстановится при следующем подключении; поток записи не должен падать
+                logger.exception(f"[broker] Presence write of {len(statements)} ops failed")
@@ -0,0 +1,173 @@
+import asyncio
+import itertools
+import json
+import os
+
+from app.broker.base import Broker, CommandHandler
+from app.broker.presence import SQLitePresence
+from app.logger_module.utils import get_logger_factory
+from app.ws.command_tracker import CommandError
+
+get_logger = get_logger_factory(__name__)
+logger = get_logger()
+
+
+class _PeerConnection:
+    """Одно постоянное соединение к соседнему воркеру; запросы мультиплексируются по rid."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.pending: dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self._reader_task = asyncio.create_task(self._read_loop())
+
+    @property
+    def closed(self) -> bool:
+        return self._reader_task.done()
+
+    async def request(self, device_id: str, data: dict, timeout: float) -> dict:
+        rid = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[rid] = future
+        try:
+            line = json.dumps({"rid": rid, "device_id": device_id, "data": data, "timeout": timeout})
+            self.writer.write(line.encode() + b"\n")
+            await self.writer.drain()
+            # Небольшой запас: таймаут ack отсчитывает воркер-владелец
+            return await asyncio.wait_for(future, timeout + 0.5)
+        except asyncio.TimeoutError:
+            raise CommandError("DEVICE_UNREACHABLE", f"{device_id}: no reply from owner worker")
+        except (ConnectionError, OSError) as e:
+            raise CommandError("DEVICE_UNREACHABLE", f"{device_id}: {e}")
+        finally:
+            self.pending.pop(rid, None)
+
+    async def _read_loop(self):
+        try:
+            while line := await self.reader.readline():
+                reply = json.loads(line)
+                future = self.pending.get(reply["rid"])
+                if future is None or future.done():
+                    continue
+                if "error_code" in reply:
+                    future.set_exception(CommandError(reply["error_code"]))
+                else:
+                    future.set_result(reply["ack"])
+        finally:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(CommandError("DEVICE_UNREACHABLE", "owner worker disconnected"))
+
+    def close(self):
+        self._reader_task.cancel()
+        self.writer.close()
+
+
+class UnixSocketBroker(Broker):
+    """
+    Бэкенд для нескольких воркеров на одной машине: каждый воркер слушает
+    {socket_dir}/{worker_id}.sock, присутствие хранится в общем SQLite.
+    Протокол — JSON-строки: {"rid", "device_id", "data", "timeout"} -> {"rid", "ack" | "error_code"}.
+    """
+
+    def __init__(self, worker_id: str, socket_dir: str, presence: SQLitePresence):
+        super().__init__(worker_id)
+        self.socket_dir = socket_dir
+        self.presence = presence
+        self._handler: CommandHandler | None = None
+        self._server: asyncio.AbstractServer | None = None
+        self._peers: dict[str, _PeerConnection] = {}
+        self._clients: dict[asyncio.StreamWriter, asyncio.Task] = {}
+        self._connecting: dict[str, asyncio.Lock] = {}
+
+    def _path(self, worker_id: str) -> str:
+        return os.path.join(self.socket_dir, f"{worker_id}.sock")
+
+    async def start(self, handler: CommandHandler):
+        self._handler = handler
+        os.makedirs(self.socket_dir, exist_ok=True)
+        path = self._path(self.worker_id)
+        if os.path.exists(path):
+            os.unlink(path)
+        # Записи прошлой жизни воркера с тем же id больше не действительны
+        await asyncio.to_thread(self.presence.clear_worker, self.worker_id)
+        self._server = await asyncio.start_unix_server(self._serve, path)
+
+    async def close(self):
+        for peer in self._peers.values():
+            peer.close()
+        self._peers.clear()
+        if self._server is not None:
+            self._server.close()
+            # Закрываем входящие соединения сами: обработчики выходят по EOF, без отмены задач
+            for writer in list(self._clients):
+                writer.close()
+            await asyncio.gather(*self._clients.values(), return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+        await asyncio.to_thread(self.presence.clear_worker, self.worker_id)
+        path = self._path(self.worker_id)
+        if os.path.exists(path):
+            os.unlink(path)
+
+    async def register(self, device_id: str):
+        # Только постановка в очередь потока записи (SQLitePresence)
+        self.presence.set(device_id, self.worker_id)
+
+    async def unregister(self, device_id: str):
+        self.presence.delete(device_id, self.worker_id)
+
+    async def owner(self, device_id: str) -> str | None:
+        return await asyncio.to_thread(self.presence.get, device_id)
+
+    async def forward(self, worker_id: str, device_id: str, data: dict, timeout: float) -> dict:
+        try:
+            peer = await self._peer(worker_id)
+        except (ConnectionError, FileNotFoundError, OSError) as e:
+            # Воркер-владелец умер, не успев убрать свои записи
+            logger.warning(f"[broker] Worker {worker_id} is unreachable: {e}")
+            self.presence.delete(device_id, worker_id)
+            raise CommandError("DEVICE_UNREACHABLE", f"{device_id}: worker {worker_id} is gone")
+        return await peer.request(device_id, data, timeout)
+
+    async def _peer(self, worker_id: str) -> _PeerConnection:
+        peer = self._peers.get(worker_id)
+        if peer is not None and not peer.closed:
+            return peer
+        lock = self._connecting.setdefault(worker_id, asyncio.Lock())
+        async with lock:
+            peer = self._peers.get(worker_id)
+            if peer is None or peer.closed:
+                reader, writer = await asyncio.open_unix_connection(self._path(worker_id))
+                peer = self._peers[worker_id] = _PeerConnection(reader, writer)
+        return peer
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._clients[writer] = asyncio.current_task()
+        tasks = set()
+        try:
+            while line := await reader.readline():
+                task = asyncio.create_task(self._execute(json.loads(line), writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except ConnectionError:
+            pass
+        finally:
+            self._clients.pop(writer, None)
+            writer.close()
+
+    async def _execute(self, request: dict, writer: asyncio.StreamWriter):
+        reply = {"rid": request["rid"]}
+        try:
+            reply["ack"] = await self._handler(request["device_id"], request["data"], request["timeout"])
+        except CommandError as e:
+            reply["error_code"] = e.error_code
+        except Exception as e:
+            logger.exception(f"[broker] Forwarded command for {request['device_id']} failed: {e}")
+            reply["error_code"] = "INTERNAL_ERROR"
+        try:
+            writer.write(json.dumps(reply).encode() + b"\n")
+            await writer.drain()
+        except ConnectionError:
+            pass
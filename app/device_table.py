@@ -0,0 +1,91 @@
+from array import array
+from collections.abc import Mapping
+from typing import Any, Iterator
+
+
+class DeviceTable:
+    """
+    Компактная таблица подключённых к воркеру устройств: параллельные массивы,
+    строка адресуется целым slot, который выдаётся при attach и освобождается при detach.
+    Здесь живут время последнего pong и сам WebSocket — вместо словарей active, last_pong
+    и slot_of у менеджера и heartbeat. Описание устройства (владелец, умения, состояние)
+    по-прежнему читается из DB["devices"] и сюда не копируется.
+    """
+
+    def __init__(self):
+        self.index: dict[str, int] = {}  # device_id -> slot
+        self.device_ids: list[str | None] = []
+        self.last_pong = array("d")
+        self.conn: list[Any] = []
+        self.connected = 0
+        self._free: list[int] = []
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def slot(self, device_id: str) -> int | None:
+        return self.index.get(device_id)
+
+    def attach(self, device_id: str) -> int:
+        """Возвращает строку устройства, заводя её при первом подключении."""
+        slot = self.index.get(device_id)
+        if slot is None:
+            if self._free:
+                slot = self._free.pop()
+                self.device_ids[slot] = device_id
+            else:
+                slot = len(self.device_ids)
+                self.device_ids.append(device_id)
+                self.last_pong.append(0.0)
+                self.conn.append(None)
+            self.index[device_id] = slot
+        return slot
+
+    def detach(self, device_id: str):
+        slot = self.index.pop(device_id, None)
+        if slot is None:
+            return
+        if self.conn[slot] is not None:
+            self.connected -= 1
+        self.device_ids[slot] = None
+        self.conn[slot] = None
+        self.last_pong[slot] = 0.0
+        self._free.append(slot)
+
+    def set_conn(self, slot: int, ws: Any):
+        if (self.conn[slot] is None) != (ws is None):
+            self.connected += 1 if ws is not None else -1
+        self.conn[slot] = ws
+
+
+class ConnectionView(Mapping):
+    """device_id -> WebSocket поверх DeviceTable (прежний интерфейс DeviceWebSocketManager.active)."""
+
+    def __init__(self, table: DeviceTable):
+        self.table = table
+
+    def __getitem__(self, device_id: str):
+        slot = self.table.index.get(device_id)
+        ws = self.table.conn[slot] if slot is not None else None
+        if ws is None:
+            raise KeyError(device_id)
+        return ws
+
+    def get(self, device_id: str, default=None):
+        slot = self.table.index.get(device_id)
+        ws = self.table.conn[slot] if slot is not None else None
+        return default if ws is None else ws
+
+    def __contains__(self, device_id) -> bool:
+        slot = self.table.index.get(device_id)
+        return slot is not None and self.table.conn[slot] is not None
+
+    def __iter__(self) -> Iterator[str]:
+        conn = self.table.conn
+        return (d for d, slot in list(self.table.index.items()) if conn[slot] is not None)
+
+    def __len__(self) -> int:
+        return self.table.connected
+
+
+device_table = DeviceTable()
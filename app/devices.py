@@ -0,0 +1,80 @@
+from typing import Any, Dict, List
+
+from app.groups import group_engine
+from app.notifications import state_notifier
+from app.ws.credentials import device_credentials
+from app.yandex_format import invalidate_device
+from config import DB
+
+# Вторичный индекс DB["owner_devices"]: owner_id -> [device_id, ...].
+# Все изменения устройств идут через функции ниже, чтобы индекс не разъезжался с DB["devices"].
+
+
+def device_ids_of(owner_id: str) -> List[str]:
+    return DB["owner_devices"].get(owner_id, [])
+
+
+def devices_of(owner_id: str) -> List[Dict[str, Any]]:
+    devices = DB["devices"]
+    return [d for d in (devices.get(dev_id) for dev_id in device_ids_of(owner_id)) if d]
+
+
+def add_device(device: Dict[str, Any]):
+    dev_id = device["id"]
+    old = DB["devices"].get(dev_id)
+    if old and old["owner_id"] != device["owner_id"]:
+        _unlink(old["owner_id"], dev_id)
+    DB["devices"][dev_id] = device
+    invalidate_device(dev_id)
+    group_engine.invalidate_device(dev_id)
+    _link(device["owner_id"], dev_id)
+
+
+def remove_device(dev_id: str):
+    device = DB["devices"].get(dev_id)
+    if not device:
+        return
+    _unlink(device["owner_id"], dev_id)
+    del DB["devices"][dev_id]
+    device_credentials.revoke(dev_id)
+    state_notifier.forget(dev_id)
+    invalidate_device(dev_id)
+    group_engine.invalidate_device(dev_id)
+
+
+def transfer_device(dev_id: str, new_owner_id: str):
+    device = DB["devices"][dev_id]
+    if device["owner_id"] == new_owner_id:
+        return
+    _unlink(device["owner_id"], dev_id)
+    device["owner_id"] = new_owner_id
+    DB["devices"][dev_id] = device
+    state_notifier.forget(dev_id)  # Алиса нового владельца этого состояния не видела
+    group_engine.invalidate_device(dev_id)
+    _link(new_owner_id, dev_id)
+
+
+def rebuild_owner_index():
+    """Пересобирает индекс полным проходом по DB["devices"] (миграция, ремонт)."""
+    index: Dict[str, List[str]] = {}
+    for dev_id, device in DB["devices"].items():
+        index.setdefault(device["owner_id"], []).append(dev_id)
+    for owner_id in list(DB["owner_devices"]):
+        if owner_id not in index:
+            del DB["owner_devices"][owner_id]
+    for owner_id, ids in index.items():
+        DB["owner_devices"][owner_id] = ids
+
+
+def _link(owner_id: str, dev_id: str):
+    ids = device_ids_of(owner_id)
+    if dev_id not in ids:
+        DB["owner_devices"][owner_id] = ids + [dev_id]
+
+
+def _unlink(owner_id: str, dev_id: str):
+    ids = [i for i in device_ids_of(owner_id) if i != dev_id]
+    if ids:
+        DB["owner_devices"][owner_id] = ids
+    elif owner_id in DB["owner_devices"]:
+        del DB["owner_devices"][owner_id]
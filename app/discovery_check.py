@@ -1,16 +1,12 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 from starlette.requests import Request
 
-from config import require_bearer, user_by_token
+from app.tokens import token_service
+from config import require_bearer
 
 router = APIRouter()
 
 
-@router.get("/v1.0/user/devices", tags=['check'])
-async def unlink():
-    return {"status": "ok"}
-
-
 @router.get("/v1.0/user/devices/action")
 async def unlink():
     return {"status": "ok"}
@@ -34,5 +30,7 @@ async def check():
 @router.get("/user/info")
 async def user_info(request: Request):
     token = require_bearer(request)
-    uid = user_by_token(token)
+    uid = token_service.user_id(token)
+    if not uid:
+        raise HTTPException(status_code=401, detail="Token expired or invalid")
     return {"user_id": uid}
\ No newline at end of file
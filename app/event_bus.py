@@ -0,0 +1,192 @@
+import asyncio
+import inspect
+import time
+from typing import Any, Callable
+
+from app.logger_module.utils import get_logger_factory
+from app.metrics import EVENT_HANDLER_ERRORS, EVENT_HANDLER_LATENCY
+
+get_logger = get_logger_factory(__name__)
+logger = get_logger()
+
+
+class HandlerStats:
+    """Задержка и ошибки обработчика — дочерние метрики event_bus_handler_* с метками (событие, обработчик)."""
+    __slots__ = ("latency", "errors", "max_time")
+
+    def __init__(self, event: str, handler: Callable):
+        name = handler_name(handler)
+        self.latency = EVENT_HANDLER_LATENCY.labels(event, name)
+        self.errors = EVENT_HANDLER_ERRORS.labels(event, name)
+        self.max_time = 0.0
+
+    def observe(self, elapsed: float):
+        self.latency.observe(elapsed)
+        if elapsed > self.max_time:
+            self.max_time = elapsed
+
+
+def handler_name(handler: Callable) -> str:
+    return f"{getattr(handler, '__module__', '')}.{getattr(handler, '__qualname__', repr(handler))}"
+
+
+class _Topic:
+    def __init__(self, name: str, workers: int, queue_size: int):
+        self.name = name
+        self.workers = workers
+        self.queue_size = queue_size
+        self.handlers: list[Callable] = []
+        self.stats: dict[Callable, HandlerStats] = {}
+        self.queues: list[asyncio.Queue] = []
+        self.tasks: list[asyncio.Task] = []
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.processed = 0
+        self.dropped = 0
+        self.max_depth = 0
+
+    def depth(self) -> int:
+        return sum(q.qsize() for q in self.queues)
+
+
+class EventBus:
+    """
+    Шина событий с API как у pyee (on / emit), но без бесконечных fire-and-forget задач.
+
+    У каждого события свои ограниченные очереди и свои воркеры (configure).
+    Событие раскладывается по воркерам по первому аргументу (обычно device_id),
+    поэтому события одного устройства обрабатываются строго по порядку.
+    emit() не ждёт: при полной очереди событие отбрасывается и считается в dropped.
+    await publish() при полной очереди ждёт места — это и есть backpressure для источника.
+    """
+
+    def __init__(self, default_workers: int = 1, default_queue_size: int = 1000):
+        self.default_workers = default_workers
+        self.default_queue_size = default_queue_size
+        self._topics: dict[str, _Topic] = {}
+
+    def configure(self, event: str, workers: int | None = None, queue_size: int | None = None):
+        topic = self._topic(event)
+        if topic.tasks:
+            raise RuntimeError(f"Event '{event}' is already running, configure it before the first emit")
+        topic.workers = workers or topic.workers
+        topic.queue_size = queue_size or topic.queue_size
+
+    def on(self, event: str, f: Callable | None = None):
+        def register(handler: Callable) -> Callable:
+            topic = self._topic(event)
+            topic.handlers.append(handler)
+            topic.stats[handler] = HandlerStats(event, handler)
+            return handler
+
+        return register if f is None else register(f)
+
+    def remove_listener(self, event: str, f: Callable):
+        topic = self._topics.get(event)
+        if topic and f in topic.handlers:
+            topic.handlers.remove(f)
+            topic.stats.pop(f, None)
+
+    def emit(self, event: str, *args: Any, **kwargs: Any) -> bool:
+        topic = self._topics.get(event)
+        if topic is None or not topic.handlers:
+            return False
+        queue = self._queue_for(topic, args)
+        try:
+            queue.put_nowait((args, kwargs))
+        except asyncio.QueueFull:
+            topic.dropped += 1
+            if topic.dropped % 1000 == 1:
+                logger.warning(f"[event_bus] Queue of '{event}' is full, dropped {topic.dropped} event(s)")
+            return False
+        self._track_depth(topic)
+        return True
+
+    async def publish(self, event: str, *args: Any, **kwargs: Any) -> bool:
+        topic = self._topics.get(event)
+        if topic is None or not topic.handlers:
+            return False
+        await self._queue_for(topic, args).put((args, kwargs))
+        self._track_depth(topic)
+        return True
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        return {
+            name: {
+                "workers": topic.workers,
+                "queue_size": topic.queue_size,
+                "depth": topic.depth(),
+                "max_depth": topic.max_depth,
+                "processed": topic.processed,
+                "dropped": topic.dropped,
+                "handlers": {
+                    handler_name(h): {
+                        "calls": s.latency.count, "errors": int(s.errors.value),
+                        "avg_ms": s.latency.sum / s.latency.count * 1000 if s.latency.count else 0.0,
+                        "max_ms": s.max_time * 1000,
+                    }
+                    for h, s in topic.stats.items()
+                },
+            }
+            for name, topic in self._topics.items()
+        }
+
+    def depths(self) -> dict[str, int]:
+        return {name: topic.depth() for name, topic in self._topics.items()}
+
+    def dropped(self) -> dict[str, int]:
+        return {name: topic.dropped for name, topic in self._topics.items()}
+
+    async def close(self):
+        tasks = [t for topic in self._topics.values() for t in topic.tasks]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for topic in self._topics.values():
+            topic.tasks, topic.queues, topic.loop = [], [], None
+
+    def _topic(self, event: str) -> _Topic:
+        topic = self._topics.get(event)
+        if topic is None:
+            topic = self._topics[event] = _Topic(event, self.default_workers, self.default_queue_size)
+        return topic
+
+    def _queue_for(self, topic: _Topic, args: tuple) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if topic.loop is not loop:
+            self._start(topic, loop)
+        if topic.workers == 1:
+            return topic.queues[0]
+        return topic.queues[hash(args[0] if args else None) % topic.workers]
+
+    @staticmethod
+    def _track_depth(topic: _Topic):
+        depth = topic.depth()
+        if depth > topic.max_depth:
+            topic.max_depth = depth
+
+    def _start(self, topic: _Topic, loop: asyncio.AbstractEventLoop):
+        # Воркеры поднимаются лениво, при первом emit внутри работающего loop
+        per_worker = max(topic.queue_size // topic.workers, 1)
+        topic.loop = loop
+        topic.queues = [asyncio.Queue(per_worker) for _ in range(topic.workers)]
+        topic.tasks = [loop.create_task(self._worker(topic, q)) for q in topic.queues]
+
+    @staticmethod
+    async def _worker(topic: _Topic, queue: asyncio.Queue):
+        while True:
+            args, kwargs = await queue.get()
+            for handler in list(topic.handlers):
+                stats = topic.stats.get(handler)
+                started = time.perf_counter()
+                try:
+                    result = handler(*args, **kwargs)
+                    if inspect.isawaitable(result):
+                        await result
+                except Exception as e:
+                    if stats:
+                        stats.errors.inc()
+                    logger.exception(f"[event_bus] Handler {getattr(handler, '__qualname__', handler)} "
+                                     f"for '{topic.name}' failed: {e}")
+                if stats:
+                    stats.observe(time.perf_counter() - started)
+            topic.processed += 1
@@ -0,0 +1,211 @@
+import asyncio
+import time
+from typing import Any, Dict, List
+
+from app.actions import ON_OFF, ActionPlan, on_off_command
+from app.metrics import GROUP_EXECUTION, WS_MESSAGES_OUT
+from app.ws.command_tracker import CommandError, command_tracker
+from app.ws.framing import BinaryDeviceSocket, command_template
+from app.ws.outbound import OutboundSocket
+from app.ws.websocket_manager import DeviceWebSocketManager, device_ws_manager
+from config import DB, COMMAND_TIMEOUT
+
+# Группы хранятся под ключом group_key(owner_id, group_id): id выбирает клиент, и у разных
+# пользователей они совпадают. Вторичный индекс DB["owner_groups"]: owner_id -> [ключ группы, ...];
+# группы меняются только функциями ниже.
+# Группа — {"id", "owner_id", "name", "devices": [device_id, ...]}; сцена «выключить всё» — группа + значение.
+
+# (bin1?, вкл?) -> (метод сокета, начало, конец) кадра команды без id
+_TEMPLATES = {(binary, on): command_template(on_off_command(on)["action"], binary)
+              for binary in (False, True) for on in (False, True)}
+_OUT_COMMAND = WS_MESSAGES_OUT.labels("command")
+
+
+def group_key(owner_id: str, group_id: str) -> str:
+    return f"{owner_id}:{group_id}"
+
+
+def group_keys_of(owner_id: str) -> List[str]:
+    return DB["owner_groups"].get(owner_id, [])
+
+
+def groups_of(owner_id: str) -> List[Dict[str, Any]]:
+    groups = DB["groups"]
+    return [g for g in (groups.get(key) for key in group_keys_of(owner_id)) if g]
+
+
+def get_group(owner_id: str, group_id: str) -> Dict[str, Any] | None:
+    return DB["groups"].get(group_key(owner_id, group_id))
+
+
+def save_group(owner_id: str, group_id: str, name: str, device_ids: List[str]) -> Dict[str, Any]:
+    key = group_key(owner_id, group_id)
+    group = {"id": group_id, "owner_id": owner_id, "name": name, "devices": list(dict.fromkeys(device_ids))}
+    DB["groups"][key] = group
+    keys = group_keys_of(owner_id)
+    if key not in keys:
+        DB["owner_groups"][owner_id] = keys + [key]
+    group_engine.invalidate(key)
+    return group
+
+
+def delete_group(owner_id: str, group_id: str) -> bool:
+    key = group_key(owner_id, group_id)
+    if key not in DB["groups"]:
+        return False
+    keys = [k for k in group_keys_of(owner_id) if k != key]
+    if keys:
+        DB["owner_groups"][owner_id] = keys
+    elif owner_id in DB["owner_groups"]:
+        del DB["owner_groups"][owner_id]
+    del DB["groups"][key]
+    group_engine.invalidate(key)
+    return True
+
+
+class GroupPlan:
+    """
+    Собранный план группы. local — устройства с сокетом в этом воркере: (id, очередь OutboundSocket,
+    шаблоны кадров выкл/вкл); remote — остальные члены группы, им команда идёт обычным путём
+    (брокер или DEVICE_UNREACHABLE). actions — готовые ActionPlan на выкл/вкл: по ним строится
+    ответ, сохраняется состояние и откладываются недоставленные команды.
+    """
+    __slots__ = ("key", "devices", "local", "remote", "actions")
+
+    def __init__(self, key: str, devices: List[str], local: list, remote: List[str], actions: tuple):
+        self.key = key
+        self.devices = devices
+        self.local = local
+        self.remote = remote
+        self.actions = actions
+
+
+class GroupEngine:
+    """
+    Исполнение групп одним веером. При первом запуске группа компилируется в GroupPlan: проверка
+    владельца, поиск сокетов и шаблоны кадров делаются один раз, а не на каждое нажатие. Запуск —
+    кадры сразу в очереди всех устройств и одно ожидание всех ack с общим дедлайном, без задачи
+    и семафора на устройство.
+
+    План сбрасывается, когда меняется состав группы (save_group / delete_group), устройство
+    удалено или сменило владельца (app/devices.py) и когда любой член группы подключился
+    к воркеру или отключился (слушатель менеджера сокетов).
+    """
+
+    def __init__(self, manager: DeviceWebSocketManager):
+        self.manager = manager
+        self.compiled = 0
+        self._plans: Dict[str, GroupPlan] = {}  # ключ группы (group_key) -> план
+        self._by_device: Dict[str, set[str]] = {}  # device_id -> ключи групп с собранным планом
+        manager.listeners.append(self.invalidate_device)
+
+    def plan(self, key: str) -> GroupPlan | None:
+        plan = self._plans.get(key)
+        if plan is None:
+            group = DB["groups"].get(key)
+            if group is None:
+                return None
+            plan = self._plans[key] = self._compile(key, group)
+            for device_id in plan.devices:
+                self._by_device.setdefault(device_id, set()).add(key)
+        return plan
+
+    def invalidate(self, key: str):
+        plan = self._plans.pop(key, None)
+        if plan is None:
+            return
+        for device_id in plan.devices:
+            keys = self._by_device.get(device_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_device[device_id]
+
+    def invalidate_device(self, device_id: str):
+        for key in list(self._by_device.get(device_id, ())):
+            self.invalidate(key)
+
+    async def execute(self, owner_id: str, group_id: str, on: bool,
+                      timeout: float = COMMAND_TIMEOUT) -> List[Dict[str, Any]] | None:
+        """Включает/выключает группу владельца; ответ — как у action Алисы, по устройству. None — группы нет."""
+        key = group_key(owner_id, group_id)
+        cached = key in self._plans
+        plan = self.plan(key)
+        if plan is None:
+            return None
+        started = time.perf_counter()
+        errors = await self._fan_out(plan, on, timeout)
+        GROUP_EXECUTION.labels("cached" if cached else "compiled").observe(time.perf_counter() - started)
+        return plan.actions[on].results(errors)
+
+    def _compile(self, key: str, group: Dict[str, Any]) -> GroupPlan:
+        self.compiled += 1
+        devices = DB["devices"]
+        members, local, remote = [], [], []
+        for device_id in group["devices"]:
+            device = devices.get(device_id)
+            if device is None or device["owner_id"] != group["owner_id"]:
+                continue
+            members.append(device_id)
+            out: OutboundSocket | None = self.manager.get(device_id)
+            if out is None:
+                remote.append(device_id)
+                continue
+            binary = isinstance(out.ws, BinaryDeviceSocket)
+            local.append((device_id, out, (_TEMPLATES[binary, False], _TEMPLATES[binary, True])))
+        owned = set(members)
+
+        def action(value: bool) -> ActionPlan:
+            # В ответе — все члены группы: удалённые или чужие устройства получат DEVICE_NOT_FOUND
+            return ActionPlan.build([{"id": device_id, "capabilities": [{"type": ON_OFF, "state": {"value": value}}]}
+                                     for device_id in group["devices"]], owned)
+
+        return GroupPlan(key, group["devices"], local, remote, (action(False), action(True)))
+
+    async def _fan_out(self, plan: GroupPlan, on: bool, timeout: float) -> Dict[str, str | None]:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        errors: Dict[str, str | None] = {}
+        pending: Dict[asyncio.Future, tuple[str, str]] = {}
+        stale = False
+        for device_id, out, frames in plan.local:
+            try:
+                command_id, future = command_tracker.open(device_id)
+            except CommandError as e:
+                errors[device_id] = e.error_code
+                continue
+            method, head, tail = frames[on]
+            frame = head + (int(command_id).to_bytes(4, "little") if method == "send_bytes" else command_id) + tail
+            if not out.put(method, frame):
+                # Сокет закрылся, а слушатель ещё не успел сбросить план
+                command_tracker.discard(device_id, command_id)
+                errors[device_id] = "DEVICE_UNREACHABLE"
+                stale = True
+                continue
+            pending[future] = (device_id, command_id)
+        _OUT_COMMAND.inc(len(pending))
+        remote = asyncio.gather(*(self._remote(device_id, on, deadline) for device_id in plan.remote))
+        if pending:
+            await asyncio.wait(pending, timeout=max(deadline - loop.time(), 0))
+        for future, (device_id, command_id) in pending.items():
+            command_tracker.discard(device_id, command_id)
+            if not future.done():
+                errors[device_id] = "DEVICE_UNREACHABLE"
+                continue
+            error = future.exception()
+            errors[device_id] = error.error_code if error is not None else None
+        errors.update(zip(plan.remote, await remote))
+        if stale:
+            self.invalidate(plan.key)
+        return errors
+
+    async def _remote(self, device_id: str, on: bool, deadline: float) -> str | None:
+        try:
+            remaining = deadline - asyncio.get_running_loop().time()
+            await self.manager.send_command(device_id, on_off_command(on), max(remaining, 0))
+        except CommandError as e:
+            return e.error_code
+        return None
+
+
+group_engine = GroupEngine(device_ws_manager)
@@ -1,20 +1,46 @@
 # logging_config.py
+import logging
+import queue
 from logging.config import dictConfig
-from config import LoggingSettings
+from logging.handlers import QueueListener
+
+from app.logger_module.structured import DebugSampler, LogQueueHandler
+from config import LoggingSettings, logging_settings
+
+UVICORN_LOGGERS = ("uvicorn", "uvicorn.access")  # uvicorn.error пишет через "uvicorn"
 
 
 class LoggingConfig:
+    """
+    Логи идут через очередь: у корневого логгера один LogQueueHandler (вызывающий код, в том числе
+    event loop, платит только за постановку записи), а консоль, файл и Telegram обслуживает поток
+    QueueListener. Формат — JSON (log_format) с маскировкой токенов, DEBUG-записи прореживаются
+    (debug_sample_every). close() дописывает очередь, останавливает поток и возвращает
+    обработчики на корневой логгер.
+
+    В формате JSON setup() выключает глобальные logging.logThreads / logProcesses /
+    logMultiprocessing (для всех логгеров процесса), close() возвращает прежние значения.
+    """
+
     def __init__(self, settings: LoggingSettings):
         self.settings = settings
+        self.handler: LogQueueHandler | None = None
+        self._listener: QueueListener | None = None
+        self._record_flags: tuple[bool, bool, bool] | None = None
 
     def setup(self) -> None:
-        formatters = {
-            "standard": {
-                "format": self.settings.formatter,
+        self.close()
+        message_formatter = {"()": "app.logger_module.structured.JsonFormatter"} \
+            if self.settings.log_format == "json" else {
+                "()": "app.logger_module.structured.RedactingFormatter",
+                "fmt": self.settings.formatter,
                 "datefmt": "%Y-%m-%d %H:%M:%S",
-            },
+            }
+        formatters = {
+            "standard": message_formatter,
             "telegram": {
-                "format": self.settings.telegram_formatter,
+                "()": "app.logger_module.structured.RedactingFormatter",
+                "fmt": self.settings.telegram_formatter,
                 "datefmt": "%Y-%m-%d %H:%M:%S",
             }
         }
@@ -40,13 +66,17 @@ class LoggingConfig:
                 "encoding": "utf8",
             }
 
-        if self.settings.telegram_enabled:
+        # Без токена бота обработчик только копил бы ошибки отправки
+        if self.settings.telegram_enabled and self.settings.telegram_log_bot_token:
             handlers["telegram"] = {
-                "()": "app.infrastructure.logger_module.telegram.TelegramLogHandler",  # <-- путь к твоему классу
+                "()": "app.logger_module.telegram_handler.TelegramLogHandler",
                 "level": "WARNING",  # или INFO
                 "formatter": 'telegram',
                 "bot_token": self.settings.telegram_log_bot_token,
                 "chat_id": self.settings.telegram_chat_id,
+                "queue_size": self.settings.telegram_queue_size,
+                "batch_interval": self.settings.telegram_batch_interval,
+                "max_per_minute": self.settings.telegram_max_per_minute,
             }
 
         config = {
@@ -64,4 +94,50 @@ class LoggingConfig:
             },
         }
 
-        dictConfig(config)
\ No newline at end of file
+        dictConfig(config)
+        if self.settings.log_format == "json":
+            # JSON не выводит поток и процесс — запись, создаваемая в event loop, не собирает их
+            self._record_flags = (logging.logThreads, logging.logProcesses, logging.logMultiprocessing)
+            logging.logThreads = logging.logProcesses = logging.logMultiprocessing = False
+
+        # Собранные dictConfig обработчики переезжают в поток, на корне остаётся только очередь
+        root = logging.getLogger()
+        sinks = list(root.handlers)
+        for handler in sinks:
+            root.removeHandler(handler)
+        log_queue = queue.SimpleQueue()
+        self.handler = LogQueueHandler(log_queue, self.settings.log_queue_size)
+        self.handler.addFilter(DebugSampler(self.settings.debug_sample_every))
+        root.addHandler(self.handler)
+        self._listener = QueueListener(log_queue, *sinks, respect_handler_level=True)
+        self._listener.start()
+
+        if self.settings.capture_uvicorn:
+            # uvicorn настраивает свои логгеры сам и пишет в stdout прямо из event loop.
+            # Логгер без обработчиков не трогаем: так uvicorn выключает access-лог (--no-access-log)
+            for name in UVICORN_LOGGERS:
+                uvicorn_logger = logging.getLogger(name)
+                if uvicorn_logger.handlers:
+                    uvicorn_logger.handlers.clear()
+                    uvicorn_logger.propagate = True
+
+    def close(self) -> None:
+        if self._listener is None:
+            return
+        root = logging.getLogger()
+        root.removeHandler(self.handler)
+        self._listener.stop()
+        # Записи после остановки (завершение uvicorn) пишутся уже синхронно, но не теряются
+        for handler in self._listener.handlers:
+            root.addHandler(handler)
+        self._listener = None
+        if self._record_flags is not None:
+            logging.logThreads, logging.logProcesses, logging.logMultiprocessing = self._record_flags
+            self._record_flags = None
+
+    @property
+    def dropped(self) -> int:
+        return self.handler.dropped if self.handler else 0
+
+
+logging_config = LoggingConfig(logging_settings)
@@ -0,0 +1,132 @@
+# logger_module/structured.py
+
+import json
+import logging
+import re
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler
+
+# Значения, которые не должны попасть в логи: Bearer-токены, OAuth-поля, токен бота в URL Telegram
+_FIELDS = ("access_token", "refresh_token", "client_secret", "auth_token", "password", "secret", "code")
+_SECRETS = re.compile(
+    r"(?P<bearer>Bearer\s+)[\w.~+/=-]+"
+    rf"|(?P<field>\b(?:{'|'.join(_FIELDS)})"
+    r"""["']?\s*[:=]\s*["']?)[^"'&,\s}]+"""
+    r"|(?P<bot>/bot)\d+:[\w-]+"
+)
+
+# Стандартные атрибуты LogRecord; всё остальное пришло через extra=... и попадает в JSON
+# (color_message — копия сообщения с ANSI-цветами, которую добавляет uvicorn)
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "sampled",
+                                                                         "color_message"}
+
+
+_MARKERS = ("Bearer", "token", "secret", "code", "password", "/bot")
+
+
+def redact(text: str) -> str:
+    # Подстроки проверяются на C, а регулярка идёт по строке посимвольно: без маркеров её не запускаем
+    if not any(marker in text for marker in _MARKERS):
+        return text
+    return _SECRETS.sub(lambda m: (m["bearer"] or m["field"] or m["bot"]) + "***", text)
+
+
+def redact_value(value, key: str = ""):
+    """То же для значений extra=...: строки маскируются по тексту, строковые поля с секретным именем — целиком."""
+    if isinstance(value, str):
+        return "***" if key in _FIELDS else redact(value)
+    if isinstance(value, dict):
+        return {k: redact_value(v, k if isinstance(k, str) else "") for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact_value(v) for v in value]
+    return value
+
+
+class RedactingFormatter(logging.Formatter):
+    """Обычный текстовый формат, но без секретов."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        return redact(super().format(record))
+
+
+class JsonFormatter(logging.Formatter):
+    """Запись — одна JSON-строка: время, уровень, логгер, сообщение, место в коде, extra и исключение."""
+
+    def __init__(self):
+        super().__init__()
+        self._second = -1
+        self._prefix = ""
+
+    def timestamp(self, created: float) -> str:
+        """ISO-время UTC с миллисекундами; дата и секунды собираются раз в секунду."""
+        second = int(created)
+        if second != self._second:
+            self._second = second
+            self._prefix = datetime.fromtimestamp(second, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+        return f"{self._prefix}.{int((created - second) * 1000):03d}Z"
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.timestamp(record.created),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": redact(record.getMessage()),
+            "file": record.filename,
+            "line": record.lineno,
+        }
+        sampled = getattr(record, "sampled", None)
+        if sampled:
+            entry["sampled"] = sampled  # одна запись из sampled
+        for key, value in vars(record).items():
+            if key not in _RESERVED:
+                entry[key] = redact_value(value, key)
+        if record.exc_info:
+            entry["exc"] = redact(self.formatException(record.exc_info))
+        elif record.exc_text:
+            entry["exc"] = redact(record.exc_text)
+        # Объекты без JSON-представления выводятся через str() — и тоже без секретов
+        return json.dumps(entry, ensure_ascii=False, default=lambda value: redact(str(value)))
+
+
+class DebugSampler(logging.Filter):
+    """
+    Пропускает первую и каждую every-ю DEBUG-запись из одного места в коде; INFO и выше — все.
+    Стоит на QueueHandler, так что отброшенная запись не доходит даже до очереди.
+    """
+
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = every
+        self._seen: dict[tuple[str, int], int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.every <= 1:
+            return True
+        key = (record.pathname, record.lineno)
+        seen = self._seen.get(key, 0)
+        self._seen[key] = seen + 1
+        record.sampled = self.every
+        return seen % self.every == 0
+
+
+class LogQueueHandler(QueueHandler):
+    """
+    Единственный обработчик логгеров приложения: запись целиком кладётся в очередь, а форматирование,
+    маскировка и вывод — в потоке QueueListener. В отличие от QueueHandler запись не форматируется
+    здесь (prepare), поэтому аргументы %-сообщений должны быть неизменяемыми или копиями.
+    При переполнении очереди записи отбрасываются и считаются в dropped — event loop не ждёт вывод.
+    """
+
+    def __init__(self, log_queue, max_size: int):
+        super().__init__(log_queue)
+        self.max_size = max_size
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if self.queue.qsize() >= self.max_size:
+            self.dropped += 1
+            return
+        self.queue.put_nowait(record)
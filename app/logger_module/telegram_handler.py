@@ -1,12 +1,17 @@
 # logger_module/telegram_handler.py
 
+import html
 import logging
-import requests
+import queue
+import threading
+import time
+
+from app.logger_module.structured import RedactingFormatter
 
 error_logger = logging.getLogger("telegram_error")
 if not error_logger.handlers:
     handler = logging.StreamHandler()
-    formatter = logging.Formatter(
+    formatter = RedactingFormatter(
         "[%(asctime)s] [server] [%(levelname)s] %(message)s (%(filename)s:%(lineno)d)",
         datefmt="%Y-%m-%d %H:%M:%S",
     )
@@ -14,21 +19,134 @@ if not error_logger.handlers:
     error_logger.addHandler(handler)
 error_logger.propagate = False
 
+
 class TelegramLogHandler(logging.Handler):
-    def __init__(self, bot_token: str, chat_id: str, level: int = logging.NOTSET):
+    """
+    emit() только кладёт строку в очередь — сеть трогает фоновый поток.
+    Поток склеивает записи за batch_interval в одно сообщение, соблюдает лимит
+    сообщений в минуту, а при переполнении очереди записи отбрасываются
+    и считаются в self.dropped. close() дожидается отправки не дольше shutdown_timeout.
+    """
+
+    MAX_MESSAGE_LEN = 4096  # лимит Telegram на длину текста
+    HEADER = "🛑 <b>Log:</b>\n"
+
+    def __init__(self, bot_token: str, chat_id: str, level: int = logging.NOTSET,
+                 queue_size: int = 1000, batch_interval: float = 2.0, max_per_minute: int = 20,
+                 shutdown_timeout: float = 5.0, api_base: str = "https://api.telegram.org"):
         super().__init__(level)
         self.bot_token = bot_token
         self.chat_id = chat_id
-        self.api_url = f"https://api.telegram.org/bot{self.bot_token}/sendMessage"
+        self.api_url = f"{api_base}/bot{self.bot_token}/sendMessage"
+        self.batch_interval = batch_interval
+        self.shutdown_timeout = shutdown_timeout
+        self.dropped = 0
+        self.sent_messages = 0
+        self._reported_dropped = 0
+        self._queue: queue.Queue[str] = queue.Queue(queue_size)
+        self._rate = max(max_per_minute, 1) / 60
+        self._capacity = max(max_per_minute, 1)
+        self._tokens = float(self._capacity)
+        self._refilled = time.monotonic()
+        self._stop = threading.Event()
+        self._shutdown_deadline = float("inf")
+        self._session = None  # requests импортирует поток отправки при первом сообщении, а не старт приложения
+        self._thread = threading.Thread(target=self._worker, name="telegram-log", daemon=True)
+        self._thread.start()
 
     def emit(self, record):
         try:
-            log_entry = self.format(record)
-            payload = {
-                "chat_id": self.chat_id,
-                "text": f"🛑 <b>Log:</b>\n<pre>{log_entry}</pre>",
-                "parse_mode": "HTML"
-            }
-            requests.post(self.api_url, data=payload, timeout=3)
+            self._queue.put_nowait(self.format(record))
+        except queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        if not self._stop.is_set():
+            self._shutdown_deadline = time.monotonic() + self.shutdown_timeout
+            self._stop.set()
+            self._thread.join(self.shutdown_timeout)
+        super().close()
+
+    def _worker(self):
+        limit = self.MAX_MESSAGE_LEN - len(self.HEADER) - len("<pre></pre>")
+        while True:
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return
+                continue
+            entries, size = [first], len(first)
+            # Копим записи batch_interval секунд, но не больше одного сообщения:
+            # остальное ждёт в очереди, и при медленном Telegram срабатывает её лимит
+            deadline = time.monotonic() + self.batch_interval
+            while size < limit:
+                timeout = 0 if self._stop.is_set() else deadline - time.monotonic()
+                try:
+                    entry = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                entries.append(entry)
+                size += len(entry) + 1
+            for text, count in self._messages(entries, limit):
+                if not self._acquire():
+                    # Остановка: лимит не даёт отправить вовремя — оставшееся отбрасываем
+                    self.dropped += count
+                    continue
+                self._send(text)
+
+    def _messages(self, entries: list[str], limit: int) -> list[tuple[str, int]]:
+        records = len(entries)
+        unreported = self.dropped - self._reported_dropped
+        if unreported:
+            entries.append(f"... пропущено записей: {unreported}")
+            self._reported_dropped = self.dropped
+        messages, chunk, size, start = [], [], 0, 0
+        for i, entry in enumerate(entries):
+            entry = html.escape(entry)[:limit]
+            if chunk and size + len(entry) + 1 > limit:
+                messages.append((chunk, start, i))
+                chunk, size, start = [], 0, i
+            chunk.append(entry)
+            size += len(entry) + 1
+        if chunk:
+            messages.append((chunk, start, len(entries)))
+        # Второе число — сколько записей в сообщении: строка о пропущенных записью не считается
+        return [(f"{self.HEADER}<pre>{chr(10).join(c)}</pre>", min(end, records) - min(start, records))
+                for c, start, end in messages]
+
+    def _acquire(self) -> bool:
+        # Token bucket: не больше max_per_minute сообщений в минуту
+        while True:
+            now = time.monotonic()
+            if now > self._shutdown_deadline:
+                return False
+            self._tokens = min(self._capacity, self._tokens + (now - self._refilled) * self._rate)
+            self._refilled = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            if self._stop.is_set():
+                return False
+            self._stop.wait((1 - self._tokens) / self._rate)
+
+    def _send(self, text: str):
+        payload = {"chat_id": self.chat_id, "text": text, "parse_mode": "HTML"}
+        try:
+            if self._session is None:
+                import requests
+                self._session = requests.Session()
+            response = self._session.post(self.api_url, data=payload, timeout=3)
+            if not response.ok:
+                error_logger.error(f"[TelegramLogHandler] HTTP {response.status_code}: "
+                                   f"{self._hide_token(response.text[:200])}")
+                return
+            self.sent_messages += 1
         except Exception as e:
-            error_logger.error(f"[TelegramLogHandler] Error: {e}")
+            # Исключения requests содержат URL запроса, а в нём токен бота
+            error_logger.error(f"[TelegramLogHandler] Error: {self._hide_token(str(e))}")
+
+    def _hide_token(self, text: str) -> str:
+        return text.replace(self.bot_token, "***") if self.bot_token else text
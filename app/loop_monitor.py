@@ -0,0 +1,179 @@
+import asyncio
+import hmac
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+from fastapi import APIRouter, HTTPException, Request
+from starlette.responses import PlainTextResponse
+
+from app.logger_module.utils import get_logger_factory
+from app.metrics import EVENT_LOOP_LAG, EVENT_LOOP_STALLS
+from config import LoopMonitorSettings, loop_monitor_settings, require_bearer
+
+get_logger = get_logger_factory(__name__)
+logger = get_logger()
+
+_MAX_DEPTH = 40  # кадров стека в одном снимке
+
+
+class LoopMonitor:
+    """
+    Сторож event loop. В цикле раз в interval тикает задача: меряет задержку
+    (event_loop_lag_seconds) и отмечает время последнего тика. Отдельный поток
+    смотрит на эту отметку: если цикл не тикал дольше interval + stall_threshold,
+    значит его держит синхронный код — поток снимает стек потока цикла
+    (sys._current_frames) каждые sample_interval, пока цикл не освободится,
+    и пишет в лог самый частый стек зависания.
+
+    Вне зависаний поток просыпается раз в stall_threshold / 2 и сравнивает два числа,
+    так что сторож можно держать включённым в проде. По запросу (/admin/loop/profile)
+    тот же поток снимает стеки цикла все N секунд и отдаёт их в формате collapsed
+    stacks (flamegraph.pl, speedscope).
+    """
+
+    def __init__(self, settings: LoopMonitorSettings):
+        self.settings = settings
+        self.stalls: deque[dict] = deque(maxlen=settings.keep_stalls)
+        self.lag_max = 0.0  # с последнего запроса /admin/loop
+        self._beat = 0.0
+        self._loop_thread: int | None = None
+        self._task: asyncio.Task | None = None
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._profile: Counter | None = None
+        self._logged: deque[float] = deque()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self):
+        if not self.settings.enabled:
+            return
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._tick())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def close(self):
+        if self._task is None:
+            return
+        self._stop.set()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await asyncio.to_thread(self._thread.join)
+
+    async def profile(self, seconds: float) -> Counter:
+        """Снимки стека цикла за seconds секунд: стек -> число снимков."""
+        if self._profile is not None:
+            raise RuntimeError("profile already running")
+        self._profile = Counter()
+        try:
+            await asyncio.sleep(seconds)
+            return self._profile
+        finally:
+            self._profile = None
+
+    # --- в цикле ---
+    async def _tick(self):
+        loop = asyncio.get_running_loop()
+        interval = self.settings.interval
+        while True:
+            expected = loop.time() + interval
+            await asyncio.sleep(interval)
+            lag = max(0.0, loop.time() - expected)
+            self._beat = time.monotonic()
+            EVENT_LOOP_LAG.observe(lag)
+            if lag > self.lag_max:
+                self.lag_max = lag
+
+    # --- в потоке сторожа ---
+    def _watch(self):
+        s = self.settings
+        limit = s.interval + s.stall_threshold
+        stall: Counter | None = None
+        stalled_since = 0.0
+        while not self._stop.is_set():
+            profile = self._profile
+            stalled = time.monotonic() - self._beat > limit
+            if stalled or profile is not None:
+                stack = self._sample()
+                if profile is not None and stack:
+                    profile[stack] += 1
+                if stalled:
+                    if stall is None:
+                        stall, stalled_since = Counter(), self._beat + s.interval
+                    if stack:
+                        stall[stack] += 1
+            if stall is not None and not stalled:
+                self._report(stall, time.monotonic() - stalled_since)
+                stall = None
+            self._stop.wait(s.sample_interval if stall is not None or profile is not None else s.stall_threshold / 2)
+
+    def _sample(self) -> tuple[str, ...]:
+        frame = sys._current_frames().get(self._loop_thread)
+        stack = []
+        while frame is not None and len(stack) < _MAX_DEPTH:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        return tuple(reversed(stack))
+
+    def _report(self, stall: Counter, duration: float):
+        EVENT_LOOP_STALLS.inc()
+        stack, samples = stall.most_common(1)[0] if stall else ((), 0)
+        self.stalls.append({"at": time.time(), "duration_ms": round(duration * 1000, 1),
+                            "samples": sum(stall.values()), "stack": list(stack)})
+        now = time.monotonic()
+        while self._logged and now - self._logged[0] > 60:
+            self._logged.popleft()
+        if len(self._logged) >= self.settings.stall_log_per_minute:
+            return
+        self._logged.append(now)
+        logger.warning(f"Event loop blocked for {duration * 1000:.0f} ms "
+                       f"({samples}/{sum(stall.values())} samples in):\n  " + "\n  ".join(stack[-15:]))
+
+
+loop_monitor = LoopMonitor(loop_monitor_settings)
+
+router = APIRouter()
+
+
+def _require_admin(request: Request):
+    token = loop_monitor.settings.admin_token
+    if not token:
+        raise HTTPException(status_code=404)
+    if not hmac.compare_digest(require_bearer(request).encode(), token.encode()):
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+
+@router.get("/admin/loop", include_in_schema=False)
+async def loop_status(request: Request):
+    _require_admin(request)
+    lag_max, loop_monitor.lag_max = loop_monitor.lag_max, 0.0
+    return {
+        "running": loop_monitor.running,
+        "lag_max_ms": round(lag_max * 1000, 1),
+        "stalls_total": EVENT_LOOP_STALLS.labels().value,
+        "stalls": list(loop_monitor.stalls),
+    }
+
+
+@router.get("/admin/loop/profile", include_in_schema=False)
+async def loop_profile(request: Request, seconds: float = 5.0):
+    """Профиль цикла в формате collapsed stacks: «кадр;кадр;...;кадр число_снимков» на строку."""
+    _require_admin(request)
+    if not loop_monitor.running:
+        raise HTTPException(status_code=409, detail="Loop monitor is disabled")
+    try:
+        profile = await loop_monitor.profile(min(max(seconds, 0.1), loop_monitor.settings.profile_max_seconds))
+    except RuntimeError:
+        raise HTTPException(status_code=409, detail="Profile already running")
+    lines = [f"{';'.join(stack)} {count}" for stack, count in profile.most_common()]
+    return PlainTextResponse("\n".join(lines) + "\n")
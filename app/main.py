@@ -1,135 +1,197 @@
+import json
 import uuid
-from typing import Dict, Any, List
+from contextlib import asynccontextmanager
+from typing import Dict, Any
 
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, HTTPException, Query, status
+from starlette.responses import Response
 from starlette.websockets import WebSocket
 
 from app.discovery_check import router as r1
+from app.actions import ActionPlan
 from app.auth_module import router as r2, auth_yandex
-from config import DB
-
-app = FastAPI(title="Sh_IoT - Система интернет вещей")
+from app.broker.factory import create_broker
+from app.devices import device_ids_of, devices_of
+from app.groups import delete_group, get_group, group_engine, groups_of, save_group
+from app.logger_module.logging_config import logging_config
+from app.logger_module.utils import get_logger_factory
+from app.loop_monitor import loop_monitor, router as loop_monitor_router
+from app.notifications import state_notifier
+from app.telemetry import STEPS, pick_step, telemetry_store
+from app.tokens import token_service
+from app.metrics import router as metrics_router, MetricsMiddleware, WS_CONNECTIONS, EVENT_QUEUE_DEPTH, EVENT_DROPPED, \
+    LOG_DROPPED
+from app.yandex_format import discovery_body, query_body
+from app.ws import websocket_handlers  # noqa: F401 — регистрирует обработчики event_bus
+from app.ws.credentials import device_credentials
+from app.ws.offline_queue import offline_queue
+from app.ws.websocket_manager import device_ws_manager
+from app.ws.websocket_session import device_ws_session
+from app.ws.framing import METRICS
+from config import DB, event_bus, broker_settings, now
+
+get_logger = get_logger_factory(__name__)
+logger = get_logger()
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    # Логи — через очередь и поток вывода (app/logger_module/logging_config.py)
+    logging_config.setup()
+    # Сторож цикла первым: зависания на старте тоже видны (выключен по умолчанию, LOOP_MONITOR_ENABLED)
+    await loop_monitor.start()
+    # Брокер маршрутизирует команды к воркеру, которому принадлежит сокет устройства
+    broker = create_broker(broker_settings)
+    await broker.start(device_ws_manager.send_local_command)
+    device_ws_manager.broker = broker
+    await state_notifier.start()
+    await token_service.start()
+    await offline_queue.start()
+    await telemetry_store.start()
+    try:
+        yield
+    finally:
+        await telemetry_store.close()
+        await offline_queue.close()
+        device_credentials.close()
+        await token_service.close()
+        await state_notifier.close()
+        device_ws_manager.broker = None
+        await broker.close()
+        await loop_monitor.close()
+        logging_config.close()
+
+
+app = FastAPI(title="Sh_IoT - Система интернет вещей", lifespan=lifespan)
 
 app.include_router(r1)
 app.include_router(r2)
+app.include_router(metrics_router)
+app.include_router(loop_monitor_router)
+app.add_middleware(MetricsMiddleware)
 
-
-# ====== МАППИНГ: твои модели -> формат Алисы ======
-def map_kind_to_y_type(kind: str) -> str:
-    # Простейшее сопоставление для демо
-    if kind == "relay":
-        return "devices.types.light"  # можно и switch; выберем light для наглядности
-    return "devices.types.other"
-
-
-def map_caps_to_y_caps(caps: List[str]) -> List[Dict[str, Any]]:
-    out = []
-    for c in caps:
-        if c == "on_off":
-            out.append({"type": "devices.capabilities.on_off"})
-    return out
-
-
-def to_yandex_device(device: Dict[str, Any]) -> Dict[str, Any]:
-    return {
-        "id": device["id"],
-        "name": device["name"],
-        "type": map_kind_to_y_type(device["kind"]),
-        "capabilities": map_caps_to_y_caps(device["capabilities"]),
-    }
-
-
-def to_yandex_state(device: Dict[str, Any]) -> Dict[str, Any]:
-    caps = []
-    if "on_off" in device["capabilities"]:
-        caps.append({
-            "type": "devices.capabilities.on_off",
-            "state": {"instance": "on", "value": bool(device["state"].get("on", False))}
-        })
-    return {"id": device["id"], "capabilities": caps}
+WS_CONNECTIONS.set_function(lambda: len(device_ws_manager.active))
+EVENT_QUEUE_DEPTH.set_function(event_bus.depths)
+EVENT_DROPPED.set_function(event_bus.dropped)
+LOG_DROPPED.set_function(lambda: logging_config.dropped)
 
 
 def req_id() -> str:
     return str(uuid.uuid4())
 
 
-ws_session = {}
-
-
 @app.websocket('/ws/{device_id}/connect')
-async def device_websocket_handler(ws: WebSocket, device_id: int):
-    await ws.accept()
-    ws_session[2] = ws
-    await ws_session[2].send_json(data={'action': 'turn_on'})
-    print('Розетка в сети')
-    while True:
-        msg = await ws.receive_text()
-        print(msg)
+async def device_websocket_handler(ws: WebSocket, device_id: str):
+    # Подключаться могут только устройства, известные ядру
+    if device_id not in DB["devices"]:
+        await ws.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    # accept делает сессия после допуска (app/ws/admission.py)
+    await device_ws_session.handle(ws, device_id)
 
 
 @app.get("/v1.0/user/devices")
 async def list_devices(user=Depends(auth_yandex)):
-    # Вернём все устройства юзера
-    devices = [
-        to_yandex_device(d)
-        for d in DB["devices"].values()
-        if d["owner_id"] == user["id"]
-    ]
-    return {"request_id": req_id(), "payload": {"user_id": user["id"], "devices": devices}, "user_id": user["id"], }
+    # Вернём все устройства юзера (по индексу владельца, без обхода всей базы)
+    body = discovery_body(req_id(), user["id"], devices_of(user["id"]))
+    return Response(body, media_type="application/json")
 
 
 @app.post("/v1.0/user/devices/query")
 async def query_devices(body: Dict[str, Any], user=Depends(auth_yandex)):
     ids = [d["id"] for d in body.get("devices", [])]
+    owned = set(device_ids_of(user["id"]))
     devices = []
     for dev_id in ids:
-        d = DB["devices"].get(dev_id)
-        if d and d["owner_id"] == user["id"]:
-            devices.append(to_yandex_state(d))
-    return {"request_id": req_id(), "payload": {"devices": devices}}
+        d = DB["devices"].get(dev_id) if dev_id in owned else None
+        if d:
+            devices.append(d)
+    return Response(query_body(req_id(), devices), media_type="application/json")
 
 
 @app.post("/v1.0/user/devices/action")
 async def action_devices(body: Dict[str, Any], user=Depends(auth_yandex)):
-    results = []
-    print(body)
-    for dev in body.get("payload", {}).get("devices", []):
-        dev_id = dev["id"]
-        d = DB["devices"].get(dev_id)
-        if not d or d["owner_id"] != user["id"]:
-            # По спецификации лучше вернуть ошибку по устройству
-            results.append({"id": dev_id, "error_code": "DEVICE_NOT_FOUND"})
-            continue
-
-        caps_results = []
-        for cap in dev.get("capabilities", []):
-            ctype = cap.get("type", "")
-            state = cap.get("state", {})
-            state_value = state.get('value')
-            if state_value:
-                data = {'action': 'turn_on'}
-                print('Розетка включена')
-
-            else:
-                print('Розетка выключена')
-                data = {'action': 'turn_off'}
-
-            await ws_session[2].send_json(data=data)
-
-            if ctype == "devices.capabilities.on_off":
-                value = bool(state.get("value"))
-                d["state"]["on"] = value
-                caps_results.append({"type": ctype, "state": {"instance": "on", "action_result": {"status": "DONE"}}})
-            else:
-                caps_results.append(
-                    {"type": ctype, "state": {"action_result": {"status": "ERROR", "error_code": "NOT_SUPPORTED"}}})
-
-        results.append({"id": dev_id, "capabilities": caps_results})
+    # Аргументы, а не f-строка: при уровне выше DEBUG запрос не платит даже за форматирование
+    logger.debug("Action from %s: %s", user["id"], body)
+    plan = ActionPlan.build(body.get("payload", {}).get("devices", []), set(device_ids_of(user["id"])))
+    # Все устройства получают по одной команде параллельно; ждём ack в пределах дедлайна Алисы
+    errors = await device_ws_manager.command_many(plan.frames())
+    results = plan.results(errors)
+    return {"request_id": req_id(), "payload": {"devices": results}}
+
+
+@app.get("/v1.0/user/devices/{device_id}/telemetry")
+async def device_telemetry(device_id: str, metric: str = "power", start: int = Query(alias="from"),
+                           end: int | None = Query(None, alias="to"), step: str | None = None,
+                           user=Depends(auth_yandex)):
+    # Диапазон читается из агрегатов (app/telemetry.py); без step шаг выбирается по ширине диапазона
+    if device_id not in device_ids_of(user["id"]):
+        raise HTTPException(status_code=404, detail="Device not found")
+    if metric not in METRICS:
+        raise HTTPException(status_code=400, detail=f"Unknown metric, expected one of {', '.join(METRICS)}")
+    end = now() if end is None else end
+    if end <= start:
+        raise HTTPException(status_code=400, detail="'to' must be after 'from'")
+    step = step or pick_step(end - start)
+    if step not in STEPS:
+        raise HTTPException(status_code=400, detail=f"Unknown step, expected one of {', '.join(STEPS)}")
+    if (end - start) // STEPS[step] > telemetry_store.settings.max_points:
+        raise HTTPException(status_code=400, detail="Range too wide for this step")
+    points = await telemetry_store.query(device_id, metric, start, end, step)
+    # Тысячи точек: сериализуем сами, минуя jsonable_encoder
+    body = {"device_id": device_id, "metric": metric, "step": step, "points": points}
+    return Response(json.dumps(body, separators=(",", ":")), media_type="application/json")
+
+
+@app.post("/v1.0/user/devices/{device_id}/secret")
+async def issue_device_secret(device_id: str, user=Depends(auth_yandex)):
+    # Свой секрет устройства вместо общего legacy_token; показывается один раз, старый перестаёт действовать
+    if device_id not in device_ids_of(user["id"]):
+        raise HTTPException(status_code=404, detail="Device not found")
+    return {"device_id": device_id, "auth_token": await device_credentials.issue(device_id)}
+
+
+@app.get("/v1.0/user/groups")
+async def list_groups(user=Depends(auth_yandex)):
+    return {"request_id": req_id(), "payload": {"groups": groups_of(user["id"])}}
+
+
+@app.put("/v1.0/user/groups/{group_id}")
+async def put_group(group_id: str, body: Dict[str, Any], user=Depends(auth_yandex)):
+    # Группа/сцена: {"name": ..., "devices": [device_id, ...]}; план исполнения пересоберётся при запуске.
+    # id групп у каждого пользователя свои (app/groups.py), чужую группу этим id не задеть
+    devices = body.get("devices", [])
+    owned = set(device_ids_of(user["id"]))
+    if not isinstance(devices, list) or not all(dev_id in owned for dev_id in devices):
+        raise HTTPException(status_code=400, detail="Unknown device in group")
+    group = save_group(user["id"], group_id, str(body.get("name", group_id)), devices)
+    return {"request_id": req_id(), "payload": group}
+
+
+@app.delete("/v1.0/user/groups/{group_id}")
+async def remove_group(group_id: str, user=Depends(auth_yandex)):
+    if not delete_group(user["id"], group_id):
+        raise HTTPException(status_code=404, detail="Group not found")
+    return {"status": "ok"}
+
 
+@app.post("/v1.0/user/groups/{group_id}/action")
+async def group_action(group_id: str, body: Dict[str, Any], user=Depends(auth_yandex)):
+    # Ответ — как у /devices/action, по каждому устройству группы
+    on = body.get("on")
+    if not isinstance(on, bool):
+        raise HTTPException(status_code=400, detail="'on' must be true or false")
+    if get_group(user["id"], group_id) is None:
+        raise HTTPException(status_code=404, detail="Group not found")
+    results = await group_engine.execute(user["id"], group_id, on)
+    if results is None:
+        raise HTTPException(status_code=404, detail="Group not found")
     return {"request_id": req_id(), "payload": {"devices": results}}
 
 
 @app.post("/v1.0/user/unlink")
 async def unlink(user=Depends(auth_yandex)):
     # В реальности помечаешь интеграцию как revoked
+    for dev_id in device_ids_of(user["id"]):
+        state_notifier.forget(dev_id)
     return {"status": "ok"}
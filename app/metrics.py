@@ -0,0 +1,241 @@
+import time
+from bisect import bisect_left
+from typing import Callable, Iterable
+
+from fastapi import APIRouter
+from starlette.responses import Response
+
+# Метрики в текстовом формате Prometheus. Наблюдение — это поиск готовой
+# дочерней метрики по меткам и сложение float, поэтому их можно держать
+# включёнными в проде.
+
+DEFAULT_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def set(self, value: float):
+        self.value = value
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Metric:
+    kind = ""
+    child_class: type = _CounterChild
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple, object] = {}
+        if not self.labelnames:
+            self._default = self.labels()
+        registry.register(self)
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        return self.child_class()
+
+    def _label_str(self, values: tuple, extra: str = "") -> str:
+        pairs = [f'{k}="{_escape(str(v))}"' for k, v in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self._children.items()):
+            lines.append(f"{self.name}{self._label_str(values)} {_num(child.value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1):
+        self._default.inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+    child_class = _GaugeChild
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._function: Callable | None = None
+
+    def set(self, value: float):
+        self._default.set(value)
+
+    def set_function(self, function: Callable):
+        """Значение считается в момент сбора: () -> float или () -> {label_value: float}."""
+        self._function = function
+
+    def render(self) -> list[str]:
+        if self._function is not None:
+            value = self._function()
+            if isinstance(value, dict):
+                for label, v in value.items():
+                    self.labels(label).set(v)
+            else:
+                self._default.set(value)
+        return super().render()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def time(self) -> "_Timer":
+        return _Timer(self._default)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _num(bound)
+                bucket_labels = self._label_str(values, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_str(values)} {_num(child.sum)}")
+            lines.append(f"{self.name}_count{self._label_str(values)} {child.count}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("child", "started")
+
+    def __init__(self, child: _HistogramChild):
+        self.child = child
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.started)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list[_Metric] = []
+
+    def register(self, metric: _Metric):
+        self.metrics.append(metric)
+
+    def render(self) -> str:
+        return "\n".join(line for m in self.metrics for line in m.render()) + "\n"
+
+
+def _num(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = Registry()
+
+# ====== МЕТРИКИ ПРИЛОЖЕНИЯ ======
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency by route",
+                         ["method", "route", "status"])
+WS_CONNECTIONS = Gauge("ws_device_connections", "Live device WebSocket connections")
+WS_MESSAGES_IN = Counter("ws_messages_received_total", "Frames received from devices", ["kind"])
+WS_MESSAGES_OUT = Counter("ws_messages_sent_total", "Frames sent to devices", ["kind"])
+COMMAND_RTT = Histogram("device_command_rtt_seconds", "Command round trip until device ack", ["result"])
+EVENT_QUEUE_DEPTH = Gauge("event_bus_queue_depth", "Queued events per event bus topic", ["event"])
+EVENT_DROPPED = Gauge("event_bus_events_dropped", "Events dropped on full queue per topic", ["event"])
+EVENT_HANDLER_LATENCY = Histogram("event_bus_handler_duration_seconds", "Event bus handler run time",
+                                  ["event", "handler"])
+EVENT_HANDLER_ERRORS = Counter("event_bus_handler_errors_total", "Event bus handler exceptions", ["event", "handler"])
+LOG_DROPPED = Gauge("log_records_dropped", "Log records dropped on full logging queue")
+WS_HANDSHAKES = Counter("ws_handshakes_total", "Device handshakes by outcome", ["result"])
+WS_HANDSHAKE_LATENCY = Histogram("ws_handshake_duration_seconds", "From upgrade request to authenticated session")
+DEVICE_AUTH_CHECKS = Counter("device_auth_checks_total", "Device credential checks by path", ["path"])
+EVENT_LOOP_LAG = Histogram("event_loop_lag_seconds", "Event loop scheduling delay")
+EVENT_LOOP_STALLS = Counter("event_loop_stalls_total", "Callbacks that held the event loop past the stall threshold")
+WS_OUTBOUND = Counter("ws_outbound_events_total", "Outbound queue events (coalesced, overflow, send_failed)",
+                      ["event"])
+TELEMETRY_READINGS = Counter("telemetry_readings_total", "Telemetry readings by outcome (stored, rollup_only, rejected)",
+                            ["result"])
+GROUP_EXECUTION = Histogram("group_execution_seconds", "Group action fan-out until the last ack or the deadline",
+                            ["plan"])
+AUTH_FAILURES = Counter("auth_failures_total", "Rejected authentication attempts", ["source", "reason"])
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: время HTTP-запроса по шаблону маршрута (а не по сырому пути)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            HTTP_LATENCY.labels(scope["method"], route.path if route else "unmatched", str(status[0])) \
+                .observe(time.perf_counter() - started)
+
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
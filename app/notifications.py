@@ -0,0 +1,148 @@
+import asyncio
+import json
+import random
+import time
+from typing import TYPE_CHECKING, Any, Dict
+
+from app.logger_module.utils import get_logger_factory
+from app.storage.cache import LRUCache
+from app.yandex_format import to_yandex_state
+from config import NotificationSettings, notification_settings
+
+if TYPE_CHECKING:
+    import httpx
+
+get_logger = get_logger_factory(__name__)
+logger = get_logger()
+
+
+def parse_state_report(msg: str) -> bool | None:
+    """
+    Сообщение устройства о состоянии реле: "on" / "off",
+    {"on": true} или {"state": {"on": true}}. Всё остальное — не отчёт о состоянии.
+    """
+    text = msg.strip().lower()
+    if text in ("on", "off"):
+        return text == "on"
+    if not text.startswith("{"):
+        return None
+    try:
+        data = json.loads(msg)
+    except ValueError:
+        return None
+    if isinstance(data, dict) and isinstance(data.get("state"), dict):
+        data = data["state"]
+    value = data.get("on") if isinstance(data, dict) else None
+    return value if isinstance(value, bool) else None
+
+
+class StateNotifier:
+    """
+    Пуш изменений состояния в Алису (callback/state), чтобы ей не приходилось опрашивать query.
+    Изменения копятся window секунд: дребезг устройства схлопывается в последнее состояние,
+    а все устройства одного пользователя уходят одним запросом. Ответы 5xx/429 и сетевые
+    ошибки повторяются с экспоненциальной задержкой. Последнее отправленное состояние помним
+    для max_tracked устройств (LRU): забытое устройство просто пушится ещё раз.
+    """
+
+    def __init__(self, settings: NotificationSettings):
+        self.settings = settings
+        self.pending: Dict[str, Dict[str, Dict[str, Any]]] = {}  # user_id -> {device_id: state}
+        self.last_pushed = LRUCache(settings.max_tracked)  # device_id -> состояние, которое знает Алиса
+        self.sent = 0
+        self.failed = 0
+        self.coalesced = 0
+        self._client: "httpx.AsyncClient | None" = None
+        self._timer: asyncio.TimerHandle | None = None
+        self._inflight: set[asyncio.Task] = set()
+        self._semaphore: asyncio.Semaphore | None = None
+
+    async def start(self):
+        if not self.settings.enabled:
+            return
+        # httpx (с certifi, click и pygments) нужен только включённому пушу — не тянем его в каждый старт
+        import httpx
+        self._client = httpx.AsyncClient(
+            base_url=self.settings.callback_base,
+            headers={"Authorization": f"OAuth {self.settings.oauth_token}"},
+            timeout=self.settings.timeout,
+            limits=httpx.Limits(max_connections=self.settings.max_connections,
+                                max_keepalive_connections=self.settings.max_connections),
+        )
+        self._semaphore = asyncio.Semaphore(self.settings.max_connections)
+
+    async def close(self):
+        if self._client is None:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._flush()
+        await asyncio.gather(*self._inflight, return_exceptions=True)
+        await self._client.aclose()
+        self._client = None
+
+    def notify(self, device: Dict[str, Any]):
+        if self._client is None:
+            return
+        user_pending = self.pending.setdefault(device["owner_id"], {})
+        if device["id"] in user_pending:
+            self.coalesced += 1
+        user_pending[device["id"]] = to_yandex_state(device)
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.settings.window, self._flush)
+
+    def known_by_alice(self, device: Dict[str, Any]):
+        """Состояние пришло от самой Алисы (action) — пушить его обратно не нужно."""
+        if self._client is None:
+            return
+        self.last_pushed.put(device["id"], to_yandex_state(device))
+
+    def forget(self, device_id: str):
+        """Устройство удалено или отвязано: ни ждущий пуш, ни отправленное состояние больше не нужны."""
+        self.last_pushed.pop(device_id)
+        for user_id, states in list(self.pending.items()):
+            if states.pop(device_id, None) is not None and not states:
+                del self.pending[user_id]
+
+    def _flush(self):
+        self._timer = None
+        batch, self.pending = self.pending, {}
+        for user_id, states in batch.items():
+            # Состояние вернулось к уже отправленному — Алисе сообщать нечего
+            devices = [s for dev_id, s in states.items() if self.last_pushed.get(dev_id) != s]
+            if not devices:
+                continue
+            task = asyncio.create_task(self._send(user_id, devices))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _send(self, user_id: str, devices: list):
+        import httpx
+        body = {"ts": time.time(), "payload": {"user_id": user_id, "devices": devices}}
+        url = f"/api/v1/skills/{self.settings.skill_id}/callback/state"
+        async with self._semaphore:
+            for attempt in range(self.settings.max_retries + 1):
+                try:
+                    response = await self._client.post(url, json=body)
+                    if response.status_code < 300:
+                        self.sent += 1
+                        for state in devices:
+                            self.last_pushed.put(state["id"], state)
+                        return
+                    if response.status_code != 429 and response.status_code < 500:
+                        logger.warning(f"[notify] Callback for {user_id} rejected: "
+                                       f"{response.status_code} {response.text[:200]}")
+                        break
+                    error = f"HTTP {response.status_code}"
+                except httpx.HTTPError as e:
+                    error = repr(e)
+                if attempt < self.settings.max_retries:
+                    delay = self.settings.backoff * 2 ** attempt
+                    await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+            else:
+                logger.warning(f"[notify] Callback for {user_id} failed after "
+                               f"{self.settings.max_retries + 1} attempts: {error}")
+        self.failed += 1
+
+
+state_notifier = StateNotifier(notification_settings)
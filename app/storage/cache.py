@@ -0,0 +1,42 @@
+import time
+from collections import OrderedDict
+from typing import Any
+
+MISSING = object()
+
+
+class LRUCache:
+    """LRU-кэш с ограничением по размеру и TTL записи (ttl=0 — без срока)."""
+
+    def __init__(self, maxsize: int, ttl: float = 0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Any, tuple[Any, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key) -> Any:
+        entry = self._data.get(key)
+        if entry is None or (self.ttl and entry[1] < time.monotonic()):
+            self.misses += 1
+            return MISSING
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        self._data[key] = (value, time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,82 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Iterator
+
+DELETED = object()  # маркер удаления в пачке записей
+
+
+class SQLiteStore:
+    """
+    Долговременное хранилище ключ-значение поверх SQLite.
+    Одна таблица kv(namespace, key, value), значения — JSON.
+    Пачка записей пишется одной транзакцией.
+
+    Чтения идут через отдельное соединение только для чтения со своей блокировкой: в WAL
+    читатель не ждёт писателя, так что промах кэша в event loop не стоит за сбросом буфера,
+    который ждёт блокировку записи соседнего воркера (до busy_timeout). read_timeout —
+    короткое ожидание на редкие случаи, когда читателю всё же нужна блокировка (восстановление WAL).
+    """
+
+    def __init__(self, path: str, busy_timeout: float = 5, read_timeout: float = 0.1):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=busy_timeout)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+            " PRIMARY KEY (namespace, key)) WITHOUT ROWID"
+        )
+        if path == ":memory:":
+            # У каждого соединения своя база в памяти, а соседних воркеров у неё нет — читаем через то же
+            self._reader, self._read_lock = self._conn, self._lock
+        else:
+            self._read_lock = threading.Lock()
+            self._reader = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False,
+                                           isolation_level=None, timeout=read_timeout)
+
+    def get(self, namespace: str, key: str) -> Any:
+        with self._read_lock:
+            row = self._reader.execute(
+                "SELECT value FROM kv WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+        return DELETED if row is None else json.loads(row[0])
+
+    def keys(self, namespace: str) -> list[str]:
+        with self._read_lock:
+            rows = self._reader.execute("SELECT key FROM kv WHERE namespace = ?", (namespace,)).fetchall()
+        return [r[0] for r in rows]
+
+    def items(self, namespace: str) -> Iterator[tuple[str, Any]]:
+        with self._read_lock:
+            rows = self._reader.execute("SELECT key, value FROM kv WHERE namespace = ?", (namespace,)).fetchall()
+        for key, value in rows:
+            yield key, json.loads(value)
+
+    def write_batch(self, ops: list[tuple[str, str, Any]]):
+        upserts = [(ns, k, json.dumps(v, ensure_ascii=False)) for ns, k, v in ops if v is not DELETED]
+        deletes = [(ns, k) for ns, k, v in ops if v is DELETED]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                if upserts:
+                    self._conn.executemany(
+                        "INSERT INTO kv (namespace, key, value) VALUES (?, ?, ?) "
+                        "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value", upserts)
+                if deletes:
+                    self._conn.executemany("DELETE FROM kv WHERE namespace = ? AND key = ?", deletes)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+        if self._reader is not self._conn:
+            with self._read_lock:
+                self._reader.close()
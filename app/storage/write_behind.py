@@ -0,0 +1,182 @@
+import asyncio
+import atexit
+import threading
+from collections.abc import MutableMapping
+from typing import Any, Iterator
+
+from app.logger_module.utils import get_logger_factory
+from app.storage.cache import LRUCache, MISSING
+from app.storage.sqlite_store import SQLiteStore, DELETED
+
+get_logger = get_logger_factory(__name__)
+logger = get_logger()
+
+
+class WriteBehindStore:
+    """
+    Кэш поверх SQLiteStore: чтения идут через LRU (read-through),
+    записи копятся в буфере и сбрасываются фоновым потоком пачками,
+    по одной транзакции на пачку (write-behind).
+
+    flush_interval=0 отключает буфер: каждая запись сразу коммитится.
+    cache_size=0 отключает кэш: каждое чтение идёт в SQLite.
+    Промахи (ключа нет) кэшируются отдельно, в absent на absent_size ключей с тем же TTL:
+    поток запросов к несуществующим id не ходит в SQLite и не вытесняет горячие ключи.
+    Кэш локален для процесса — при нескольких воркерах изменения соседей
+    видны после истечения cache_ttl.
+    """
+
+    def __init__(self, store: SQLiteStore, cache_size: int = 10_000, cache_ttl: float = 30,
+                 flush_interval: float = 0.5, flush_batch: int = 500, absent_size: int = 10_000):
+        self.store = store
+        self.cache = LRUCache(cache_size, cache_ttl)
+        self.absent = LRUCache(absent_size, cache_ttl)
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self._pending: dict[tuple[str, str], Any] = {}
+        self._flushing: dict[tuple[str, str], Any] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        if flush_interval > 0:
+            threading.Thread(target=self._flusher, name="storage-flusher", daemon=True).start()
+        atexit.register(self.close)
+
+    def mapping(self, namespace: str) -> "StoredMapping":
+        return StoredMapping(self, namespace)
+
+    def get(self, namespace: str, key: str) -> Any:
+        ck = (namespace, key)
+        value = self.cache.get(ck)
+        if value is not MISSING:
+            return value
+        if self.absent.get(ck) is not MISSING:
+            return DELETED
+        with self._lock:
+            value = self._pending.get(ck, MISSING)
+            if value is MISSING:
+                value = self._flushing.get(ck, MISSING)
+        if value is MISSING:
+            value = self.store.get(namespace, key)
+        if value is DELETED:
+            self.absent.put(ck, True)
+        else:
+            self.cache.put(ck, value)
+        return value
+
+    def set(self, namespace: str, key: str, value: Any):
+        ck = (namespace, key)
+        if value is DELETED:
+            self.cache.pop(ck)
+            self.absent.put(ck, True)
+        else:
+            self.absent.pop(ck)
+            self.cache.put(ck, value)
+        if self.flush_interval <= 0:
+            self.store.write_batch([(namespace, key, value)])
+            return
+        with self._lock:
+            self._pending[ck] = value
+            if len(self._pending) >= self.flush_batch and not self._wakeup.is_set():
+                self._wakeup.set()
+
+    def keys(self, namespace: str) -> list[str]:
+        # Полный обход редок (миграции, ремонт индексов), поэтому просто сбрасываем буфер
+        _off_loop(namespace)
+        self.flush()
+        return self.store.keys(namespace)
+
+    def items(self, namespace: str) -> Iterator[tuple[str, Any]]:
+        # Обход мимо кэша: не вытесняем горячие ключи при полном проходе
+        _off_loop(namespace)
+        self.flush()
+        return self.store.items(namespace)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return
+                self._flushing, self._pending = self._pending, {}
+            batch = [(ns, k, v) for (ns, k), v in self._flushing.items()]
+            try:
+                self.store.write_batch(batch)
+            except Exception as e:
+                logger.exception(f"[storage] Flush of {len(batch)} writes failed: {e}")
+                with self._lock:
+                    # Возвращаем в буфер то, что не успели перезаписать новыми значениями
+                    self._pending = {**self._flushing, **self._pending}
+            finally:
+                with self._lock:
+                    self._flushing = {}
+
+    def _flusher(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        self.flush()
+        self.store.close()
+
+
+def _off_loop(namespace: str):
+    """Полный обход — синхронный сброс буфера и проход по SQLite; в event loop он останавливает всё."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    raise RuntimeError(f"Full scan of '{namespace}' on the event loop; run it via asyncio.to_thread")
+
+
+class StoredMapping(MutableMapping):
+    """
+    dict-подобное представление одного namespace хранилища.
+    Вложенные изменения (d["state"]["on"] = ...) не отслеживаются —
+    после них запись нужно присвоить заново: mapping[key] = d.
+    Обход (iter, len, items, scan) — полный проход по SQLite: только вне event loop.
+    """
+
+    def __init__(self, backend: WriteBehindStore, namespace: str):
+        self.backend = backend
+        self.namespace = namespace
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.backend.get(self.namespace, key)
+        if value is DELETED:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any):
+        self.backend.set(self.namespace, key, value)
+
+    def __delitem__(self, key: str):
+        if key not in self:
+            raise KeyError(key)
+        self.backend.set(self.namespace, key, DELETED)
+
+    def discard(self, key: str):
+        """Удаление без проверки наличия — одна запись в буфер вместо чтения и записи."""
+        self.backend.set(self.namespace, key, DELETED)
+
+    def scan(self) -> Iterator[tuple[str, Any]]:
+        return self.backend.items(self.namespace)
+
+    def items(self):
+        # Один проход по SQLite вместо keys() + чтения каждого ключа через кэш
+        return list(self.scan())
+
+    def __contains__(self, key) -> bool:
+        return self.backend.get(self.namespace, key) is not DELETED
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.backend.keys(self.namespace))
+
+    def __len__(self) -> int:
+        return len(self.backend.keys(self.namespace))
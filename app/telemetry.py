@@ -0,0 +1,483 @@
+import asyncio
+import fcntl
+import json
+import math
+import mmap
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Iterable
+
+from app.logger_module.utils import get_logger_factory
+from app.metrics import TELEMETRY_READINGS
+from app.ws.framing import METRICS, decode_telemetry
+from config import TelemetrySettings, telemetry_settings
+
+get_logger = get_logger_factory(__name__)
+logger = get_logger()
+
+_STORED = TELEMETRY_READINGS.labels("stored")
+_ROLLUP_ONLY = TELEMETRY_READINGS.labels("rollup_only")
+_REJECTED = TELEMETRY_READINGS.labels("rejected")
+_METRIC_INDEX = {name: i for i, name in enumerate(METRICS)}
+
+DAY = 86400
+# Разрешение агрегата: (имя, сек на ячейку, ячеек в файле-разделе). Раздел минутных — сутки,
+# часовых — 32 дня, суточных — 512 дней
+RESOLUTIONS = (("1m", 60, 1440), ("1h", 3600, 768), ("1d", DAY, 512))
+STEPS = {name: seconds for name, seconds, _ in RESOLUTIONS}
+_CELL = 4  # count, sum, min, max — double
+_MIN_ROWS = 1024
+
+
+def pick_step(span: int) -> str:
+    """Шаг по ширине диапазона: до двух суток — минуты, до 90 дней — часы, дальше — сутки."""
+    if span <= 2 * DAY:
+        return "1m"
+    if span <= 90 * DAY:
+        return "1h"
+    return "1d"
+
+
+class _Partition:
+    __slots__ = ("file", "map", "cells", "rows")
+
+    def __init__(self, path: str, row_size: int, rows: int):
+        self.file = open(path, "r+b")
+        if os.fstat(self.file.fileno()).st_size < rows * row_size:
+            self.file.truncate(rows * row_size)  # разреженный файл: место занимают только записанные страницы
+        self.rows = os.fstat(self.file.fileno()).st_size // row_size
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        self.cells = memoryview(self.map).cast("d")
+
+    def close(self):
+        self.cells.release()
+        self.map.close()
+        self.file.close()
+
+
+class RollupSeries:
+    """
+    Агрегаты одного разрешения в файлах-разделах, отображённых в память.
+
+    Раздел — плотная матрица [строка][ячейка времени] из четвёрок double (count, sum, min, max),
+    строка — пара (устройство, метрика). Показание обновляет свою четвёрку на месте: ни чтения
+    всего ряда, ни перезаписи файла. Диапазон одной строки лежит в файле подряд, поэтому запрос
+    за месяц — это срез памяти из одного-двух разделов. Новые строки добавляются ростом файла
+    (удвоением), раздел под будущий период создаётся при первом показании в нём.
+    Открытыми держим не больше max_open разделов (LRU). Всё это — в потоке сброса TelemetryStore,
+    не в event loop. Чтение идёт через pread по файлу и годится для каталогов других воркеров.
+    """
+
+    def __init__(self, root: str, name: str, step: int, slots: int, max_open: int):
+        self.dir = os.path.join(root, name)
+        self.name = name
+        self.step = step
+        self.slots = slots
+        self.max_open = max_open
+        self._row_size = slots * _CELL * 8
+        self._open: OrderedDict[int, _Partition] = OrderedDict()
+        os.makedirs(self.dir, exist_ok=True)
+
+    def add(self, row: int, ts: int, value: float):
+        part, slot = divmod(ts // self.step, self.slots)
+        p = self._open.get(part)
+        if p is None or row >= p.rows:
+            p = self._partition(part, row + 1)
+        else:
+            self._open.move_to_end(part)
+        i = (row * self.slots + slot) * _CELL
+        cells = p.cells
+        if cells[i]:
+            cells[i] += 1
+            cells[i + 1] += value
+            if value < cells[i + 2]:
+                cells[i + 2] = value
+            elif value > cells[i + 3]:
+                cells[i + 3] = value
+        else:
+            cells[i] = 1
+            cells[i + 1] = cells[i + 2] = cells[i + 3] = value
+
+    def read(self, root: str, row: int, start: int, end: int) -> list[tuple[int, float, float, float, float]]:
+        """Непустые ячейки строки в [start, end) из каталога воркера root: (начало ячейки, count, sum, min, max)."""
+        points = []
+        first, last = start // self.step, (end - 1) // self.step
+        row_bytes = _CELL * 8
+        for part in range(first // self.slots, last // self.slots + 1):
+            base = part * self.slots
+            lo, hi = max(first - base, 0), min(last - base, self.slots - 1) + 1
+            try:
+                fd = os.open(os.path.join(root, self.name, f"{part}.roll"), os.O_RDONLY)
+            except FileNotFoundError:
+                continue
+            try:
+                # Строка за концом файла (устройство появилось после последнего роста) читается пустой
+                data = os.pread(fd, (hi - lo) * row_bytes, (row * self.slots + lo) * row_bytes)
+            finally:
+                os.close(fd)
+            cells = array("d")
+            cells.frombytes(data[:len(data) - len(data) % row_bytes])
+            for k in range(0, len(cells), _CELL):
+                if cells[k]:
+                    points.append(((base + lo + k // _CELL) * self.step, *cells[k:k + _CELL]))
+        return points
+
+    def drop_before(self, ts: int) -> int:
+        """Удаляет разделы, целиком лежащие раньше ts."""
+        limit = ts // self.step // self.slots
+        dropped = 0
+        for entry in os.listdir(self.dir):
+            part = int(entry.split(".")[0])
+            if part < limit:
+                p = self._open.pop(part, None)
+                if p is not None:
+                    p.close()
+                os.remove(os.path.join(self.dir, entry))
+                dropped += 1
+        return dropped
+
+    def flush(self):
+        for p in self._open.values():
+            p.map.flush()
+
+    def close(self):
+        for p in self._open.values():
+            p.close()
+        self._open.clear()
+
+    def _partition(self, part: int, rows: int) -> _Partition:
+        p = self._open.pop(part, None)
+        if p is None or rows > p.rows:
+            if p is not None:
+                p.close()
+            capacity = _MIN_ROWS
+            while capacity < rows:
+                capacity *= 2
+            path = os.path.join(self.dir, f"{part}.roll")
+            open(path, "ab").close()
+            p = _Partition(path, self._row_size, capacity)
+        self._open[part] = p
+        while len(self._open) > self.max_open:
+            self._open.popitem(last=False)[1].close()
+        return p
+
+
+class RawSegments:
+    """
+    Сырые показания: по суткам, по столбцу в файле — <день>.dev (u32 номер устройства),
+    .ts (u32 unix-время), .met (u8 метрика), .val (f32). Файлы только дописываются; показания
+    копятся в массивах и уходят на диск пачкой при сбросе (поток сброса TelemetryStore).
+    Столбцы нужны для выгрузки и пересчёта агрегатов; запросы API их не читают.
+    """
+    COLUMNS = (("dev", "I"), ("ts", "I"), ("met", "B"), ("val", "f"))
+
+    def __init__(self, root: str):
+        self.dir = os.path.join(root, "raw")
+        self._days: dict[int, tuple[array, ...]] = {}
+        os.makedirs(self.dir, exist_ok=True)
+
+    def append(self, device: int, ts: int, metric: int, value: float):
+        columns = self._days.get(ts // DAY)
+        if columns is None:
+            columns = self._days[ts // DAY] = tuple(array(code) for _, code in self.COLUMNS)
+        dev, stamps, met, val = columns
+        dev.append(device)
+        stamps.append(ts)
+        met.append(metric)
+        val.append(value)
+
+    def take(self) -> dict[int, tuple[array, ...]]:
+        days, self._days = self._days, {}
+        return days
+
+    def write(self, days: dict[int, tuple[array, ...]]):
+        for day, columns in days.items():
+            for (suffix, _), column in zip(self.COLUMNS, columns):
+                with open(os.path.join(self.dir, f"{day}.{suffix}"), "ab") as f:
+                    column.tofile(f)
+
+    def read(self, day: int) -> tuple[array, ...]:
+        """Столбцы суток; хвост, не дописанный во всех столбцах (сбой посреди записи), отрезается."""
+        columns = []
+        for suffix, code in self.COLUMNS:
+            column = array(code)
+            path = os.path.join(self.dir, f"{day}.{suffix}")
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    data = f.read()
+                column.frombytes(data[:len(data) - len(data) % column.itemsize])
+            columns.append(column)
+        n = min(len(c) for c in columns)
+        return tuple(c[:n] for c in columns)
+
+    def drop_before(self, ts: int) -> int:
+        limit = ts // DAY
+        dropped = 0
+        for entry in os.listdir(self.dir):
+            if int(entry.split(".")[0]) < limit:
+                os.remove(os.path.join(self.dir, entry))
+                dropped += 1
+        return dropped
+
+
+class DeviceIndex:
+    """
+    Номера устройств каталога воркера — файл devices, по id на строку. Чужой индекс
+    дочитывается с места, где остановились, когда в нём не нашлось нужного id.
+    """
+    __slots__ = ("path", "rows", "offset")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.rows: dict[str, int] = {}
+        self.offset = 0
+        self.refresh()
+
+    def refresh(self):
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(self.offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        complete = data.rfind(b"\n") + 1  # недописанную строку другого воркера оставляем на потом
+        for line in data[:complete].decode("utf-8").splitlines():
+            self.rows.setdefault(line, len(self.rows))
+        self.offset += complete
+
+    def lookup(self, device_id: str) -> int | None:
+        row = self.rows.get(device_id)
+        if row is None:
+            self.refresh()
+            row = self.rows.get(device_id)
+        return row
+
+
+class TelemetryStore:
+    """
+    Приём телеметрии устройств (мощность, энергия, напряжение, ток).
+
+    Показание попадает в сырые сегменты и в три агрегата — 1m, 1h, 1d (RollupSeries);
+    агрегаты обновляются по одному показанию, без пересчёта. Запрос диапазона читает только
+    агрегат подходящего разрешения. Сырые показания и минутные агрегаты живут raw_retention_days,
+    более старые показания (досланные после разрыва связи) идут только в часовые и суточные.
+
+    В event loop ingest только проверяет показания и копит их в списке. Файлы — запись агрегатов,
+    рост разделов, индекс устройств, удаление по сроку хранения — трогает только поток сброса
+    (раз в flush_interval), запросы тоже читают в потоке; общий для них замок loop не берёт.
+    Показание видно в запросах после ближайшего сброса.
+
+    Писатель у каталога один, поэтому каждый воркер занимает свой подкаталог w<N> (flock на
+    файле lock; после перезапуска воркер берёт первый свободный, так что подкаталогов столько,
+    сколько воркеров работало одновременно). Запрос читает агрегаты всех подкаталогов и складывает
+    ячейки: устройство могло переподключаться к разным воркерам. Номера устройств (строки
+    агрегатов) — в файле devices подкаталога; новое устройство дописывается туда до первой записи
+    его агрегатов. Агрегаты пишутся в отображённую память — переживают падение процесса, на диск
+    их сбрасывает ядро (и close). Показания за последние flush_interval при падении теряются.
+    """
+
+    def __init__(self, settings: TelemetrySettings):
+        self.settings = settings
+        self.dir: str | None = None
+        self.raw: RawSegments | None = None
+        self.series: dict[str, RollupSeries] = {}
+        self._index: DeviceIndex | None = None
+        self._index_fd: int | None = None
+        self._lock_fd: int | None = None
+        self._indexes: dict[str, DeviceIndex] = {}  # подкаталог -> индекс (свой и чужие)
+        self._pending: list[tuple[str, int, bool, list[tuple[int, float]]]] = []
+        self._files = threading.Lock()
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        await asyncio.to_thread(self._locked, self._load)
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self._flush()
+        await asyncio.to_thread(self._locked, self._close_files)
+
+    # --- приём ---
+    def ingest(self, device_id: str, ts: int | None, readings: Iterable[tuple[int, float]]) -> int:
+        """Показания одного кадра: (номер метрики в METRICS, значение). Возвращает число принятых."""
+        current = int(time.time())
+        if ts is None:
+            ts = current
+        if ts > current + self.settings.max_clock_skew or ts < current - self.settings.max_age_days * DAY:
+            readings = list(readings)
+            _REJECTED.inc(len(readings))
+            return 0
+        raw = ts >= current - self.settings.raw_retention_days * DAY
+        accepted = []
+        for metric, value in readings:
+            if math.isfinite(value):
+                accepted.append((metric, value))
+            else:
+                _REJECTED.inc()
+        if accepted:
+            self._pending.append((device_id, ts, raw, accepted))
+            (_STORED if raw else _ROLLUP_ONLY).inc(len(accepted))
+        return len(accepted)
+    def ingest_frame(self, device_id: str, frame: bytes) -> int:
+        """Двоичный кадр TELEMETRY (app/ws/framing.py)."""
+        ts, readings = decode_telemetry(frame)
+        return self.ingest(device_id, ts, readings)
+
+    def ingest_text(self, device_id: str, msg: str) -> bool:
+        """
+        Текстовый кадр {"telemetry": {"power": 12.5, "energy": 1034.2}, "ts": 1718000000};
+        ts необязателен. False — это не телеметрия, сообщение обрабатывается как раньше.
+        """
+        if not msg.startswith("{") or '"telemetry"' not in msg:
+            return False
+        try:
+            data = json.loads(msg)
+        except ValueError:
+            return False
+        values = data.get("telemetry") if isinstance(data, dict) else None
+        if not isinstance(values, dict):
+            return False
+        ts = data.get("ts")
+        readings = [(_METRIC_INDEX[name], float(value)) for name, value in values.items()
+                    if name in _METRIC_INDEX and isinstance(value, (int, float)) and not isinstance(value, bool)]
+        self.ingest(device_id, int(ts) if isinstance(ts, (int, float)) and ts > 0 else None, readings)
+        return True
+
+    # --- запросы ---
+    async def query(self, device_id: str, metric: str, start: int, end: int, step: str) -> list[dict]:
+        """Точки агрегата step в [start, end) по всем воркерам: {ts, count, avg, min, max}; пустые пропускаются."""
+        return await asyncio.to_thread(self._locked, self._query, device_id, metric, start, end, step)
+
+    def _query(self, device_id: str, metric: str, start: int, end: int, step: str) -> list[dict]:
+        self._load()
+        series = self.series[step]
+        offset = _METRIC_INDEX[metric]
+        cells: dict[int, list[float]] = {}
+        for directory, index in self._sources():
+            device = index.lookup(device_id)
+            if device is None:
+                continue
+            for ts, count, total, low, high in series.read(directory, device * len(METRICS) + offset, start, end):
+                cell = cells.get(ts)
+                if cell is None:
+                    cells[ts] = [count, total, low, high]
+                else:
+                    cell[0] += count
+                    cell[1] += total
+                    cell[2] = min(cell[2], low)
+                    cell[3] = max(cell[3], high)
+        # Без округления: round на каждую точку дороже самого чтения, форматирует клиент
+        return [{"ts": ts, "count": int(count), "avg": total / count, "min": low, "max": high}
+                for ts, (count, total, low, high) in sorted(cells.items())]
+
+    def _sources(self) -> list[tuple[str, DeviceIndex]]:
+        root = self.settings.path
+        for entry in os.listdir(root):
+            directory = os.path.join(root, entry)
+            if directory not in self._indexes and os.path.exists(os.path.join(directory, "devices")):
+                self._indexes[directory] = DeviceIndex(os.path.join(directory, "devices"))
+        return list(self._indexes.items())
+
+    # --- служебное (всё ниже — в потоке, под self._files) ---
+    def _locked(self, fn, *args):
+        with self._files:
+            return fn(*args)
+
+    def _row(self, device_id: str) -> int:
+        index = self._index
+        device = index.rows.get(device_id)
+        if device is None:
+            line = f"{device_id}\n".encode()
+            os.write(self._index_fd, line)
+            device = index.rows[device_id] = len(index.rows)
+            index.offset += len(line)
+        return device
+
+    def _load(self):
+        if self._index is not None:
+            return
+        s = self.settings
+        os.makedirs(s.path, exist_ok=True)
+        n = 0
+        while True:
+            directory = os.path.join(s.path, f"w{n}")
+            os.makedirs(directory, exist_ok=True)
+            lock_fd = os.open(os.path.join(directory, "lock"), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                os.close(lock_fd)  # подкаталог занят живым воркером — берём следующий
+                n += 1
+        index = os.path.join(directory, "devices")
+        self._index_fd = os.open(index, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._index = self._indexes[directory] = DeviceIndex(index)
+        self.raw = RawSegments(directory)
+        self.series = {name: RollupSeries(directory, name, step, slots, s.open_partitions)
+                       for name, step, slots in RESOLUTIONS}
+        self.dir, self._lock_fd = directory, lock_fd
+
+    def _apply(self, frames: list[tuple[str, int, bool, list[tuple[int, float]]]]):
+        self._load()
+        minute, hour, day = self.series["1m"], self.series["1h"], self.series["1d"]
+        width = len(METRICS)
+        for device_id, ts, raw, readings in frames:
+            device = self._row(device_id)
+            base = device * width
+            for metric, value in readings:
+                row = base + metric
+                if raw:
+                    self.raw.append(device, ts, metric, value)
+                    minute.add(row, ts, value)
+                hour.add(row, ts, value)
+                day.add(row, ts, value)
+        self.raw.write(self.raw.take())
+
+    def _close_files(self):
+        if self._index is None:
+            return
+        for series in self.series.values():
+            series.flush()
+            series.close()
+        os.close(self._index_fd)
+        os.close(self._lock_fd)  # снимает flock: подкаталог снова свободен
+        del self._indexes[self.dir]
+        self.dir, self.raw, self.series = None, None, {}
+        self._index, self._index_fd, self._lock_fd = None, None, None
+
+    def _drop_expired(self) -> tuple[int, int]:
+        self._load()
+        cutoff = int(time.time()) - self.settings.raw_retention_days * DAY
+        return cutoff, self.raw.drop_before(cutoff) + self.series["1m"].drop_before(cutoff)
+
+    async def _run(self):
+        swept = 0.0
+        while True:
+            await asyncio.sleep(self.settings.flush_interval)
+            try:
+                await self._flush()
+                if time.monotonic() - swept > 3600:
+                    swept = time.monotonic()
+                    await self._sweep()
+            except Exception as e:
+                logger.exception(f"Telemetry flush failed: {e}")
+
+    async def _flush(self):
+        frames, self._pending = self._pending, []
+        if frames:
+            await asyncio.to_thread(self._locked, self._apply, frames)
+
+    async def _sweep(self):
+        cutoff, dropped = await asyncio.to_thread(self._locked, self._drop_expired)
+        if dropped:
+            logger.info(f"Telemetry retention: removed {dropped} files older than {cutoff}")
+
+
+telemetry_store = TelemetryStore(telemetry_settings)
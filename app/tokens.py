@@ -0,0 +1,146 @@
+import asyncio
+import heapq
+import secrets
+from typing import Any, Dict
+
+from app.logger_module.utils import get_logger_factory
+from app.storage.write_behind import StoredMapping
+from config import (access_tokens, refresh_tokens, auth_codes, now, ACCESS_TTL, REFRESH_TTL, AUTH_CODE_TTL,
+                    TOKEN_SWEEP_INTERVAL, TOKEN_SWEEP_BATCH)
+
+get_logger = get_logger_factory(__name__)
+logger = get_logger()
+
+
+class TokenService:
+    """
+    Выдача и проверка OAuth-кодов и токенов Алисы.
+    Записи живут в хранилище (access_tokens / refresh_tokens / auth_codes),
+    проверка — одно чтение по ключу. Сроки жизни разложены по корзинам-секундам
+    (exp -> {вид: [токен]}) с кучей номеров корзин; фоновая задача снимает
+    просроченные записи пачками по sweep_batch, отдавая управление циклу между пачками.
+    """
+
+    def __init__(self, stores: Dict[str, StoredMapping], sweep_interval: float = TOKEN_SWEEP_INTERVAL,
+                 sweep_batch: int = TOKEN_SWEEP_BATCH):
+        self.stores = stores
+        self.sweep_interval = sweep_interval
+        self.sweep_batch = sweep_batch
+        self.swept = 0
+        # Списки строк, а не кортежей: миллионы записей не добавляют объектов для сборщика мусора
+        self._buckets: dict[int, dict[str, list[str]]] = {}
+        self._due: list[int] = []  # куча exp непустых корзин
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        # Записи, выданные до перезапуска: читаем в потоке, чтобы не держать цикл
+        loaded = await asyncio.to_thread(self._scan)
+        for exp, bucket in self._buckets.items():
+            for kind, tokens in bucket.items():
+                loaded.setdefault(exp, {}).setdefault(kind, []).extend(tokens)
+        self._buckets = loaded
+        self._due = list(loaded)
+        heapq.heapify(self._due)
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    # --- выдача ---
+    def issue_code(self, user_id: str, client_id: str, redirect_uri: str) -> str:
+        code = secrets.token_urlsafe(24)
+        self._put("code", code, {"user_id": user_id, "client_id": client_id,
+                                 "redirect_uri": redirect_uri, "exp": now() + AUTH_CODE_TTL})
+        return code
+
+    def consume_code(self, code: str, client_id: str) -> Dict[str, Any] | None:
+        """Код одноразовый: удаляется при первом предъявлении, даже просроченный."""
+        data = auth_codes.get(code)
+        if data is None:
+            return None
+        auth_codes.discard(code)
+        if data["exp"] < now() or data["client_id"] != client_id:
+            return None
+        return data
+
+    def issue_pair(self, user_id: str, client_id: str) -> Dict[str, Any]:
+        access = secrets.token_urlsafe(32)
+        refresh = secrets.token_urlsafe(32)
+        ts = now()
+        self._put("access", access, {"user_id": user_id, "client_id": client_id,
+                                     "exp": ts + ACCESS_TTL, "refresh_token": refresh})
+        self._put("refresh", refresh, {"user_id": user_id, "client_id": client_id, "exp": ts + REFRESH_TTL})
+        return {
+            "token_type": "bearer",
+            "access_token": access,
+            "expires_in": ACCESS_TTL,
+            "refresh_token": refresh,
+            "scope": "devices"
+        }
+
+    def rotate(self, refresh: str, client_id: str) -> Dict[str, Any] | None:
+        """Меняет refresh-токен на новую пару; старый refresh больше не действует."""
+        info = refresh_tokens.get(refresh)
+        if not info or info["exp"] < now() or info["client_id"] != client_id:
+            return None
+        refresh_tokens.discard(refresh)
+        return self.issue_pair(info["user_id"], client_id)
+
+    # --- проверка ---
+    def user_id(self, access: str) -> str | None:
+        t = access_tokens.get(access)
+        if not t or t["exp"] < now():
+            return None
+        return t["user_id"]
+
+    # --- уборка ---
+    def sweep(self, limit: int) -> int:
+        """Удаляет до limit просроченных записей, возвращает сколько удалено."""
+        due, ts, removed = self._due, now(), 0
+        while due and due[0] < ts and removed < limit:
+            bucket = self._buckets[due[0]]
+            for kind, tokens in bucket.items():
+                n = min(limit - removed, len(tokens))
+                store = self.stores[kind]
+                # Запись могла уже уйти раньше срока (использованный код, ротация) — удаление вслепую безвредно
+                for token in tokens[len(tokens) - n:]:
+                    store.discard(token)
+                del tokens[len(tokens) - n:]
+                removed += n
+            if not any(bucket.values()):
+                del self._buckets[heapq.heappop(due)]
+        self.swept += removed
+        return removed
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                while self.sweep(self.sweep_batch) == self.sweep_batch:
+                    await asyncio.sleep(0)
+            except Exception as e:
+                logger.exception(f"[tokens] Sweep failed: {e}")
+
+    def _put(self, kind: str, token: str, data: Dict[str, Any]):
+        self.stores[kind][token] = data
+        bucket = self._buckets.get(data["exp"])
+        if bucket is None:
+            bucket = self._buckets[data["exp"]] = {}
+            heapq.heappush(self._due, data["exp"])
+        bucket.setdefault(kind, []).append(token)
+
+    def _scan(self) -> dict[int, dict[str, list[str]]]:
+        buckets: dict[int, dict[str, list[str]]] = {}
+        for kind, store in self.stores.items():
+            for token, data in store.scan():
+                buckets.setdefault(data["exp"], {}).setdefault(kind, []).append(token)
+        return buckets
+
+    def __len__(self) -> int:
+        return sum(len(tokens) for bucket in self._buckets.values() for tokens in bucket.values())
+
+
+token_service = TokenService({"access": access_tokens, "refresh": refresh_tokens, "code": auth_codes})
@@ -0,0 +1,132 @@
+import math
+import random
+import time
+
+from fastapi.websockets import WebSocket
+from starlette.responses import Response
+
+from config import AdmissionSettings, admission_settings
+
+# Код закрытия WebSocket «попробуйте позже» (RFC 6455, 1013)
+WS_TRY_AGAIN_LATER = 1013
+
+
+class TokenBuckets:
+    """
+    Token bucket на ключ (IP, id устройства): rate токенов в секунду, не больше burst.
+    Состояние — [токены, время] на ключ; ключей не больше max_keys: при переполнении
+    выбрасываются только полностью восстановившиеся корзины (их состояние равно новой).
+    Корзины с недобранными токенами или штрафом не трогаем: иначе вытеснение обнуляло бы
+    ограничение. Если выбросить нечего, новый ключ ждёт, пока восстановится первая корзина.
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets: dict[str, list[float]] = {}
+        self._next_full = 0.0  # monotonic-время, раньше которого ни одна корзина не восстановится
+
+    def take(self, key: str, cost: float = 1.0) -> float:
+        """0, если токен взят; иначе через сколько секунд он появится."""
+        now = time.monotonic()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= self.max_keys:
+                if now < self._next_full or not self._prune(now):
+                    return self._next_full - now
+            bucket = self.buckets[key] = [self.burst, now]
+        tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if tokens >= cost:
+            bucket[0] = tokens - cost
+            return 0.0
+        bucket[0] = tokens
+        return (cost - tokens) / self.rate
+
+    def penalize(self, key: str, cost: float):
+        """Списывает токены сверх доступного (неудачная авторизация), уводя корзину в минус."""
+        bucket = self.buckets.get(key)
+        if bucket is not None:
+            bucket[0] -= cost
+
+    def _prune(self, now: float) -> bool:
+        """Выбрасывает восстановившиеся корзины; False — таких нет (до _next_full и не будет)."""
+        full, next_full = [], math.inf
+        for key, (tokens, ts) in self.buckets.items():
+            ready = ts + (self.burst - tokens) / self.rate
+            if ready <= now:
+                full.append(key)
+            elif ready < next_full:
+                next_full = ready
+        for key in full:
+            del self.buckets[key]
+        # Проход по всем корзинам дорог: до восстановления первой из оставшихся его не повторяем
+        self._next_full = next_full if not full else 0.0
+        return bool(full)
+
+
+class HandshakeAdmission:
+    """
+    Допуск к рукопожатию устройства до accept: ограничение числа одновременных
+    рукопожатий, их общего темпа и частоты попыток с одного IP и для одного устройства.
+
+    Сверх общего темпа устройство не просто отправляется «попробовать позже», а
+    записывается на своё время: retry_after растёт на 1 / handshake_rate с каждым
+    отказом, так что вернувшиеся приходят ровно с той скоростью, которую воркер
+    успевает обслужить, а не все разом через пару секунд.
+    """
+
+    def __init__(self, settings: AdmissionSettings):
+        self.settings = settings
+        self.active = 0
+        self.pace = TokenBuckets(settings.handshake_rate, settings.max_handshakes, 1)
+        self.booked_until = 0.0  # monotonic-время последней выданной записи
+        self.by_ip = TokenBuckets(settings.ip_rate, settings.ip_burst, settings.max_tracked_keys)
+        self.by_device = TokenBuckets(settings.device_rate, settings.device_burst, settings.max_tracked_keys)
+
+    def admit(self, ip: str, device_id: str) -> tuple[str, float] | None:
+        """None — можно начинать рукопожатие (и потом вызвать release); иначе (причина, retry_after)."""
+        if self.active >= self.settings.max_handshakes or self.pace.take(""):
+            return "busy", self._book()
+        # Сначала IP: поток с одного адреса, уже упёршийся в лимит, не должен тратить
+        # корзину устройства, чей id он подставляет, — иначе настоящее устройство не войдёт
+        wait = self.by_ip.take(ip)
+        if wait:
+            return "ip_rate", self._jitter(wait)
+        wait = self.by_device.take(device_id)
+        if wait:
+            return "device_rate", self._jitter(wait)
+        self.active += 1
+        return None
+
+    def release(self):
+        self.active -= 1
+
+    def auth_failed(self, ip: str, device_id: str):
+        # Вместо sleep перед закрытием: следующая попытка с этого устройства/IP откладывается
+        self.by_device.penalize(device_id, self.settings.device_burst)
+        self.by_ip.penalize(ip, 1)
+
+    def _book(self) -> float:
+        now = time.monotonic()
+        self.booked_until = max(self.booked_until, now) + 1 / self.settings.handshake_rate
+        return self._jitter(self.booked_until - now)
+
+    def _jitter(self, seconds: float) -> float:
+        return max(seconds, 0.1) + random.uniform(0, self.settings.retry_jitter)
+
+
+async def reject(ws: WebSocket, retry_after: float):
+    """
+    Отказ до accept: HTTP 429 с Retry-After, если сервер умеет отвечать на upgrade обычным
+    ответом (расширение websocket.http.response), иначе accept + close(1013, "retry_after=...").
+    """
+    if "websocket.http.response" in ws.scope.get("extensions", {}):
+        await ws.send_denial_response(Response(status_code=429, headers={"Retry-After": str(math.ceil(retry_after))}))
+        return
+    await ws.accept()
+    await ws.close(code=WS_TRY_AGAIN_LATER, reason=f"retry_after={retry_after:.1f}")
+
+
+handshake_admission = HandshakeAdmission(admission_settings)
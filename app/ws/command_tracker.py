@@ -0,0 +1,92 @@
+import asyncio
+
+from app.logger_module.utils import get_logger_factory
+from config import MAX_COMMANDS_IN_FLIGHT
+
+get_logger = get_logger_factory(__name__)
+logger = get_logger()
+
+
+_BINARY_OK = {"status": "ok"}  # результат для ack без тела; только для чтения
+ID_LIMIT = 2 ** 32  # id команды в bin1 — u32 (app/ws/framing.py); 0 там означает «без id»
+
+
+class CommandError(Exception):
+    """Команда не подтверждена устройством; error_code — код ошибки для Алисы."""
+
+    def __init__(self, error_code: str, message: str = ""):
+        super().__init__(message or error_code)
+        self.error_code = error_code
+
+
+class CommandTracker:
+    """
+    Таблица команд «в полёте»: device_id -> {command_id: Future}.
+    Future завершается, когда из _listen приходит ack с тем же id.
+    На одно устройство держим не больше max_in_flight неподтверждённых команд.
+    Номера идут по кругу 1 .. ID_LIMIT - 1, чтобы долгоживущий воркер не вышел за u32 бинарного кадра.
+    """
+
+    def __init__(self, max_in_flight: int = 16):
+        self.max_in_flight = max_in_flight
+        self.pending: dict[str, dict[str, asyncio.Future]] = {}
+        self._last_id = 0
+
+    def open(self, device_id: str) -> tuple[str, asyncio.Future]:
+        device_pending = self.pending.setdefault(device_id, {})
+        if len(device_pending) >= self.max_in_flight:
+            raise CommandError("DEVICE_BUSY", f"{device_id}: too many commands in flight")
+        command_id = self._next_id()
+        while command_id in device_pending:
+            # После круга номер может ещё висеть у этого же устройства — берём следующий
+            command_id = self._next_id()
+        future = asyncio.get_running_loop().create_future()
+        device_pending[command_id] = future
+        return command_id, future
+
+    def _next_id(self) -> str:
+        self._last_id = self._last_id % (ID_LIMIT - 1) + 1
+        return str(self._last_id)
+
+    def discard(self, device_id: str, command_id: str):
+        device_pending = self.pending.get(device_id)
+        if device_pending is None:
+            return
+        device_pending.pop(command_id, None)
+        if not device_pending:
+            del self.pending[device_id]
+
+    def resolve(self, device_id: str, ack: dict) -> bool:
+        """Возвращает True, если сообщение оказалось ответом на нашу команду."""
+        error_code = None
+        if ack.get("status", "ok") != "ok":
+            error_code = ack.get("error_code") or "INTERNAL_ERROR"
+        return self.resolve_id(device_id, str(ack.get("id")), error_code, ack)
+
+    def resolve_id(self, device_id: str, command_id: str, error_code: str | None = None,
+                   ack: dict | None = None) -> bool:
+        """То же по уже разобранным полям (бинарный ack — без словаря на сообщение)."""
+        device_pending = self.pending.get(device_id)
+        if not device_pending:
+            return False
+        future = device_pending.get(command_id)
+        if future is None:
+            return False
+        if not future.done():
+            if error_code is None:
+                future.set_result(ack if ack is not None else _BINARY_OK)
+            else:
+                future.set_exception(CommandError(error_code, str(ack) if ack else error_code))
+        return True
+
+    def fail_device(self, device_id: str, error_code: str = "DEVICE_UNREACHABLE"):
+        """Соединение потеряно — все ожидающие команды устройства завершаются ошибкой."""
+        for future in self.pending.pop(device_id, {}).values():
+            if not future.done():
+                future.set_exception(CommandError(error_code, f"{device_id}: connection lost"))
+
+    def in_flight(self, device_id: str) -> int:
+        return len(self.pending.get(device_id, ()))
+
+
+command_tracker = CommandTracker(MAX_COMMANDS_IN_FLIGHT)
@@ -0,0 +1,121 @@
+import asyncio
+import hashlib
+import hmac
+import secrets
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from app.metrics import DEVICE_AUTH_CHECKS
+from app.storage.write_behind import StoredMapping
+from config import CredentialSettings, credential_settings, device_secrets
+
+
+class DeviceCredentials:
+    """
+    Секреты устройств: в хранилище лежат только соль и PBKDF2-хеш (device_id -> {salt, hash, iterations}).
+
+    Хеширование идёт в отдельном пуле потоков (hashlib отпускает GIL), так что цикл событий
+    не стоит на время проверки. Успешная проверка запоминается на cache_ttl: при повторном
+    подключении того же устройства с тем же секретом хватает одного HMAC от ключа процесса.
+    Одновременные проверки одного устройства с одним секретом считаются один раз.
+
+    Устройства без своего секрета (старые прошивки) принимаются по общему legacy_token,
+    пока он задан. Переход: владелец получает секрет устройства через
+    POST /v1.0/user/devices/{id}/secret и прошивает его; с этого момента legacy_token
+    для устройства не действует. Когда проверки "legacy" в device_auth_checks_total
+    перестали расти, общий токен выключают (DEVICE_AUTH_LEGACY_TOKEN="").
+    Смена секрета на другом воркере видна здесь не позже чем через cache_ttl.
+    """
+
+    def __init__(self, store: StoredMapping, settings: CredentialSettings):
+        self.store = store
+        self.settings = settings
+        self._pool: ThreadPoolExecutor | None = None  # создаётся при первом хешировании, close() его закрывает
+        self._key = secrets.token_bytes(32)  # для отпечатков в кэше; в хранилище не попадает
+        self._cache: OrderedDict[str, tuple[bytes, float]] = OrderedDict()  # device_id -> (отпечаток, до когда)
+        self._inflight: dict[tuple[str, bytes], asyncio.Future] = {}
+
+    # --- выдача ---
+    async def issue(self, device_id: str) -> str:
+        """Новый секрет устройства; возвращается один раз, в хранилище остаётся только хеш."""
+        secret = secrets.token_urlsafe(32)
+        record = await asyncio.get_running_loop().run_in_executor(
+            self._executor(), self._hash, secret, secrets.token_bytes(16), self.settings.iterations)
+        self.store[device_id] = record
+        self._cache.pop(device_id, None)
+        return secret
+
+    def revoke(self, device_id: str):
+        self.store.discard(device_id)
+        self._cache.pop(device_id, None)
+
+    # --- проверка ---
+    async def verify(self, device_id: str, secret) -> bool:
+        if not isinstance(secret, str) or not secret:
+            return False
+        fingerprint = hmac.new(self._key, f"{device_id}\0{secret}".encode(), hashlib.sha256).digest()
+        cached = self._cache.get(device_id)
+        if cached is not None:
+            if cached[1] > time.monotonic() and hmac.compare_digest(cached[0], fingerprint):
+                self._cache.move_to_end(device_id)
+                DEVICE_AUTH_CHECKS.labels("cache").inc()
+                return True
+            del self._cache[device_id]
+
+        record = self.store.get(device_id)
+        if record is None:
+            DEVICE_AUTH_CHECKS.labels("legacy").inc()
+            legacy = self.settings.legacy_token
+            return bool(legacy) and hmac.compare_digest(secret.encode(), legacy.encode())
+
+        key = (device_id, fingerprint)
+        pending = self._inflight.get(key)
+        if pending is None:
+            DEVICE_AUTH_CHECKS.labels("hash").inc()
+            pending = asyncio.get_running_loop().run_in_executor(self._executor(), self._check, record, secret)
+            self._inflight[key] = pending
+            pending.add_done_callback(lambda _: self._inflight.pop(key, None))
+        ok, upgraded = await asyncio.shield(pending)
+        if not ok:
+            return False
+        if upgraded is not None and self.store.get(device_id) == record:
+            # Параметры ужесточили — сохраняем перехешированный секрет, если его не сменили за время проверки
+            self.store[device_id] = upgraded
+        self._remember(device_id, fingerprint)
+        return True
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _executor(self) -> ThreadPoolExecutor:
+        # После close() (конец lifespan) пул поднимается заново: приложение могут запустить ещё раз
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.settings.workers, thread_name_prefix="device-auth")
+        return self._pool
+
+    def _check(self, record: dict, secret: str) -> tuple[bool, dict | None]:
+        # Выполняется в пуле потоков; второй элемент — запись с текущими параметрами, если они сменились
+        salt = bytes.fromhex(record["salt"])
+        expected = self._hash(secret, salt, record["iterations"])["hash"]
+        if not hmac.compare_digest(expected, record["hash"]):
+            return False, None
+        if record["iterations"] != self.settings.iterations:
+            return True, self._hash(secret, secrets.token_bytes(16), self.settings.iterations)
+        return True, None
+
+    def _remember(self, device_id: str, fingerprint: bytes):
+        self._cache[device_id] = (fingerprint, time.monotonic() + self.settings.cache_ttl)
+        self._cache.move_to_end(device_id)
+        while len(self._cache) > self.settings.cache_size:
+            self._cache.popitem(last=False)
+
+    @staticmethod
+    def _hash(secret: str, salt: bytes, iterations: int) -> dict:
+        digest = hashlib.pbkdf2_hmac("sha256", secret.encode(), salt, iterations)
+        return {"salt": salt.hex(), "hash": digest.hex(), "iterations": iterations}
+
+
+device_credentials = DeviceCredentials(device_secrets, credential_settings)
@@ -0,0 +1,118 @@
+import json
+import struct
+
+from fastapi.websockets import WebSocket, WebSocketDisconnect
+
+# Форматы кадров; устройство просит нужный в auth-сообщении: {"auth_token": ..., "frame": "bin1"}
+FORMAT_JSON = "json"
+FORMAT_BINARY = "bin1"
+
+# bin1: первый байт — тип кадра, дальше поля фиксированной длины, little-endian
+PING = 0x01  # сервер -> устройство, без полей
+PONG = 0x02  # устройство -> сервер, без полей
+COMMAND = 0x10  # сервер -> устройство: u32 id команды (0 — ack не нужен), u8 действие
+ACK = 0x11  # устройство -> сервер: u32 id команды, u8 статус (0 — ok, n — ERROR_CODES[n - 1])
+STATE = 0x20  # устройство -> сервер: u8 вкл/выкл
+TELEMETRY = 0x21  # устройство -> сервер: u32 unix-время (0 — время сервера), дальше пары u8 метрика + f32 значение
+TEXT = 0x7F  # в любую сторону: UTF-8 текст (JSON-сообщения, для которых нет своего кадра)
+
+ACTIONS = ("turn_off", "turn_on")
+METRICS = ("power", "energy", "voltage", "current")  # Вт, Вт·ч (накопительный счётчик), В, А
+ERROR_CODES = ("INTERNAL_ERROR", "DEVICE_BUSY", "DEVICE_UNREACHABLE", "INVALID_ACTION", "INVALID_VALUE",
+               "NOT_SUPPORTED")
+
+_ACTION_CODES = {action: code for code, action in enumerate(ACTIONS)}
+_COMMAND = struct.Struct("<BIB")
+_ACK = struct.Struct("<BIB")
+_TELEMETRY = struct.Struct("<BI")
+_READING = struct.Struct("<Bf")
+_TEXT_PREFIX = bytes([TEXT])
+
+PING_FRAME = bytes([PING])
+PONG_FRAME = bytes([PONG])
+STATE_OFF_FRAME = bytes([STATE, 0])
+STATE_ON_FRAME = bytes([STATE, 1])
+
+
+def encode_command(action: str, command_id: int = 0) -> bytes:
+    return _COMMAND.pack(COMMAND, command_id, _ACTION_CODES[action])
+
+
+def command_template(action: str, binary: bool) -> tuple[str, bytes | str, bytes | str]:
+    """
+    Кадр команды без id — для заранее собранных рассылок (app/groups.py): (метод сокета, начало, конец).
+    Кадр = начало + id + конец; id в bin1 — u32 little-endian, в JSON — строка. JSON-кадр совпадает
+    с тем, что отправил бы send_json({"action": ..., "id": ...}).
+    """
+    if binary:
+        return "send_bytes", bytes([COMMAND]), bytes([_ACTION_CODES[action]])
+    return "send_text", '{"action":' + json.dumps(action) + ',"id":"', '"}'
+
+
+def encode_ack(command_id: int, error_code: str | None = None) -> bytes:
+    return _ACK.pack(ACK, command_id, 0 if error_code is None else ERROR_CODES.index(error_code) + 1)
+
+
+def encode_text(text: str) -> bytes:
+    return _TEXT_PREFIX + text.encode()
+
+
+def encode_message(data: dict) -> bytes:
+    """Команда реле — кадром COMMAND, всё остальное — JSON внутри TEXT."""
+    action = data.get("action")
+    if action in _ACTION_CODES:
+        return _COMMAND.pack(COMMAND, int(data.get("id", 0)), _ACTION_CODES[action])
+    return encode_text(json.dumps(data, separators=(",", ":"), ensure_ascii=False))
+
+
+def encode_telemetry(readings: dict[str, float], ts: int = 0) -> bytes:
+    return _TELEMETRY.pack(TELEMETRY, ts) + b"".join(_READING.pack(METRICS.index(m), v) for m, v in readings.items())
+
+
+def decode_telemetry(frame: bytes) -> tuple[int | None, list[tuple[int, float]]]:
+    """(unix-время или None, [(номер метрики в METRICS, значение)]); неизвестные метрики пропускаются."""
+    _, ts = _TELEMETRY.unpack_from(frame)
+    body = frame[_TELEMETRY.size:]
+    body = body[:len(body) - len(body) % _READING.size]  # обрезанный хвост не роняет весь кадр
+    readings = [(m, v) for m, v in _READING.iter_unpack(body) if m < len(METRICS)]
+    return ts or None, readings
+
+
+def decode_ack(frame: bytes) -> tuple[int, str | None]:
+    """(id команды, код ошибки или None)."""
+    _, command_id, status = _ACK.unpack_from(frame)
+    if status == 0:
+        return command_id, None
+    return command_id, ERROR_CODES[status - 1] if status <= len(ERROR_CODES) else "INTERNAL_ERROR"
+
+
+class BinaryDeviceSocket:
+    """
+    Сокет устройства, договорившегося о bin1. Снаружи выглядит как WebSocket
+    (send_json / send_text / close), поэтому менеджер, heartbeat и обработчики
+    событий работают с ним как раньше, а кодирование происходит здесь.
+    """
+    __slots__ = ("ws",)
+
+    def __init__(self, ws: WebSocket):
+        self.ws = ws
+
+    async def send_json(self, data: dict):
+        await self.ws.send_bytes(encode_message(data))
+
+    async def send_text(self, text: str):
+        await self.ws.send_bytes(PING_FRAME if text == "ping" else encode_text(text))
+
+    async def send_bytes(self, frame: bytes):
+        """Уже закодированный кадр bin1."""
+        await self.ws.send_bytes(frame)
+
+    async def receive_frame(self) -> bytes | str:
+        message = await self.ws.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+        data = message.get("bytes")
+        return data if data is not None else message.get("text", "")
+
+    async def close(self, code: int = 1000):
+        await self.ws.close(code)
@@ -0,0 +1,105 @@
+import asyncio
+import time
+
+from fastapi import WebSocket
+
+from app.logger_module.utils import get_logger_factory
+from app.device_table import DeviceTable, device_table
+from app.metrics import WS_MESSAGES_OUT
+from app.ws.websocket_manager import device_ws_manager
+from config import HEARTBEAT_INTERVAL, PONG_TIMEOUT
+
+get_logger = get_logger_factory(__name__)
+logger = get_logger()
+
+_OUT_PING = WS_MESSAGES_OUT.labels("ping")
+
+
+class HeartbeatScheduler:
+    """
+    Один таймер на все подключения вместо ping-задачи на каждое устройство.
+    Подключения разложены по слотам колеса; каждый тик (interval / slots)
+    обрабатывается один слот: живым уходит ping, просроченные закрываются разом.
+    Так каждое устройство пингуется раз в interval секунд.
+    Время последнего pong и сокет берутся из DeviceTable, слот колеса — номер строки по модулю.
+    """
+
+    def __init__(self, interval: float = HEARTBEAT_INTERVAL, timeout: float = PONG_TIMEOUT, slots: int = 10,
+                 table: DeviceTable = device_table):
+        self.interval = interval
+        self.timeout = timeout
+        self.tick = interval / slots
+        self.table = table
+        # Строки таблицы выдаются подряд, так что раскладка по слотам получается равномерной
+        self.wheel: list[set[str]] = [set() for _ in range(slots)]
+        self._cursor = 0
+        self._task: asyncio.Task | None = None
+
+    def register(self, device_id: str, ws: WebSocket):
+        row = self.table.slot(device_id)
+        if row is None:
+            row = self.table.attach(device_id)
+        if self.table.conn[row] is not ws:
+            self.table.set_conn(row, ws)
+        self.wheel[row % len(self.wheel)].add(device_id)
+        self.table.last_pong[row] = time.monotonic()
+        self._ensure_running()
+
+    def unregister(self, device_id: str, ws: WebSocket | None = None):
+        row = self.table.slot(device_id)
+        if row is None:
+            return
+        if ws is not None and self.table.conn[row] is not ws:
+            return
+        self.wheel[row % len(self.wheel)].discard(device_id)
+
+    def pong(self, device_id: str):
+        row = self.table.slot(device_id)
+        if row is not None:
+            self.table.last_pong[row] = time.monotonic()
+
+    def _ensure_running(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            slot = self._cursor
+            self._cursor = (slot + 1) % len(self.wheel)
+            try:
+                await self._sweep(slot)
+            except Exception as e:
+                logger.exception(f"[PING] Heartbeat sweep failed: {e}")
+
+    async def _sweep(self, slot: int):
+        bucket = self.wheel[slot]
+        if not bucket:
+            return
+        table = self.table
+        deadline = time.monotonic() - self.timeout
+        alive, stale = [], []
+        for device_id in list(bucket):
+            row = table.index.get(device_id)
+            ws = table.conn[row] if row is not None else None
+            if ws is None or row % len(self.wheel) != slot:
+                # Устройство уже отключено (или получило новую строку) в обход heartbeat
+                bucket.discard(device_id)
+            elif table.last_pong[row] < deadline:
+                stale.append((device_id, ws))
+            else:
+                alive.append(ws)
+
+        if stale:
+            logger.warning(f"[PING] No pong for >{self.timeout:g}s from {len(stale)} device(s): "
+                           f"{', '.join(d for d, _ in stale[:10])}")
+            for device_id, ws in stale:
+                self.unregister(device_id, ws)
+            await asyncio.gather(*(device_ws_manager.remove(d, ws) for d, ws in stale))
+
+        await asyncio.gather(*(ws.send_text("ping") for ws in alive), return_exceptions=True)
+        _OUT_PING.inc(len(alive))
+
+
+heartbeat = HeartbeatScheduler()
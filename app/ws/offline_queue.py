@@ -0,0 +1,149 @@
+import asyncio
+import itertools
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+from app.logger_module.utils import get_logger_factory
+from app.storage.cache import LRUCache, MISSING
+from app.storage.write_behind import StoredMapping
+from config import pending_commands, now, OFFLINE_COMMAND_TTL, OFFLINE_QUEUE_MAX_DEVICES
+
+get_logger = get_logger_factory(__name__)
+logger = get_logger()
+
+
+class OfflineCommandQueue:
+    """
+    Команды для устройств, до которых не удалось достучаться.
+    Хранятся в pending_commands: device_id -> {ключ умения: {"frame": команда, "exp": срок, "seq": номер}}.
+    Новая команда с тем же ключом заменяет старую — устройство получит только последнее
+    желаемое состояние. Очередь отдаётся устройству при переподключении (take).
+
+    Номер seq растёт с каждой командой; discard запоминает (на ttl) номер, до которого
+    команды ключа устарели. Так недоставленная при досылке команда (restore) не вернётся
+    в очередь, если за время досылки пользователь уже подтвердил другое состояние.
+
+    В памяти — только порядок устройств по сроку (OrderedDict); сверх max_devices
+    вытесняются самые старые, просроченные снимаются фоновой уборкой.
+    """
+
+    def __init__(self, store: StoredMapping, ttl: float = OFFLINE_COMMAND_TTL,
+                 max_devices: int = OFFLINE_QUEUE_MAX_DEVICES, sweep_interval: float = 5.0,
+                 sweep_batch: int = 1000):
+        self.store = store
+        self.ttl = ttl
+        self.max_devices = max_devices
+        self.sweep_interval = sweep_interval
+        self.sweep_batch = sweep_batch
+        self.collapsed = 0
+        self.expired = 0
+        self.evicted = 0
+        self._order: OrderedDict[str, int] = OrderedDict()  # device_id -> срок самой свежей команды
+        # Счёт с текущего времени в нс: номера команд, переживших перезапуск, остаются меньше новых
+        self._seq = itertools.count(time.time_ns())
+        # (device_id, ключ) -> seq, до которого включительно команды устарели; старше ttl не нужны
+        self._settled = LRUCache(max_devices, ttl)
+        self._task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    async def start(self):
+        # Очередь, пережившая перезапуск: читаем в потоке, чтобы не держать цикл
+        loaded = dict(await asyncio.to_thread(self._scan))
+        loaded.update(self._order)
+        self._order = OrderedDict(sorted(loaded.items(), key=lambda item: item[1]))
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def put(self, device_id: str, key: str, frame: Dict[str, Any]):
+        entries = self.store.get(device_id) or {}
+        if key in entries:
+            self.collapsed += 1
+        exp = now() + int(self.ttl)
+        entries[key] = {"frame": frame, "exp": exp, "seq": next(self._seq)}
+        self.store[device_id] = entries
+        self._touch(device_id, exp)
+
+    def discard(self, device_id: str, key: str):
+        """Команда устарела: устройство подтвердило более новую или его переключили вручную."""
+        # Запоминаем и без очереди: забранная take команда могла ещё не дойти до устройства
+        self._settled.put((device_id, key), next(self._seq))
+        if device_id not in self._order:
+            return
+        entries = self.store.get(device_id) or {}
+        if entries.pop(key, None) is None:
+            return
+        if entries:
+            self.store[device_id] = entries
+        else:
+            self.store.discard(device_id)
+            del self._order[device_id]
+
+    def take(self, device_id: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """Забирает непросроченные команды устройства: [(ключ, {"frame", "exp"})]."""
+        entries = self.store.get(device_id)
+        if not entries:
+            return []
+        self.store.discard(device_id)
+        self._order.pop(device_id, None)
+        ts = now()
+        alive = [(key, entry) for key, entry in entries.items() if entry["exp"] >= ts]
+        self.expired += len(entries) - len(alive)
+        return alive
+
+    def restore(self, device_id: str, entries: List[Tuple[str, Dict[str, Any]]]):
+        """Возвращает в очередь то, что не удалось доставить при переподключении (сроки прежние)."""
+        current = self.store.get(device_id) or {}
+        for key, entry in entries:
+            settled = self._settled.get((device_id, key))
+            if settled is not MISSING and entry.get("seq", 0) <= settled:
+                # Пока шла доставка, команду подтвердили или отменили — она уже не желаемое состояние
+                continue
+            # Пока шла доставка, могла прийти более новая команда — её не затираем
+            current.setdefault(key, entry)
+        if current:
+            self.store[device_id] = current
+            self._touch(device_id, max(entry["exp"] for entry in current.values()))
+
+    def sweep(self, limit: int) -> int:
+        ts, removed = now(), 0
+        while self._order and removed < limit:
+            device_id, exp = next(iter(self._order.items()))
+            if exp >= ts:
+                break
+            del self._order[device_id]
+            self.store.discard(device_id)
+            removed += 1
+        self.expired += removed
+        return removed
+
+    def _touch(self, device_id: str, exp: int):
+        self._order[device_id] = exp
+        self._order.move_to_end(device_id)
+        while len(self._order) > self.max_devices:
+            old, _ = self._order.popitem(last=False)
+            self.store.discard(old)
+            self.evicted += 1
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                while self.sweep(self.sweep_batch) == self.sweep_batch:
+                    await asyncio.sleep(0)
+            except Exception as e:
+                logger.exception(f"[offline] Sweep failed: {e}")
+
+    def _scan(self) -> list[tuple[str, int]]:
+        return [(device_id, max(e["exp"] for e in entries.values()))
+                for device_id, entries in self.store.scan() if entries]
+
+
+offline_queue = OfflineCommandQueue(pending_commands)
@@ -0,0 +1,133 @@
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+from app.logger_module.utils import get_logger_factory
+from app.metrics import WS_OUTBOUND
+from config import OUTBOUND_HIGH_WATER
+
+get_logger = get_logger_factory(__name__)
+logger = get_logger()
+
+_COALESCED = WS_OUTBOUND.labels("coalesced")
+_OVERFLOW = WS_OUTBOUND.labels("overflow")
+_FAILED = WS_OUTBOUND.labels("send_failed")
+_failures: set[asyncio.Task] = set()
+
+
+def coalesce_key(method: str, payload: Any) -> str | None:
+    """
+    Кадры, из которых в очереди важен только последний: ping и команды без id
+    (синхронизация состояния после подключения). Команды с id ждут свой ack и не схлопываются.
+    """
+    if method == "send_text":
+        return "ping" if payload == "ping" else None
+    if isinstance(payload, dict) and "id" not in payload and "action" in payload:
+        return "action"
+    return None
+
+
+class OutboundSocket:
+    """
+    Исходящая сторона подключения устройства: очередь кадров и единственный писатель.
+
+    send_json / send_text не ждут сети — кадр кладётся в очередь, а задача-писатель
+    по одному отправляет их в сокет. Писатель запускается первым кадром и завершается,
+    когда очередь опустела: у простаивающего устройства нет своей задачи (и её стека).
+    Зависшее TCP-окно одного устройства держит только его писателя, а не запрос Алисы,
+    heartbeat или воркер event_bus. Кадры с ключом
+    (coalesce_key), ещё не ушедшие в сеть, заменяются новыми: ping остаётся на своём месте,
+    команда состояния переезжает в конец, чтобы не обогнать команды, поставленные после неё.
+    Если в очереди больше high_water кадров, потребитель не успевает — вызываем on_failure
+    (менеджер отключает устройство); так же — при ошибке отправки. Снаружи объект выглядит как сокет (send_json / send_text / close).
+    """
+    __slots__ = ("ws", "device_id", "high_water", "on_failure", "_queue", "_keyed", "_live", "_writer", "_closed")
+
+    def __init__(self, ws, device_id: str, on_failure: Callable[["OutboundSocket"], Awaitable[None]],
+                 high_water: int = OUTBOUND_HIGH_WATER):
+        self.ws = ws
+        self.device_id = device_id
+        self.high_water = high_water
+        self.on_failure = on_failure
+        self._queue: deque[list] = deque()  # [метод, данные, ключ]; метод None — кадр заменён более новым
+        self._keyed: dict[str, list] = {}
+        self._live = 0
+        self._closed = False
+        self._writer: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return self._live
+
+    async def send_json(self, data: dict):
+        self.put("send_json", data)
+
+    async def send_text(self, text: str):
+        self.put("send_text", text)
+
+    def put(self, method: str, payload: Any) -> bool:
+        if self._closed:
+            return False
+        key = coalesce_key(method, payload)
+        if key is not None:
+            old = self._keyed.get(key)
+            if old is not None:
+                _COALESCED.inc()
+                if key == "ping":
+                    return True
+                old[0] = None
+                self._live -= 1
+        entry = [method, payload, key]
+        if key is not None:
+            self._keyed[key] = entry
+        self._queue.append(entry)
+        self._live += 1
+        if self._writer is None:
+            self._writer = asyncio.get_running_loop().create_task(self._write())
+        if self._live > self.high_water:
+            _OVERFLOW.inc()
+            logger.warning(f"[{self.device_id}] Outbound queue passed {self.high_water} frames, disconnecting")
+            self._fail()
+        return True
+
+    async def close(self):
+        self._closed = True
+        if self._writer is not None:
+            self._writer.cancel()
+        try:
+            # Писатель мог застрять в send: закрытие не должно ждать мёртвого потребителя бесконечно
+            await asyncio.wait_for(self.ws.close(), 1.0)
+        except Exception:
+            pass
+
+    async def _write(self):
+        queue = self._queue
+        while queue:
+            method, payload, key = entry = queue.popleft()
+            if method is None:
+                continue
+            self._live -= 1
+            if key is not None and self._keyed.get(key) is entry:
+                del self._keyed[key]
+            try:
+                await getattr(self.ws, method)(payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                _FAILED.inc()
+                logger.warning(f"[{self.device_id}] Send failed: {e}")
+                self._fail()
+                return
+        # Между проверкой очереди и сбросом нет await: put не застанет ушедшего писателя
+        self._writer = None
+
+    def _fail(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.clear()
+        self._keyed.clear()
+        self._live = 0
+        # Отключение — отдельной задачей: put вызывают синхронно, а писатель не должен ждать сам себя
+        task = asyncio.get_running_loop().create_task(self.on_failure(self))
+        _failures.add(task)
+        task.add_done_callback(_failures.discard)
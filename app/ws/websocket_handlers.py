@@ -1,10 +1,37 @@
 from fastapi import WebSocket
-from config import event_bus
+
+from app.actions import ON_OFF
+from app.notifications import parse_state_report, state_notifier
+from app.ws.offline_queue import offline_queue
+from app.logger_module.utils import get_logger_factory
+from config import event_bus, DB
+
+get_logger = get_logger_factory(__name__)
+logger = get_logger()
 
 
 @event_bus.on('device_ws_connected')
-async def handle_connection(device_id, ws: WebSocket):
+async def handle_connection(device_id, ws: WebSocket, replaying: bool = False):
     await ws.send_json({'message': 'Вы подключились'})
+    if replaying:
+        # Менеджер досылает отложенные команды — они новее состояния в ядре
+        return
+    # После (пере)подключения приводим реле к состоянию, которое знает Алиса
+    device = DB["devices"].get(device_id)
+    if device:
+        await ws.send_json({'action': 'turn_on' if device["state"].get("on") else 'turn_off'})
+
+
+@event_bus.on('device_command_replayed')
+async def handle_command_replayed(device_id, key: str, frame: dict):
+    # Алиса получила DEVICE_UNREACHABLE, а команда всё-таки исполнена — сообщаем ей новое состояние
+    device = DB["devices"].get(device_id)
+    if key != ON_OFF or not device:
+        return
+    on = frame["action"] == "turn_on"
+    device["state"]["on"] = on
+    DB["devices"][device_id] = device
+    state_notifier.notify(device)
 
 
 @event_bus.on('device_ws_disconnected')
@@ -12,11 +39,27 @@ async def handle_disconnection(device_id):
     event_bus.emit('device_status', device_id, False)
 
 
+# Сообщение устройству отправляет сама сессия перед закрытием сокета; здесь — только журнал
 @event_bus.on('device_ws_timeout')
-async def handle_timeout(ws: WebSocket):
-    await ws.send_json({'message': 'Время ожидания истекло!'})
+async def handle_timeout(device_id):
+    logger.info(f"[{device_id}] No auth message in time")
 
 
 @event_bus.on('device_ws_wrong_auth_token')
-async def handle_device_wrong_auth_token(ws: WebSocket):
-    await ws.send_json({'message': 'Неверный auth_token'})
+async def handle_device_wrong_auth_token(device_id):
+    logger.warning(f"[{device_id}] Wrong auth_token")
+
+
+@event_bus.on('message_from_device')
+async def handle_device_message(device_id, msg: str):
+    # Реле переключили кнопкой или автоматикой — обновляем ядро и сообщаем Алисе
+    on = parse_state_report(msg)
+    if on is not None:
+        # Реле переключили вручную — отложенная команда больше не отражает желание пользователя
+        offline_queue.discard(device_id, ON_OFF)
+    device = DB["devices"].get(device_id)
+    if on is None or not device or device["state"].get("on") == on:
+        return
+    device["state"]["on"] = on
+    DB["devices"][device_id] = device
+    state_notifier.notify(device)
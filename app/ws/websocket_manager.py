@@ -1,33 +1,175 @@
+import asyncio
+import time
+from typing import Callable
+
 from fastapi import WebSocket
+from app.device_table import ConnectionView, DeviceTable, device_table
 from app.logger_module.utils import get_logger_factory
-from config import event_bus
+from app.metrics import WS_MESSAGES_OUT, COMMAND_RTT
+from app.ws.command_tracker import command_tracker, CommandError
+from app.ws.offline_queue import offline_queue
+from app.ws.outbound import OutboundSocket
+from config import event_bus, COMMAND_TIMEOUT, ACTION_CONCURRENCY
 
 get_logger = get_logger_factory(__name__)
 logger = get_logger()
 
 
 class DeviceWebSocketManager:
-    def __init__(self):
-        self.active: dict[int, WebSocket] = {}
+    """
+    Реестр живых подключений: id устройства из DB["devices"] -> OutboundSocket.
+    Сокеты хранятся в строках DeviceTable, active — представление поверх неё.
+    Поиск за O(1), при переподключении старый сокет закрывается и заменяется новым.
+    Всё, что пишет устройству, идёт через его очередь (app/ws/outbound.py) и не ждёт сети.
+    """
 
-    async def add(self, device_id: int, ws: WebSocket):
-        self.active[device_id] = ws
-        event_bus.emit('device_ws_connected', device_id, ws)
+    def __init__(self, table: DeviceTable = device_table):
+        self.table = table
+        self.active = ConnectionView(table)
+        # Брокер между воркерами (app/broker); подключается в lifespan приложения
+        self.broker = None
+        # Вызываются синхронно, когда устройство подключилось к воркеру или отключилось (app/groups.py)
+        self.listeners: list[Callable[[str], None]] = []
+        self._replays: set[asyncio.Task] = set()
 
-    async def remove(self, device_id: int):
-        try:
-            event_bus.emit("device_ws_disconnected", device_id)
-            await self.active.pop(device_id, None).close()
-        except Exception as e:
-            pass
+    def get(self, device_id: str) -> OutboundSocket | None:
+        return self.active.get(device_id)
+
+    def is_online(self, device_id: str) -> bool:
+        return device_id in self.active
+
+    async def add(self, device_id: str, ws: WebSocket) -> OutboundSocket:
+        """Регистрирует сокет и возвращает его исходящую очередь — её и передают дальше (heartbeat, remove)."""
+        row = self.table.attach(device_id)
+        old = self.table.conn[row]
+        ws = OutboundSocket(ws, device_id, self._on_send_failure)
+        self.table.set_conn(row, ws)
+        self._changed(device_id)
+        if old is not None:
+            # Устройство переподключилось раньше, чем мы заметили обрыв старого сокета
+            event_bus.emit('device_ws_replaced', device_id)
+            await self._close(old)
+        if self.broker is not None:
+            await self.broker.register(device_id)
+        # Команды, не дошедшие, пока устройство было офлайн, досылаем сразу после подключения
+        queued = offline_queue.take(device_id)
+        event_bus.emit('device_ws_connected', device_id, ws, bool(queued))
+        if queued:
+            task = asyncio.create_task(self._replay(device_id, queued))
+            self._replays.add(task)
+            task.add_done_callback(self._replays.discard)
+        return ws
 
-    async def send_personal(self, device_id: int, data: str | dict) -> dict | None | bool:
+    async def remove(self, device_id: str, ws: OutboundSocket | WebSocket | None = None):
+        current = self.active.get(device_id)
+        if current is None:
+            return
+        if ws is not None and current is not ws and current.ws is not ws:
+            # Сокет уже заменён новым подключением — его не трогаем
+            return
+        self.table.detach(device_id)
+        self._changed(device_id)
+        command_tracker.fail_device(device_id)
+        if self.broker is not None:
+            await self.broker.unregister(device_id)
+        event_bus.emit("device_ws_disconnected", device_id)
+        await self._close(current)
+
+    async def send_personal(self, device_id: str, data: str | dict) -> bool:
+        """Ставит кадр в очередь устройства; ошибка отправки отключит устройство и провалит его команды."""
         ws = self.active.get(device_id)
-        if ws:
-            event_bus.emit('device_message_send', device_id, data)
-            await ws.send_json(data)
-        else:
+        if ws is None or not ws.put("send_json", data):
             event_bus.emit('device_message_failed', device_id, data)
+            return False
+        WS_MESSAGES_OUT.labels("command" if isinstance(data, dict) and "action" in data else "message").inc()
+        event_bus.emit('device_message_send', device_id, data)
+        return True
+
+    async def send_command(self, device_id: str, data: dict, timeout: float = COMMAND_TIMEOUT) -> dict:
+        """
+        Отправляет команду с id и ждёт ack от устройства.
+        Если сокет устройства живёт в другом воркере, команда уходит туда через брокер.
+        Возвращает ack, иначе бросает CommandError с кодом ошибки для Алисы.
+        """
+        if device_id not in self.active and self.broker is not None:
+            return await self.broker.route(device_id, data, timeout)
+        return await self.send_local_command(device_id, data, timeout)
+
+    async def send_local_command(self, device_id: str, data: dict, timeout: float = COMMAND_TIMEOUT) -> dict:
+        # Только сокеты этого воркера: сюда же приходят команды, пересланные брокером
+        if device_id not in self.active:
+            raise CommandError("DEVICE_UNREACHABLE", f"{device_id}: offline")
+        command_id, future = command_tracker.open(device_id)
+        started = time.perf_counter()
+        result = "ok"
+        try:
+            if not await self.send_personal(device_id, {**data, "id": command_id}):
+                raise CommandError("DEVICE_UNREACHABLE", f"{device_id}: send failed")
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            result = "timeout"
+            logger.warning(f"[{device_id}] No ack for command {command_id} in {timeout}s")
+            raise CommandError("DEVICE_UNREACHABLE", f"{device_id}: ack timeout")
+        except CommandError as e:
+            result = e.error_code
+            raise
+        finally:
+            command_tracker.discard(device_id, command_id)
+            COMMAND_RTT.labels(result).observe(time.perf_counter() - started)
+
+    async def command_many(self, commands: dict[str, dict], timeout: float = COMMAND_TIMEOUT,
+                           concurrency: int = ACTION_CONCURRENCY) -> dict[str, str | None]:
+        """
+        Рассылает по одной команде каждому устройству: одновременно не больше concurrency,
+        все укладываются в общий дедлайн (ожидание своей очереди тоже в него входит).
+        Результат: device_id -> None (подтверждено) или код ошибки.
+        """
+        deadline = asyncio.get_running_loop().time() + timeout
+        semaphore = asyncio.Semaphore(concurrency)
+        ids = list(commands)
+        outcomes = await asyncio.gather(*(self._command_within(i, commands[i], deadline, semaphore) for i in ids))
+        return dict(zip(ids, outcomes))
+
+    async def _command_within(self, device_id: str, data: dict, deadline: float,
+                              semaphore: asyncio.Semaphore) -> str | None:
+        loop = asyncio.get_running_loop()
+        try:
+            async with semaphore:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    # Очередь не дошла до устройства до дедлайна — команду уже не отправляем
+                    return "DEVICE_UNREACHABLE"
+                await self.send_command(device_id, data, remaining)
+        except CommandError as e:
+            return e.error_code
+        return None
+
+    async def _replay(self, device_id: str, queued: list):
+        for n, (key, entry) in enumerate(queued):
+            try:
+                await self.send_local_command(device_id, entry["frame"])
+            except CommandError as e:
+                logger.warning(f"[{device_id}] Replay of queued command failed: {e.error_code}")
+                if e.error_code == "DEVICE_UNREACHABLE":
+                    offline_queue.restore(device_id, queued[n:])
+                return
+            # Состояние подтверждено устройством — событие не должно потеряться при переполнении очереди
+            await event_bus.publish('device_command_replayed', device_id, key, entry["frame"])
+
+    def _changed(self, device_id: str):
+        for listener in self.listeners:
+            listener(device_id)
+
+    async def _on_send_failure(self, ws: OutboundSocket):
+        # Очередь переполнена или сокет сломан: отключаем, ждущие ack команды получат DEVICE_UNREACHABLE
+        await self.remove(ws.device_id, ws)
+
+    @staticmethod
+    async def _close(ws: OutboundSocket):
+        try:
+            await ws.close()
+        except Exception:
+            pass
 
 
-device_ws_manager = DeviceWebSocketManager()
\ No newline at end of file
+device_ws_manager = DeviceWebSocketManager()
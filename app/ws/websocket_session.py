@@ -1,82 +1,187 @@
 import asyncio
+import json
 import time
 from fastapi import status
 from fastapi.websockets import WebSocket, WebSocketDisconnect
 
 from app.logger_module.utils import get_logger_factory
-from config import event_bus
+from app.metrics import WS_MESSAGES_IN, AUTH_FAILURES, WS_HANDSHAKES, WS_HANDSHAKE_LATENCY
+from config import event_bus, admission_settings
 from app.ws.websocket_manager import device_ws_manager
+from app.ws.command_tracker import command_tracker
+from app.ws.admission import handshake_admission, reject
+from app.ws.credentials import device_credentials
+from app.ws.heartbeat import heartbeat
+from app.ws.framing import (BinaryDeviceSocket, FORMAT_BINARY, FORMAT_JSON, PONG, ACK, STATE, TELEMETRY, TEXT,
+                            decode_ack)
+from app.telemetry import telemetry_store
 
 get_logger = get_logger_factory(__name__)
 logger = get_logger()
 
-
-device_last_pong = {}
-
-
-async def verify_auth_token(token):
-    auth_token = 'abc123'
-    return token == auth_token
+_IN_PONG = WS_MESSAGES_IN.labels("pong")
+_IN_ACK = WS_MESSAGES_IN.labels("ack")
+_IN_MESSAGE = WS_MESSAGES_IN.labels("message")
+_IN_TELEMETRY = WS_MESSAGES_IN.labels("telemetry")
 
 
 class DeviceWebSocketSession:
-    async def handle(self, ws: WebSocket, device_id: int):
-        if not await self._authenticate(ws, device_id):
-            event_bus.emit('device_ws_wrong_auth_token', ws)
-            await asyncio.sleep(3)
-            await ws.close(code=status.WS_1008_POLICY_VIOLATION)
+    async def handle(self, ws: WebSocket, device_id: str):
+        # Допуск до accept: при шторме переподключений лишние уходят сразу с подсказкой retry_after
+        refused = handshake_admission.admit(ws.client.host if ws.client else "", device_id)
+        if refused is not None:
+            reason, retry_after = refused
+            WS_HANDSHAKES.labels(f"rejected_{reason}").inc()
+            await reject(ws, retry_after)
             return
-        await device_ws_manager.add(device_id, ws)
+        started = time.perf_counter()
+        try:
+            await ws.accept()
+            conn = await self._authenticate(ws, device_id)
+        finally:
+            handshake_admission.release()
+        if conn is None:
+            WS_HANDSHAKES.labels("auth_failed").inc()
+            return
+        WS_HANDSHAKES.labels("ok").inc()
+        WS_HANDSHAKE_LATENCY.observe(time.perf_counter() - started)
+        # Писать устройству дальше можно только через очередь out; читаем из самого сокета
+        out = await device_ws_manager.add(device_id, conn)
 
-        device_last_pong[device_id] = time.monotonic()
-        listen_task = asyncio.create_task(self._listen(ws, device_id))
-        ping_task = asyncio.create_task(self.ping_pong(ws, device_id))
+        # ping/pong ведёт общий планировщик heartbeat, а не отдельная задача на сокет
+        heartbeat.register(device_id, out)
         try:
-            await listen_task
+            if isinstance(conn, BinaryDeviceSocket):
+                await self._listen_binary(conn, device_id)
+            else:
+                await self._listen(conn, device_id)
         finally:
-            ping_task.cancel()
-            await device_ws_manager.remove(device_id)
+            heartbeat.unregister(device_id, out)
+            await device_ws_manager.remove(device_id, out)
 
     @staticmethod
-    async def _authenticate(ws: WebSocket, device_id: int) -> bool:
+    async def _authenticate(ws: WebSocket, device_id: str) -> WebSocket | BinaryDeviceSocket | None:
+        """
+        Первое сообщение — {"auth_token": ..., "frame": "bin1"}; поле frame необязательно.
+        Возвращает сокет в согласованном формате или None, если устройство не прошло проверку
+        (тогда сокет уже закрыт).
+        """
         try:
-            data = await asyncio.wait_for(ws.receive_json(), timeout=15)
+            message = await asyncio.wait_for(ws.receive(), timeout=admission_settings.auth_timeout)
         except asyncio.TimeoutError:
-            event_bus.emit('device_ws_timeout', ws)
-            return False
+            AUTH_FAILURES.labels("device", "timeout").inc()
+            event_bus.emit('device_ws_timeout', device_id)
+            await DeviceWebSocketSession._refuse(ws, 'Время ожидания истекло!')
+            return None
+        except WebSocketDisconnect:
+            return None
+        if message["type"] == "websocket.disconnect":
+            return None
+        if message.get("text") is None:
+            # Бинарный кадр до согласования формата: receive_json упал бы на нём KeyError
+            AUTH_FAILURES.labels("device", "binary_auth").inc()
+            await DeviceWebSocketSession._refuse(ws, 'Первое сообщение должно быть JSON с auth_token',
+                                                 code=status.WS_1003_UNSUPPORTED_DATA)
+            return None
+        try:
+            data = json.loads(message["text"])
+        except ValueError:
+            data = None
 
         token = data.get("auth_token") if isinstance(data, dict) else None
-        verified = await verify_auth_token(token)
-        return verified
+        if not await device_credentials.verify(device_id, token):
+            AUTH_FAILURES.labels("device", "wrong_token").inc()
+            handshake_admission.auth_failed(ws.client.host if ws.client else "", device_id)
+            event_bus.emit('device_ws_wrong_auth_token', device_id)
+            await DeviceWebSocketSession._refuse(ws, 'Неверный auth_token')
+            return None
+        if "frame" not in data:
+            # Прошивки без поддержки согласования: JSON, как раньше, без лишних сообщений
+            return ws
+        frame = FORMAT_BINARY if data["frame"] == FORMAT_BINARY else FORMAT_JSON
+        # Подтверждение — последнее JSON-сообщение; дальше кадры идут в выбранном формате
+        await ws.send_json({"frame": frame})
+        return BinaryDeviceSocket(ws) if frame == FORMAT_BINARY else ws
 
     @staticmethod
-    async def ping_pong(ws: WebSocket, device_id):
-
-        while True:
-            await ws.send_text("ping")
-            last = device_last_pong.get(device_id)
-            now = time.monotonic()
+    async def _refuse(ws: WebSocket, message: str, code: int = status.WS_1008_POLICY_VIOLATION):
+        # Без паузы перед закрытием: повторные попытки сдерживает token bucket в admission
+        try:
+            await ws.send_json({'message': message})
+            await ws.close(code=code)
+        except Exception:
+            pass
 
-            if last is None or (now - last > 10):
-                logger.warning(f"[PING] No pong from {device_id} for >10s")
-                await device_ws_manager.remove(device_id)
-                break
-            await asyncio.sleep(5)
+    @staticmethod
+    async def _listen(ws: WebSocket, device_id: str):
+        try:
+            while True:
+                await DeviceWebSocketSession._on_text(device_id, await ws.receive_text())
+        except (asyncio.CancelledError, WebSocketDisconnect):
+            await device_ws_manager.remove(device_id, ws)
+        except Exception as e:
+            logger.exception(f"[{device_id}] Device WS error : {e}")
+            await device_ws_manager.remove(device_id, ws)
 
     @staticmethod
-    async def _listen(ws: WebSocket, device_id: int):
+    async def _listen_binary(conn: BinaryDeviceSocket, device_id: str):
         try:
             while True:
-                msg = await ws.receive_text()
-                if msg.strip().lower() == "pong":
-                    device_last_pong[device_id] = time.monotonic()
+                frame = await conn.receive_frame()
+                if isinstance(frame, str):
+                    await DeviceWebSocketSession._on_text(device_id, frame)
                     continue
-                event_bus.emit("message_from_device", device_id, msg)
+                kind = frame[0] if frame else 0
+                if kind == PONG:
+                    _IN_PONG.inc()
+                    heartbeat.pong(device_id)
+                elif kind == ACK:
+                    command_id, error_code = decode_ack(frame)
+                    _IN_ACK.inc()
+                    command_tracker.resolve_id(device_id, str(command_id), error_code)
+                elif kind == STATE:
+                    _IN_MESSAGE.inc()
+                    report = "on" if frame[1:2] == b"\x01" else "off"
+                    await event_bus.publish("message_from_device", device_id, report)
+                elif kind == TELEMETRY:
+                    _IN_TELEMETRY.inc()
+                    telemetry_store.ingest_frame(device_id, frame)
+                elif kind == TEXT:
+                    await DeviceWebSocketSession._on_text(device_id, frame[1:].decode())
+                else:
+                    logger.warning(f"[{device_id}] Unknown binary frame type {kind:#x}")
         except (asyncio.CancelledError, WebSocketDisconnect):
-            await device_ws_manager.remove(device_id)
+            await device_ws_manager.remove(device_id, conn)
         except Exception as e:
             logger.exception(f"[{device_id}] Device WS error : {e}")
-            await device_ws_manager.remove(device_id)
+            await device_ws_manager.remove(device_id, conn)
+
+    @staticmethod
+    async def _on_text(device_id: str, msg: str):
+        if msg.strip().lower() == "pong":
+            _IN_PONG.inc()
+            heartbeat.pong(device_id)
+            return
+        if telemetry_store.ingest_text(device_id, msg):
+            _IN_TELEMETRY.inc()
+            return
+        if DeviceWebSocketSession._is_ack(device_id, msg):
+            _IN_ACK.inc()
+            return
+        _IN_MESSAGE.inc()
+        # publish ждёт места в очереди: болтливое устройство тормозит только само себя
+        await event_bus.publish("message_from_device", device_id, msg)
+
+    @staticmethod
+    def _is_ack(device_id: str, msg: str) -> bool:
+        # Ack на команду: {"id": "<id команды>", "status": "ok" | "error", ...}
+        if not msg.startswith("{"):
+            return False
+        try:
+            data = json.loads(msg)
+        except ValueError:
+            return False
+        return isinstance(data, dict) and "id" in data and command_tracker.resolve(device_id, data)
 
 
 device_ws_session = DeviceWebSocketSession()
\ No newline at end of file
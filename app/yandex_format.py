@@ -0,0 +1,106 @@
+import json
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+
+# ====== МАППИНГ: твои модели -> формат Алисы ======
+# Описание устройства меняется редко, поэтому кэшируем его сразу в виде JSON-байтов.
+# Ответы discovery/query собираются склейкой готовых фрагментов, минуя jsonable_encoder.
+
+
+def _dumps(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+@lru_cache(maxsize=None)
+def map_kind_to_y_type(kind: str) -> str:
+    # Простейшее сопоставление для демо
+    if kind == "relay":
+        return "devices.types.light"  # можно и switch; выберем light для наглядности
+    return "devices.types.other"
+
+
+@lru_cache(maxsize=256)
+def _y_caps(caps: Tuple[str, ...]) -> Tuple[Dict[str, Any], ...]:
+    out = []
+    for c in caps:
+        if c == "on_off":
+            out.append({"type": "devices.capabilities.on_off"})
+    return tuple(out)
+
+
+def map_caps_to_y_caps(caps: List[str]) -> List[Dict[str, Any]]:
+    return list(_y_caps(tuple(caps)))
+
+
+# Шаблоны состояния: capability -> (префикс, значение из device["state"], суффикс)
+_STATE_TEMPLATES = {
+    "on_off": (b'{"type":"devices.capabilities.on_off","state":{"instance":"on","value":',
+               lambda state: b"true" if state.get("on", False) else b"false",
+               b"}}"),
+}
+
+
+class _Compiled:
+    __slots__ = ("signature", "description", "description_bytes", "state_prefix", "state_parts")
+
+    def __init__(self, device: Dict[str, Any], signature: tuple):
+        self.signature = signature
+        self.description = {
+            "id": device["id"],
+            "name": device["name"],
+            "type": map_kind_to_y_type(device["kind"]),
+            "capabilities": map_caps_to_y_caps(device["capabilities"]),
+        }
+        self.description_bytes = _dumps(self.description)
+        self.state_prefix = b'{"id":' + _dumps(device["id"]) + b',"capabilities":['
+        self.state_parts = [_STATE_TEMPLATES[c] for c in device["capabilities"] if c in _STATE_TEMPLATES]
+
+
+_compiled: Dict[str, _Compiled] = {}
+
+
+def _compile(device: Dict[str, Any]) -> _Compiled:
+    # Сигнатура метаданных: при смене имени/типа/умений запись пересобирается сама,
+    # даже если изменение пришло из другого воркера мимо invalidate_device
+    signature = (device["name"], device["kind"], tuple(device["capabilities"]))
+    compiled = _compiled.get(device["id"])
+    if compiled is None or compiled.signature != signature:
+        compiled = _compiled[device["id"]] = _Compiled(device, signature)
+    return compiled
+
+
+def invalidate_device(dev_id: str):
+    _compiled.pop(dev_id, None)
+
+
+def to_yandex_device(device: Dict[str, Any]) -> Dict[str, Any]:
+    return _compile(device).description
+
+
+def to_yandex_state(device: Dict[str, Any]) -> Dict[str, Any]:
+    caps = []
+    if "on_off" in device["capabilities"]:
+        caps.append({
+            "type": "devices.capabilities.on_off",
+            "state": {"instance": "on", "value": bool(device["state"].get("on", False))}
+        })
+    return {"id": device["id"], "capabilities": caps}
+
+
+def state_bytes(device: Dict[str, Any]) -> bytes:
+    compiled = _compile(device)
+    state = device["state"]
+    caps = b",".join(prefix + value(state) + suffix for prefix, value, suffix in compiled.state_parts)
+    return compiled.state_prefix + caps + b"]}"
+
+
+def discovery_body(request_id: str, user_id: str, devices: List[Dict[str, Any]]) -> bytes:
+    uid = _dumps(user_id)
+    return (b'{"request_id":' + _dumps(request_id) + b',"payload":{"user_id":' + uid + b',"devices":['
+            + b",".join(_compile(d).description_bytes for d in devices)
+            + b']},"user_id":' + uid + b"}")
+
+
+def query_body(request_id: str, devices: List[Dict[str, Any]]) -> bytes:
+    return (b'{"request_id":' + _dumps(request_id) + b',"payload":{"devices":['
+            + b",".join(state_bytes(d) for d in devices) + b"]}}")
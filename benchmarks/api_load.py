@@ -0,0 +1,296 @@
+"""
+Нагрузочный прогон всего API на локальном uvicorn: сервер поднимается
+подпроцессом (хранилище в памяти, один пользователь с --devices розетками),
+клиенты ходят по настоящему TCP.
+
+Сценарии, по порядку:
+  ws_connect — --devices розеток подключаются к /ws/{id}/connect и дальше
+               отвечают на ping и подтверждают команды;
+  token      — OAuth: /authorize -> code -> POST /token;
+  discovery  — GET /v1.0/user/devices;
+  query      — POST /v1.0/user/devices/query по --batch устройствам;
+  action     — POST /v1.0/user/devices/action по --batch подключённым розеткам.
+
+На каждый сценарий: число запросов, ошибки, пропускная способность,
+p50/p95/p99/max задержки и задержка event loop сервера (пробник внутри
+серверного процесса). Результат — JSON (--out), который можно сравнить
+с прошлым прогоном (--baseline): регрессии сверх --tolerance печатаются
+и дают код выхода 1.
+
+Запуск из корня проекта:
+    python -m benchmarks.api_load --devices 1000 --requests 2000 --out bench.json
+    python -m benchmarks.api_load --baseline bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import parse_qs, urlparse
+
+CLIENT = {"client_id": "my-smart-home", "client_secret": "supersecret123"}
+REDIRECT_URI = "https://social.yandex.net/broker/redirect"
+USER_ID = "bench-user"
+LAG_INTERVAL = 0.01  # сек между пробами event loop сервера
+
+
+# ---------- серверная сторона (подпроцесс) ----------
+
+def serve(args):
+    os.environ.setdefault("STORAGE_PATH", ":memory:")
+    import uvicorn
+    from app.devices import add_device
+    from app.main import app
+    from config import DB
+
+    DB["users"][USER_ID] = {"id": USER_ID, "name": "bench"}
+    for i in range(args.devices):
+        add_device({"id": f"load-{i}", "owner_id": USER_ID, "name": f"load-{i}", "kind": "relay",
+                    "capabilities": ["on_off"], "state": {"on": False}})
+
+    lag: list[float] = []
+
+    @app.get("/_bench/lag", include_in_schema=False)
+    async def take_lag():
+        # Отдаёт и обнуляет накопленные пробы
+        samples = lag[:]
+        lag.clear()
+        return samples
+
+    async def probe():
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + LAG_INTERVAL
+            await asyncio.sleep(LAG_INTERVAL)
+            lag.append(max(0.0, loop.time() - expected))
+
+    async def main():
+        server = uvicorn.Server(uvicorn.Config(app, port=args.port, log_level="warning", backlog=4096))
+        task = asyncio.create_task(probe())
+        await server.serve()
+        task.cancel()
+
+    asyncio.run(main())
+
+
+def start_server(args) -> subprocess.Popen:
+    env = {**os.environ, "STORAGE_PATH": ":memory:"}
+    server = subprocess.Popen([sys.executable, "-m", "benchmarks.api_load", "--serve", "--port", str(args.port),
+                               "--devices", str(args.devices)], env=env, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", args.port), timeout=0.1).close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("server did not start")
+
+
+# ---------- клиентская сторона ----------
+
+def summary(values: list[float]) -> dict[str, float]:
+    if not values:
+        return {}
+    ordered = sorted(values)
+    at = lambda q: round(ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000, 3)
+    return {"p50": at(0.5), "p95": at(0.95), "p99": at(0.99), "max": at(1.0)}
+
+
+async def run_scenario(name, op, requests: int, concurrency: int, http) -> dict:
+    """Гоняет op() requests раз в concurrency потоков; op бросает исключение при ошибке."""
+    await http.get("/_bench/lag")
+    latencies: list[float] = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for n in remaining:
+            started = time.perf_counter()
+            try:
+                await op(n)
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    duration = time.perf_counter() - started
+    lag = (await http.get("/_bench/lag")).json()
+    result = {
+        "requests": requests,
+        "errors": errors,
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(len(latencies) / duration, 1),
+        "latency_ms": summary(latencies),
+        "loop_lag_ms": summary(lag),
+    }
+    print(f"{name:<11} {result['throughput_rps']:>9.1f} req/s  p50 {result['latency_ms'].get('p50', 0):>8.2f} ms  "
+          f"p99 {result['latency_ms'].get('p99', 0):>8.2f} ms  loop lag p99 {result['loop_lag_ms'].get('p99', 0):.2f} ms"
+          f"  errors {errors}", file=sys.stderr)
+    return result
+
+
+async def device(device_id: str, local_ip: str, port: int, ready: asyncio.Future):
+    import websockets
+
+    async with websockets.connect(f"ws://127.0.0.1:{port}/ws/{device_id}/connect", ping_interval=None,
+                                  max_queue=None, open_timeout=60, local_addr=(local_ip, 0)) as ws:
+        await ws.send(json.dumps({"auth_token": "abc123"}))
+        await ws.recv()  # приветствие: сессия авторизована
+        ready.set_result(None)
+        async for frame in ws:
+            if frame == "ping":
+                await ws.send("pong")
+            elif '"id"' in frame:
+                await ws.send(json.dumps({"id": json.loads(frame)["id"], "status": "ok"}))
+
+
+async def oauth_pair(http) -> dict:
+    response = await http.get("/authorize", params={"client_id": CLIENT["client_id"], "redirect_uri": REDIRECT_URI,
+                                                    "response_type": "code", "user": USER_ID})
+    code = parse_qs(urlparse(response.headers["location"]).query)["code"][0]
+    response = await http.post("/token", data={**CLIENT, "grant_type": "authorization_code", "code": code})
+    response.raise_for_status()
+    return response.json()
+
+
+async def run(args) -> dict:
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=30) as http:
+        scenarios = {}
+        ids = [f"load-{i}" for i in range(args.devices)]
+
+        # Розетки: по 5 на «домашний» IP, чтобы лимит на IP не мерил сам себя
+        device_tasks = []
+
+        async def connect(n):
+            home = n // 5
+            ready = asyncio.get_running_loop().create_future()
+            task = asyncio.create_task(device(ids[n], f"127.{1 + home // 65536}.{home // 256 % 256}.{home % 256 or 1}",
+                                              args.port, ready))
+            device_tasks.append(task)
+            await asyncio.wait({task, ready}, return_when=asyncio.FIRST_COMPLETED)
+            if not ready.done():
+                task.result()  # соединение закрылось до авторизации — ошибка сценария
+                raise RuntimeError(f"{ids[n]} closed before auth")
+
+        scenarios["ws_connect"] = await run_scenario("ws_connect", connect, args.devices, args.concurrency, http)
+
+        headers = {"Authorization": f"Bearer {(await oauth_pair(http))['access_token']}"}
+
+        async def token(_):
+            await oauth_pair(http)
+
+        async def discovery(_):
+            (await http.get("/v1.0/user/devices", headers=headers)).raise_for_status()
+
+        async def query(n):
+            batch = [{"id": ids[(n * args.batch + k) % len(ids)]} for k in range(args.batch)]
+            (await http.post("/v1.0/user/devices/query", json={"devices": batch}, headers=headers)).raise_for_status()
+
+        async def action(n):
+            # Пакеты соседних запросов не пересекаются, иначе меряем очередь команд одного устройства
+            batch = [{"id": ids[(n * args.batch + k) % len(ids)],
+                      "capabilities": [{"type": "devices.capabilities.on_off", "state": {"value": n % 2 == 0}}]}
+                     for k in range(args.batch)]
+            response = await http.post("/v1.0/user/devices/action", json={"payload": {"devices": batch}},
+                                       headers=headers)
+            response.raise_for_status()
+            for dev in response.json()["payload"]["devices"]:
+                if dev["capabilities"][0]["state"]["action_result"]["status"] != "DONE":
+                    raise RuntimeError(dev)
+
+        for name, op in (("token", token), ("discovery", discovery), ("query", query), ("action", action)):
+            scenarios[name] = await run_scenario(name, op, args.requests, args.concurrency, http)
+
+        for task in device_tasks:
+            task.cancel()
+        await asyncio.gather(*device_tasks, return_exceptions=True)
+    return scenarios
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def regressions(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    found = []
+    for name, now in current["scenarios"].items():
+        was = baseline.get("scenarios", {}).get(name)
+        if not was:
+            continue
+        if now["throughput_rps"] < was["throughput_rps"] * (1 - tolerance):
+            found.append(f"{name}: throughput {was['throughput_rps']} -> {now['throughput_rps']} req/s")
+        for q in ("p95", "p99"):
+            before, after = was["latency_ms"].get(q), now["latency_ms"].get(q)
+            if before and after and after > before * (1 + tolerance):
+                found.append(f"{name}: {q} {before} -> {after} ms")
+        if now["errors"] > was["errors"]:
+            found.append(f"{name}: errors {was['errors']} -> {now['errors']}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=1000, help="подключённых розеток")
+    parser.add_argument("--requests", type=int, default=2000, help="запросов на HTTP-сценарий")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--batch", type=int, default=10, help="устройств в query/action")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--out", help="куда записать JSON (по умолчанию stdout)")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="допустимое ухудшение, доля")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    server = start_server(args)
+    try:
+        scenarios = asyncio.run(run(args))
+    finally:
+        server.terminate()
+        server.wait()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": int(time.time()),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k in ("devices", "requests", "concurrency", "batch")},
+        },
+        "scenarios": scenarios,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(report, json.load(f), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        sys.exit(1 if found else 0)
+
+
+if __name__ == "__main__":
+    main()
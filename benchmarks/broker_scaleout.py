@@ -0,0 +1,94 @@
+"""
+Пропускная способность маршрутизации команд через UnixSocketBroker
+в зависимости от числа воркеров. Каждый процесс-воркер владеет своей
+долей устройств (устройство мгновенно отвечает ack) и одновременно,
+как HTTP-воркер, шлёт команды случайным устройствам: чужие уходят
+владельцу через брокер, свои исполняются на месте.
+
+Запуск из корня проекта:
+    python -m benchmarks.broker_scaleout --workers 1 2 4 --devices 2000 --commands 20000
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from app.broker.presence import SQLitePresence
+from app.broker.unix_socket import UnixSocketBroker
+
+
+async def device_ack(device_id: str, data: dict, timeout: float) -> dict:
+    await asyncio.sleep(0)  # сокет устройства этого воркера
+    return {"id": data.get("id"), "status": "ok"}
+
+
+async def run_worker(index: int, workers: int, devices: int, commands: int, tmp: str, barrier, results):
+    broker = UnixSocketBroker(f"w{index}", os.path.join(tmp, "sockets"),
+                              SQLitePresence(os.path.join(tmp, "presence.db")))
+    await broker.start(device_ack)
+    for d in range(index, devices, workers):
+        await broker.register(f"dev-{d}")
+    await asyncio.to_thread(broker.presence.flush)  # соседи должны видеть устройства до старта
+    await asyncio.get_running_loop().run_in_executor(None, barrier.wait)
+
+    local = set(f"dev-{d}" for d in range(index, devices, workers))
+    semaphore = asyncio.Semaphore(200)
+    errors = 0
+
+    async def one(device_id: str):
+        nonlocal errors
+        async with semaphore:
+            try:
+                if device_id in local:
+                    await device_ack(device_id, {"action": "turn_on"}, 1)
+                else:
+                    await broker.route(device_id, {"action": "turn_on"}, 2)
+            except Exception:
+                errors += 1
+
+    per_worker = commands // workers
+    started = time.perf_counter()
+    await asyncio.gather(*(one(f"dev-{random.randrange(devices)}") for _ in range(per_worker)))
+    results.put((per_worker, time.perf_counter() - started, errors))
+
+    await asyncio.get_running_loop().run_in_executor(None, barrier.wait)
+    await broker.close()
+
+
+def worker_main(*args):
+    asyncio.run(run_worker(*args))
+
+
+def measure(workers: int, devices: int, commands: int) -> tuple[float, int]:
+    with tempfile.TemporaryDirectory() as tmp:
+        ctx = multiprocessing.get_context("spawn")
+        barrier, results = ctx.Barrier(workers), ctx.Queue()
+        processes = [ctx.Process(target=worker_main, args=(i, workers, devices, commands, tmp, barrier, results))
+                     for i in range(workers)]
+        for p in processes:
+            p.start()
+        outcomes = [results.get() for _ in processes]
+        for p in processes:
+            p.join()
+    total = sum(n for n, _, _ in outcomes)
+    wall = max(t for _, t, _ in outcomes)
+    return total / wall, sum(e for _, _, e in outcomes)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--devices", type=int, default=2000)
+    parser.add_argument("--commands", type=int, default=20000)
+    args = parser.parse_args()
+
+    for workers in args.workers:
+        throughput, errors = measure(workers, args.devices, args.commands)
+        print(f"workers={workers:<3} {throughput:10.0f} commands/s  errors={errors}")
+
+
+if __name__ == "__main__":
+    main()
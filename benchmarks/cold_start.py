@@ -0,0 +1,134 @@
+"""
+Холодный старт: сколько проходит от запуска процесса до первой авторизованной
+сессии устройства — то, что решает при подъёме новых контейнеров во время шторма
+переподключений.
+
+1. Импорт app.main в свежем интерпретаторе (-X importtime): всего и по группам
+   модулей (фреймворк, httpx, requests, pydantic-settings, код приложения).
+2. Настоящий uvicorn на SQLite с --devices устройствами и токенами: время от
+   запуска процесса до ответа на первое рукопожатие (/ws/{id}/connect + auth_token).
+
+Медиана по --repeat запускам. Исходники приложения перед замером компилируются
+в __pycache__ (как при сборке образа): при PYTHONDONTWRITEBYTECODE=1 без этого
+каждый старт заново компилирует app/ и config.py — сколько это стоит, печатается
+отдельной строкой.
+
+Запуск из корня проекта:
+    python -m benchmarks.cold_start --devices 10000
+"""
+import argparse
+import asyncio
+import compileall
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import websockets
+
+from benchmarks.reconnect_storm import WELCOME, seed
+
+GROUPS = (
+    ("fastapi/starlette/pydantic", ("fastapi", "starlette", "pydantic", "pydantic_core", "anyio", "typing_extensions",
+                                    "annotated_types", "email_validator")),
+    ("pydantic_settings/dotenv", ("pydantic_settings", "dotenv")),
+    ("httpx (+certifi, click, pygments)", ("httpx", "httpcore", "certifi", "h11", "idna", "sniffio", "click",
+                                           "pygments", "rich")),
+    ("requests/urllib3", ("requests", "urllib3", "charset_normalizer")),
+    ("app + config", ("app", "config")),
+)
+
+
+def import_profile(env: dict) -> tuple[float, dict[str, float]]:
+    """Время импорта app.main (мс) и собственное время модулей по группам."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"], env=env,
+                         capture_output=True, text=True, check=True).stderr
+    groups: dict[str, float] = defaultdict(float)
+    total = 0.0
+    for line in out.splitlines():
+        if not line.startswith("import time:") or "self" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        module = name.strip()
+        if module == "app.main":
+            total = int(cumulative_us) / 1000
+        top = module.split(".")[0]
+        for group, packages in GROUPS:
+            if top in packages:
+                groups[group] += int(self_us) / 1000
+                break
+        else:
+            groups["other (stdlib, ...)"] += int(self_us) / 1000
+    return total, groups
+
+
+def compile_cost() -> float:
+    """Сколько мс уходит на компиляцию исходников приложения, если байткода нет."""
+    sources = [Path("config.py"), *Path("app").rglob("*.py")]
+    started = time.perf_counter()
+    for path in sources:
+        compile(path.read_bytes(), str(path), "exec")
+    return (time.perf_counter() - started) * 1000
+
+
+async def first_session(port: int, env: dict) -> tuple[float, float]:
+    """(до открытого порта, до авторизованной сессии) — секунды от запуска процесса."""
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+                               "--log-level", "warning"], env=env, stdout=subprocess.DEVNULL)
+    listening = None
+    try:
+        while True:
+            try:
+                async with websockets.connect(f"ws://127.0.0.1:{port}/ws/storm-0/connect", open_timeout=5,
+                                              ping_interval=None) as ws:
+                    listening = listening or time.perf_counter() - started
+                    await ws.send(json.dumps({"auth_token": "abc123"}))
+                    welcome = await ws.recv()
+                    while welcome == "ping":
+                        welcome = await ws.recv()
+                    assert json.loads(welcome) == WELCOME, welcome
+                    return listening, time.perf_counter() - started
+            except OSError:
+                await asyncio.sleep(0.005)
+            if server.poll() is not None:
+                raise RuntimeError("server exited")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    compileall.compile_dir("app", quiet=1)
+    compileall.compile_file("config.py", quiet=1)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "cold.db")
+        seed(db, args.devices)
+        env = {**os.environ, "STORAGE_PATH": db, "TELEMETRY_PATH": os.path.join(tmp, "telemetry")}
+
+        profiles = [import_profile(env) for _ in range(args.repeat)]
+        print(f"import app.main: {statistics.median(t for t, _ in profiles):7.1f} ms (median of {args.repeat})")
+        for group in [g for g, _ in GROUPS] + ["other (stdlib, ...)"]:
+            print(f"  {group:<34} {statistics.median(p.get(group, 0.0) for _, p in profiles):7.1f} ms")
+
+        print(f"compiling app sources without bytecode: {statistics.median(compile_cost() for _ in range(3)):7.1f} ms")
+
+        sessions = [asyncio.run(first_session(args.port, env)) for _ in range(args.repeat)]
+        print(f"process start -> port open:      {statistics.median(s[0] for s in sessions) * 1000:7.1f} ms")
+        print(f"process start -> first session:  {statistics.median(s[1] for s in sessions) * 1000:7.1f} ms "
+              f"({args.devices} devices in SQLite)")
+
+
+if __name__ == "__main__":
+    main()
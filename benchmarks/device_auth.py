@@ -0,0 +1,143 @@
+"""
+Стоимость проверки секретов устройств.
+
+1. verify() напрямую, --devices устройств по --concurrency одновременно:
+   хеш прямо в цикле событий (как было бы без пула), пул потоков с пустым
+   кэшем и повторная проверка из кэша. Меряем проверки в секунду и
+   задержку цикла событий.
+2. Рукопожатия в секунду через настоящий uvicorn в этом же процессе:
+   устройства со старым общим токеном, со своими секретами (кэш пуст)
+   и переподключение тех же устройств (проверка из кэша).
+   Допуск (admission) на время замера ослаблен — меряем именно проверку.
+
+Запуск из корня проекта:
+    python -m benchmarks.device_auth --devices 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+os.environ.setdefault("STORAGE_PATH", ":memory:")
+for name in ("MAX_HANDSHAKES", "HANDSHAKE_RATE", "IP_RATE", "IP_BURST", "DEVICE_RATE", "DEVICE_BURST"):
+    os.environ.setdefault(f"ADMISSION_{name}", "1000000")
+
+import uvicorn
+import websockets
+
+from app.devices import add_device
+from app.main import app
+from app.ws.credentials import device_credentials
+from config import credential_settings
+
+
+class LagProbe:
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: list[float] = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(loop.time() - expected)
+
+    def __enter__(self):
+        self.samples = []
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+    def report(self) -> str:
+        ordered = sorted(self.samples) or [0.0]
+        return (f"loop lag p99 {ordered[int(len(ordered) * 0.99)] * 1000:7.1f} ms, "
+                f"max {ordered[-1] * 1000:7.1f} ms")
+
+
+async def bounded(items, concurrency: int, op):
+    remaining = iter(items)
+
+    async def worker():
+        for item in remaining:
+            await op(item)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def verify_pass(name: str, secrets: dict[str, str], concurrency: int, op):
+    with LagProbe() as lag:
+        started = time.perf_counter()
+        await bounded(secrets.items(), concurrency, op)
+        elapsed = time.perf_counter() - started
+        await asyncio.sleep(0)
+    print(f"  {name:<22} {len(secrets) / elapsed:9.0f} checks/s  {lag.report()}")
+
+
+async def handshake_pass(name: str, devices: dict[str, str], concurrency: int, port: int):
+    async def connect(item):
+        dev_id, secret = item
+        async with websockets.connect(f"ws://127.0.0.1:{port}/ws/{dev_id}/connect", ping_interval=None) as ws:
+            await ws.send(json.dumps({"auth_token": secret}))
+            welcome = json.loads(await ws.recv())
+            assert welcome == {"message": "Вы подключились"}, welcome
+
+    with LagProbe() as lag:
+        started = time.perf_counter()
+        await bounded(devices.items(), concurrency, connect)
+        elapsed = time.perf_counter() - started
+    print(f"  {name:<22} {len(devices) / elapsed:9.0f} handshakes/s  {lag.report()}")
+
+
+async def run(args):
+    legacy = {f"legacy-{i}": credential_settings.legacy_token for i in range(args.devices)}
+    own = {f"own-{i}": "" for i in range(args.devices)}
+    for dev_id in [*legacy, *own]:
+        add_device({"id": dev_id, "owner_id": "user-1", "name": dev_id, "kind": "relay",
+                    "capabilities": ["on_off"], "state": {"on": False}})
+    for dev_id in own:
+        own[dev_id] = await device_credentials.issue(dev_id)
+
+    print(f"verify(), {args.devices} devices, PBKDF2 {credential_settings.iterations} iterations:")
+
+    async def inline(item):
+        # Хеш в потоке цикла событий — так вышло бы без пула
+        dev_id, secret = item
+        assert device_credentials._check(device_credentials.store[dev_id], secret)[0]
+        await asyncio.sleep(0)
+
+    async def verify(item):
+        assert await device_credentials.verify(*item)
+
+    await verify_pass("hash on the loop", own, args.concurrency, inline)
+    await verify_pass("thread pool, cold", own, args.concurrency, verify)
+    await verify_pass("cached", own, args.concurrency, verify)
+    device_credentials._cache.clear()
+
+    print(f"handshakes, {args.concurrency} at a time:")
+    server = uvicorn.Server(uvicorn.Config(app, port=args.port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    await handshake_pass("legacy shared token", legacy, args.concurrency, args.port)
+    await handshake_pass("own secret, cold", own, args.concurrency, args.port)
+    await handshake_pass("own secret, reconnect", own, args.concurrency, args.port)
+    server.should_exit = True
+    await serving
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--port", type=int, default=8767)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
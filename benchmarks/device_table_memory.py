@@ -0,0 +1,98 @@
+"""
+Память на подключённое устройство в работающем приложении (внутри lifespan app.main):
+RSS процесса после старта, после заведения устройств в DB["devices"] и после их подключения
+через настоящие device_ws_manager.add и heartbeat.register (OutboundSocket — задача-писатель
+живёт, только пока есть кадры, — строка DeviceTable, слот колеса). Сокеты — заглушки без сети.
+
+Отдельно печатается размер самой DeviceTable (её массивы и индекс), чтобы была видна
+её доля в общей цене подключения.
+
+Запуск из корня проекта:
+    python -m benchmarks.device_table_memory --devices 100000 --users 20000
+"""
+import argparse
+import asyncio
+import gc
+import os
+import sys
+
+os.environ.setdefault("STORAGE_PATH", ":memory:")
+os.environ.setdefault("STORAGE_CACHE_SIZE", "0")  # кэш хранилища — не цена подключения
+os.environ.setdefault("TELEGRAM_ENABLED", "false")
+os.environ.setdefault("LEVEL", "WARNING")
+
+from app.main import app  # noqa: E402 — замеряем процесс целиком, со всеми модулями приложения
+from app.device_table import device_table  # noqa: E402
+from app.devices import add_device  # noqa: E402
+from app.ws.heartbeat import heartbeat  # noqa: E402
+from app.ws.websocket_manager import device_ws_manager  # noqa: E402
+
+
+class FakeSocket:
+    __slots__ = ()
+
+    async def send_json(self, data):
+        pass
+
+    async def send_text(self, text):
+        pass
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+def rss() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def table_size() -> int:
+    t = device_table
+    return (sys.getsizeof(t.index) + sys.getsizeof(t.device_ids) + sys.getsizeof(t.last_pong)
+            + sys.getsizeof(t.conn) + sys.getsizeof(t._free))
+
+
+async def run(args):
+    ids = [f"dev-{i}" for i in range(args.devices)]
+    gc.collect()
+    started = rss()
+    for i, dev_id in enumerate(ids):
+        add_device({"id": dev_id, "owner_id": f"user-{i % args.users}", "name": f"Розетка {i}",
+                    "kind": "relay", "capabilities": ["on_off"], "state": {"on": i % 2 == 0}})
+    gc.collect()
+    described = rss()
+
+    ws = FakeSocket()
+    heartbeat.timeout = 3600  # заглушки не отвечают на ping, а подключения нужны до конца замера
+    for n, dev_id in enumerate(ids):
+        out = await device_ws_manager.add(dev_id, ws)
+        heartbeat.register(dev_id, out)
+        if n % 500 == 0:
+            await asyncio.sleep(0)  # обработчики device_ws_connected разбирают очередь event_bus
+    await asyncio.sleep(1)
+    gc.collect()
+    connected = rss()
+
+    n = args.devices
+    print(f"devices={n} users={args.users} connected={len(device_ws_manager.active)}")
+    print(f"app started         {started / 2**20:8.1f} MiB")
+    print(f"devices in DB       {(described - started) / 2**20:8.1f} MiB  {(described - started) / n:6.0f} B/device")
+    print(f"connections         {(connected - described) / 2**20:8.1f} MiB  {(connected - described) / n:6.0f} B/device")
+    print(f"  of it DeviceTable {table_size() / 2**20:8.1f} MiB  {table_size() / n:6.0f} B/device")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=20_000)
+    args = parser.parse_args()
+
+    async def in_lifespan():
+        async with app.router.lifespan_context(app):
+            await run(args)
+
+    asyncio.run(in_lifespan())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+JSON против bin1 на типичной смеси кадров протокола устройства:
+команда с id (сервер -> устройство), ack, ping/pong, отчёт о состоянии.
+Считаем байты полезной нагрузки кадра и стоимость кодирования/разбора
+так, как это делают DeviceWebSocketManager и DeviceWebSocketSession.
+
+Запуск из корня проекта:
+    python -m benchmarks.framing --rounds 200000
+"""
+import argparse
+import json
+import time
+
+from app.ws import framing
+
+
+def json_send(data: dict) -> bytes:
+    # Так кодирует starlette WebSocket.send_json
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def json_ack(frame: bytes):
+    # Копия DeviceWebSocketSession._is_ack
+    msg = frame.decode()
+    if msg.startswith("{"):
+        data = json.loads(msg)
+        return str(data.get("id")), data.get("status", "ok") != "ok"
+
+
+def binary_ack(frame: bytes):
+    if frame[0] == framing.ACK:
+        command_id, error_code = framing.decode_ack(frame)
+        return str(command_id), error_code
+
+
+def measure(fn, args: list, rounds: int) -> float:
+    started = time.perf_counter()
+    for i in range(rounds):
+        fn(args[i % len(args)])
+    return (time.perf_counter() - started) / rounds * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=200_000)
+    args = parser.parse_args()
+
+    ids = list(range(1_000_000, 1_001_000))
+    commands = [{"action": "turn_on" if i % 2 else "turn_off", "id": i} for i in ids]
+    json_acks = [json_send({"id": str(i), "status": "ok"}) for i in ids]
+    bin_acks = [framing.encode_ack(i) for i in ids]
+
+    sizes = {
+        "command": (len(json_send(commands[0])), len(framing.encode_message(commands[0]))),
+        "ack": (len(json_acks[0]), len(bin_acks[0])),
+        "ping": (len(b"ping"), len(framing.PING_FRAME)),
+        "pong": (len(b"pong"), len(framing.PONG_FRAME)),
+        "state": (len(json_send({"state": {"on": True}})), len(framing.STATE_ON_FRAME)),
+    }
+    print(f"{'frame':<8} {'json B':>7} {'bin1 B':>7}")
+    for name, (j, b) in sizes.items():
+        print(f"{name:<8} {j:7d} {b:7d}")
+    # Цикл команды: команда + ack + один ping/pong на heartbeat
+    j_total = sizes["command"][0] + sizes["ack"][0] + sizes["ping"][0] + sizes["pong"][0]
+    b_total = sizes["command"][1] + sizes["ack"][1] + sizes["ping"][1] + sizes["pong"][1]
+    print(f"command round trip + heartbeat: json {j_total} B, bin1 {b_total} B ({b_total / j_total:.0%})")
+    print()
+
+    print(f"{'op':<16} {'json ns':>9} {'bin1 ns':>9}")
+    encode = (measure(json_send, commands, args.rounds), measure(framing.encode_message, commands, args.rounds))
+    decode = (measure(json_ack, json_acks, args.rounds), measure(binary_ack, bin_acks, args.rounds))
+    print(f"{'encode command':<16} {encode[0]:9.0f} {encode[1]:9.0f}")
+    print(f"{'decode ack':<16} {decode[0]:9.0f} {decode[1]:9.0f}")
+
+
+if __name__ == "__main__":
+    main()
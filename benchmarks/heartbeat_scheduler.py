@@ -0,0 +1,98 @@
+"""
+Сравнение heartbeat: прежняя схема (ping-задача на каждое подключение)
+против общего колеса HeartbeatScheduler. Меряем лаг event loop и CPU.
+
+Запуск из корня проекта:
+    python -m benchmarks.heartbeat_scheduler --devices 10000 --duration 10
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.ws.heartbeat import HeartbeatScheduler
+
+
+class FakeSocket:
+    """Устройство, которое сразу отвечает pong на каждый ping."""
+
+    def __init__(self, device_id: str, on_pong):
+        self.device_id = device_id
+        self.on_pong = on_pong
+
+    async def send_text(self, data: str):
+        self.on_pong(self.device_id)
+
+    async def close(self):
+        pass
+
+
+async def per_task_ping(ws: FakeSocket, last_pong: dict, interval: float, timeout: float):
+    # Копия прежнего DeviceWebSocketSession.ping_pong
+    while True:
+        await ws.send_text("ping")
+        last = last_pong.get(ws.device_id)
+        if last is None or time.monotonic() - last > timeout:
+            break
+        await asyncio.sleep(interval)
+
+
+async def measure_lag(duration: float, probe: float = 0.01) -> list[float]:
+    lags = []
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        started = time.perf_counter()
+        await asyncio.sleep(probe)
+        lags.append((time.perf_counter() - started - probe) * 1000)
+    return lags
+
+
+async def run_per_task(devices: int, interval: float, duration: float):
+    last_pong = {}
+
+    def on_pong(device_id):
+        last_pong[device_id] = time.monotonic()
+
+    tasks = []
+    for i in range(devices):
+        on_pong(f"d{i}")
+        tasks.append(asyncio.create_task(per_task_ping(FakeSocket(f"d{i}", on_pong), last_pong, interval, 2 * interval)))
+    lags = await measure_lag(duration)
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return lags
+
+
+async def run_wheel(devices: int, interval: float, duration: float):
+    scheduler = HeartbeatScheduler(interval=interval, timeout=2 * interval)
+    for i in range(devices):
+        scheduler.register(f"d{i}", FakeSocket(f"d{i}", scheduler.pong))
+    lags = await measure_lag(duration)
+    scheduler._task.cancel()
+    return lags
+
+
+def report(name: str, runner, args):
+    cpu = time.process_time()
+    lags = asyncio.run(runner(args.devices, args.interval, args.duration))
+    cpu = time.process_time() - cpu
+    lags.sort()
+    print(f"{name:<10} cpu {cpu:6.2f} s | loop lag mean {statistics.mean(lags):6.2f} ms, "
+          f"p99 {lags[int(len(lags) * 0.99)]:6.2f} ms, max {lags[-1]:6.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=10000)
+    parser.add_argument("--interval", type=float, default=5.0)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    print(f"devices={args.devices} interval={args.interval}s duration={args.duration}s")
+    report("per-task", run_per_task, args)
+    report("wheel", run_wheel, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Пропускная способность API с логами и без (app/logger_module/logging_config.py).
+Настоящий uvicorn подпроцессом, stdout сервера — в файл; клиенты по TCP гоняют
+попеременно GET /v1.0/user/devices и POST /v1.0/user/devices/action (розетка офлайн,
+так что ответ не ждёт устройство и меряется сам запрос).
+
+Кроме запросов в секунду печатается процессорное время сервера на запрос
+(/proc/<pid>/stat): клиент делит с сервером процессор, и по нему разница видна точнее.
+
+Режимы:
+  off            — логов нет: LEVEL=WARNING, uvicorn --no-access-log;
+  uvicorn-sync   — access-лог uvicorn как раньше: синхронно в stdout из event loop;
+  queue-info     — INFO через очередь: access-лог JSON-строками из потока вывода;
+  queue-debug    — DEBUG с прореживанием (каждая --sample-я запись одного места в коде);
+  queue-debug-all — DEBUG без прореживания.
+
+Запуск из корня проекта:
+    python -m benchmarks.logging_throughput --requests 5000 --concurrency 32
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+
+CLIENT = {"client_id": "my-smart-home", "client_secret": "supersecret123"}
+REDIRECT_URI = "https://social.yandex.net/broker/redirect"
+USER_ID = "user-1"  # владелец демо-розетки socket-1 из config.py
+ACTION = {"payload": {"devices": [{"id": "socket-1", "capabilities": [
+    {"type": "devices.capabilities.on_off", "state": {"instance": "on", "value": True}}]}]}}
+
+MODES = {
+    "off": ({"LEVEL": "WARNING"}, ["--no-access-log"]),
+    "uvicorn-sync": ({"LEVEL": "INFO", "CAPTURE_UVICORN": "false"}, []),
+    "queue-info": ({"LEVEL": "INFO"}, []),
+    "queue-debug": ({"LEVEL": "DEBUG"}, []),
+    "queue-debug-all": ({"LEVEL": "DEBUG", "DEBUG_SAMPLE_EVERY": "1"}, []),
+}
+
+
+def start_server(port: int, env: dict, flags: list[str], stdout) -> subprocess.Popen:
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+                               "--log-level", "info", *flags], env=env, stdout=stdout, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return server
+        except OSError:
+            time.sleep(0.05)
+    server.kill()
+    raise RuntimeError("server did not start")
+
+
+def cpu_seconds(pid: int) -> float:
+    fields = open(f"/proc/{pid}/stat").read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")  # utime + stime
+
+
+async def access_token(http: httpx.AsyncClient) -> str:
+    response = await http.get("/authorize", params={"client_id": CLIENT["client_id"], "redirect_uri": REDIRECT_URI,
+                                                    "response_type": "code", "user": USER_ID})
+    code = parse_qs(urlparse(response.headers["location"]).query)["code"][0]
+    response = await http.post("/token", data={**CLIENT, "grant_type": "authorization_code", "code": code})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def load(port: int, requests: int, concurrency: int) -> float:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=30) as http:
+        headers = {"Authorization": f"Bearer {await access_token(http)}"}
+        remaining = iter(range(requests))
+
+        async def worker():
+            for n in remaining:
+                if n % 2:
+                    response = await http.post("/v1.0/user/devices/action", json=ACTION, headers=headers)
+                else:
+                    response = await http.get("/v1.0/user/devices", headers=headers)
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return requests / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--sample", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.modes:
+            overrides, flags = MODES[name]
+            env = {**os.environ, "STORAGE_PATH": ":memory:", "TELEMETRY_PATH": os.path.join(tmp, "telemetry"),
+                   "LOG_FORMAT": "json", "TELEGRAM_ENABLED": "false", "DEBUG_SAMPLE_EVERY": str(args.sample),
+                   **overrides}
+            rates, cpu, lines = [], [], 0
+            for _ in range(args.repeat):
+                log_path = os.path.join(tmp, f"{name}.log")
+                with open(log_path, "w") as out:
+                    server = start_server(args.port, env, flags, out)
+                    try:
+                        started = cpu_seconds(server.pid)
+                        rates.append(asyncio.run(load(args.port, args.requests, args.concurrency)))
+                        cpu.append((cpu_seconds(server.pid) - started) / args.requests * 1e6)
+                    finally:
+                        server.terminate()
+                        server.wait()
+                with open(log_path, "rb") as f:
+                    lines += sum(1 for _ in f)
+            rates.sort()
+            cpu.sort()
+            print(f"{name:<16} {rates[len(rates) // 2]:8.0f} req/s | server CPU {cpu[len(cpu) // 2]:6.0f} us/request"
+                  f" | {lines / args.repeat / args.requests:5.2f} log lines per request (median of {args.repeat})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Цена сторожа event loop и то, что он ловит.
+
+1. Нагрузка из мелких переключений (--tasks задач по --hops await sleep(0)):
+   время без сторожа, со сторожем и со сторожем во время профилирования.
+2. Синхронный вызов на 300 мс в корутине (как requests.post в обработчике
+   логов): сторож должен записать зависание со стеком, ведущим к нему.
+
+Запуск из корня проекта:
+    python -m benchmarks.loop_monitor
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from app.loop_monitor import LoopMonitor
+from config import LoopMonitorSettings
+
+
+async def workload(tasks: int, hops: int) -> float:
+    async def hop():
+        for _ in range(hops):
+            await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(hop() for _ in range(tasks)))
+    return time.perf_counter() - started
+
+
+def blocking_send():
+    time.sleep(0.3)  # синхронная сеть/stdout прямо в цикле
+
+
+async def handler():
+    blocking_send()
+
+
+async def run(args):
+    base = min([await workload(args.tasks, args.hops) for _ in range(args.repeat)])
+    monitor = LoopMonitor(LoopMonitorSettings(enabled=True))
+    await monitor.start()
+    watched = min([await workload(args.tasks, args.hops) for _ in range(args.repeat)])
+    profile = asyncio.create_task(monitor.profile(60))
+    profiled = min([await workload(args.tasks, args.hops) for _ in range(args.repeat)])
+    profile.cancel()
+    switches = args.tasks * args.hops
+    print(f"{switches} loop switches:")
+    print(f"  no monitor:        {base * 1000:8.1f} ms")
+    print(f"  monitor:           {watched * 1000:8.1f} ms ({(watched / base - 1) * 100:+.1f}%)")
+    print(f"  monitor+profiling: {profiled * 1000:8.1f} ms ({(profiled / base - 1) * 100:+.1f}%)")
+
+    await handler()
+    await asyncio.sleep(0.1)
+    stall = monitor.stalls[-1] if monitor.stalls else None
+    caught = stall is not None and any("blocking_send" in frame for frame in stall["stack"])
+    print(f"stall of 300 ms:     {stall['duration_ms'] if stall else '-'} ms recorded, stack points at "
+          f"blocking_send: {caught}")
+    await monitor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=100)
+    parser.add_argument("--hops", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
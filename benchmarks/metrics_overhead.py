@@ -0,0 +1,65 @@
+"""
+Цена инструментирования: одно наблюдение метрики и MetricsMiddleware
+на запрос (ASGI-приложение вызывается напрямую, без сети и TestClient).
+
+Запуск из корня проекта:
+    python -m benchmarks.metrics_overhead
+"""
+import asyncio
+import time
+import timeit
+
+from app.metrics import Counter, Histogram, MetricsMiddleware, registry
+
+
+class _Route:
+    path = "/v1.0/user/devices"
+
+
+async def plain_app(scope, receive, send):
+    scope["route"] = _Route
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def drive(app, requests: int) -> float:
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        await app({"type": "http", "method": "GET", "path": "/v1.0/user/devices"}, receive, send)
+    return (time.perf_counter() - started) / requests
+
+
+def per_call(stmt, number: int = 1_000_000) -> float:
+    return min(timeit.repeat(stmt, number=number, repeat=5)) / number * 1e9
+
+
+def main():
+    counter = Counter("bench_counter", "bench", ["kind"])
+    child = counter.labels("pong")
+    histogram = Histogram("bench_histogram", "bench", ["route"])
+    hist_child = histogram.labels("/x")
+
+    print(f"counter child.inc():        {per_call(child.inc):6.0f} ns")
+    print(f"counter.labels(..).inc():   {per_call(lambda: counter.labels('pong').inc()):6.0f} ns")
+    print(f"histogram child.observe():  {per_call(lambda: hist_child.observe(0.003)):6.0f} ns")
+
+    requests = 200_000
+    bare = asyncio.run(drive(plain_app, requests))
+    instrumented = asyncio.run(drive(MetricsMiddleware(plain_app), requests))
+    print(f"request without middleware: {bare * 1e6:6.2f} us")
+    print(f"request with middleware:    {instrumented * 1e6:6.2f} us "
+          f"(+{(instrumented - bare) * 1e6:.2f} us per request)")
+
+    started = time.perf_counter()
+    body = registry.render()
+    print(f"/metrics render:            {(time.perf_counter() - started) * 1000:6.2f} ms, {len(body)} bytes")
+
+
+if __name__ == "__main__":
+    main()
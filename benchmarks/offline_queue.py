@@ -0,0 +1,113 @@
+"""
+Массовый обрыв и переподключение: N розеток пропадают разом, пока они офлайн,
+Алиса --flips раз переключает их все (каждый раз DEVICE_UNREACHABLE, команда
+уходит в очередь и схлопывается с предыдущей), затем все возвращаются
+одновременно. Меряем размер очереди, время досылки до последнего ack и то,
+что каждая розетка получила ровно одну — последнюю — команду.
+
+Запуск из корня проекта:
+    python -m benchmarks.offline_queue --devices 10000 --flips 5
+"""
+import argparse
+import asyncio
+import os
+import time
+import tracemalloc
+
+os.environ.setdefault("STORAGE_PATH", ":memory:")
+
+import httpx
+
+from app.devices import add_device
+from app.main import app
+from app.tokens import token_service
+from app.ws.command_tracker import command_tracker
+from app.ws.offline_queue import offline_queue
+from app.ws.websocket_manager import device_ws_manager
+from config import DB, event_bus
+
+
+class AckingSocket:
+    """Розетка: запоминает полученные команды и сразу подтверждает те, что с id."""
+
+    def __init__(self, device_id: str):
+        self.device_id = device_id
+        self.commands: list[str] = []
+
+    async def send_json(self, data):
+        if "action" in data:
+            self.commands.append(data["action"])
+        if "id" in data:
+            asyncio.get_running_loop().call_soon(command_tracker.resolve, self.device_id,
+                                                 {"id": data["id"], "status": "ok"})
+
+    async def send_text(self, data):
+        pass
+
+    async def close(self):
+        pass
+
+
+async def run(args):
+    user_id = "bench-user"
+    DB["users"][user_id] = {"id": user_id, "name": "bench"}
+    headers = {"Authorization": f"Bearer {token_service.issue_pair(user_id, 'my-smart-home')['access_token']}"}
+    ids = [f"flaky-{i}" for i in range(args.devices)]
+    for dev_id in ids:
+        add_device({"id": dev_id, "owner_id": user_id, "name": dev_id, "kind": "relay",
+                    "capabilities": ["on_off"], "state": {"on": False}})
+    offline_queue.max_devices = args.max_devices
+
+    # Все подключены, потом разом пропали
+    await asyncio.gather(*(device_ws_manager.add(d, AckingSocket(d)) for d in ids))
+    await asyncio.gather(*(device_ws_manager.remove(d) for d in ids))
+
+    tracemalloc.start()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        started = time.perf_counter()
+        for flip in range(args.flips):
+            body = {"payload": {"devices": [
+                {"id": d, "capabilities": [{"type": "devices.capabilities.on_off", "state": {"value": flip % 2 == 0}}]}
+                for d in ids]}}
+            response = await client.post("/v1.0/user/devices/action", json=body, headers=headers)
+            assert response.status_code == 200, response.text
+        queued_in = time.perf_counter() - started
+    index_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    desired = "turn_on" if (args.flips - 1) % 2 == 0 else "turn_off"
+    print(f"queued:          {len(offline_queue)} devices after {args.devices * args.flips} unreachable commands "
+          f"in {queued_in:.2f} s (collapsed {offline_queue.collapsed}, evicted {offline_queue.evicted})")
+    print(f"memory during offline phase: {index_bytes / 2**20:.1f} MiB traced")
+
+    # Все вернулись одновременно
+    sockets = {d: AckingSocket(d) for d in ids}
+    started = time.perf_counter()
+    await asyncio.gather(*(device_ws_manager.add(d, ws) for d, ws in sockets.items()))
+    expected_on = desired == "turn_on"
+    target = args.devices - offline_queue.evicted
+    while sum(DB["devices"][d]["state"]["on"] == expected_on for d in ids) < target:
+        await asyncio.sleep(0.01)
+        if time.perf_counter() - started > 60:
+            break
+    drained = time.perf_counter() - started
+
+    replayed = [ws.commands for ws in sockets.values() if ws.commands]
+    exact = sum(cmds == [desired] for cmds in replayed)
+    print(f"reconnect+drain: {drained:.2f} s for {args.devices} devices")
+    print(f"replayed:        {len(replayed)} devices, exactly one latest command: {exact}")
+    print(f"left queued:     {len(offline_queue)}")
+    await event_bus.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=10_000)
+    parser.add_argument("--flips", type=int, default=5)
+    parser.add_argument("--max-devices", type=int, default=100_000)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Задержки list/query/action при 100k устройств у 10k пользователей.
+Эндпоинты вызываются через TestClient; для сравнения выводится
+стоимость прежнего полного обхода DB["devices"] в list_devices.
+
+Запуск из корня проекта:
+    python -m benchmarks.owner_index --devices 100000 --users 10000
+"""
+import argparse
+import os
+import random
+import time
+
+os.environ.setdefault("STORAGE_PATH", ":memory:")
+
+from starlette.testclient import TestClient
+
+from app.devices import add_device
+from app.main import app
+from app.tokens import token_service
+from app.yandex_format import to_yandex_device
+from config import DB
+
+
+def seed(devices: int, users: int) -> list[str]:
+    tokens = []
+    for u in range(users):
+        user_id = f"user-{u}"
+        DB["users"][user_id] = {"id": user_id, "name": user_id}
+        tokens.append(token_service.issue_pair(user_id, "my-smart-home")["access_token"])
+    for i in range(devices):
+        add_device({"id": f"dev-{i}", "owner_id": f"user-{i % users}", "name": f"Розетка {i}",
+                    "kind": "relay", "capabilities": ["on_off"], "state": {"on": False}})
+    return tokens
+
+
+def timed(samples: list[float], fn):
+    started = time.perf_counter()
+    response = fn()
+    samples.append((time.perf_counter() - started) * 1000)
+    assert response.status_code == 200, response.text
+
+
+def report(name: str, samples: list[float]):
+    samples.sort()
+    print(f"{name:<8} p50 {samples[len(samples) // 2]:7.2f} ms | p99 {samples[int(len(samples) * 0.99)]:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    tokens = seed(args.devices, args.users)
+    print(f"seeded {args.devices} devices / {args.users} users in {time.perf_counter() - started:.1f} s")
+
+    results = {"list": [], "query": [], "action": []}
+    with TestClient(app) as client:
+        for _ in range(args.requests):
+            u = random.randrange(args.users)
+            headers = {"Authorization": f"Bearer {tokens[u]}"}
+            own = [{"id": f"dev-{i}"} for i in range(u, args.devices, args.users)]
+            timed(results["list"], lambda: client.get("/v1.0/user/devices", headers=headers))
+            timed(results["query"], lambda: client.post("/v1.0/user/devices/query", json={"devices": own},
+                                                        headers=headers))
+            body = {"payload": {"devices": [
+                {**d, "capabilities": [{"type": "devices.capabilities.on_off", "state": {"value": True}}]}
+                for d in own]}}
+            timed(results["action"], lambda: client.post("/v1.0/user/devices/action", json=body, headers=headers))
+
+    for name, samples in results.items():
+        report(name, samples)
+
+    # Прежний list_devices: полный обход всех устройств системы
+    scan = []
+    for _ in range(20):
+        owner = f"user-{random.randrange(args.users)}"
+        started = time.perf_counter()
+        [to_yandex_device(d) for d in DB["devices"].values() if d["owner_id"] == owner]
+        scan.append((time.perf_counter() - started) * 1000)
+    report("scan", scan)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Шторм переподключений: N розеток (по --per-home на домашний IP 127.x.y.z)
+одновременно стучатся в /ws/{id}/connect настоящего uvicorn. Отказанные
+ждут выданный сервером Retry-After и пробуют снова. Меряем время от первой
+попытки до авторизованной сессии, число отказов и пиковую память сервера.
+--no-admission запускает сервер с практически снятыми лимитами для сравнения.
+
+Запуск из корня проекта:
+    python -m benchmarks.reconnect_storm --devices 10000
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import websockets
+from websockets.exceptions import InvalidStatus
+
+WELCOME = {"message": "Вы подключились"}
+UNLIMITED = {"ADMISSION_MAX_HANDSHAKES": "1000000", "ADMISSION_HANDSHAKE_RATE": "1000000",
+             "ADMISSION_IP_RATE": "1000000", "ADMISSION_IP_BURST": "1000000",
+             "ADMISSION_DEVICE_RATE": "1000000", "ADMISSION_DEVICE_BURST": "1000000"}
+
+
+def seed(path: str, devices: int):
+    os.environ["STORAGE_PATH"] = path
+    from app.devices import add_device
+    from config import storage
+    for i in range(devices):
+        add_device({"id": f"storm-{i}", "owner_id": f"user-{i // 10}", "name": f"storm-{i}", "kind": "relay",
+                    "capabilities": ["on_off"], "state": {"on": False}})
+    storage.flush()
+
+
+def handshake_outcomes(port: int) -> dict[str, float]:
+    # Разбивка исходов по серверной метрике ws_handshakes_total
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+        text = response.read().decode()
+    return {line.split('"')[1]: float(line.rsplit(" ", 1)[1])
+            for line in text.splitlines() if line.startswith("ws_handshakes_total{")}
+
+
+def peak_rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmHWM"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+async def device(i: int, port: int, per_home: int, stop: asyncio.Event, stats: dict):
+    home = i // per_home
+    local_ip = f"127.{1 + home // 65536}.{home // 256 % 256}.{home % 256 or 1}"
+    started = time.perf_counter()
+    while i not in stats["latency"] and not stop.is_set():
+        try:
+            async with websockets.connect(f"ws://127.0.0.1:{port}/ws/storm-{i}/connect", open_timeout=60,
+                                          close_timeout=1, ping_interval=None, max_queue=None,
+                                          local_addr=(local_ip, 0)) as ws:
+                await ws.send(json.dumps({"auth_token": "abc123"}))
+                welcome = await ws.recv()
+                while welcome == "ping":
+                    await ws.send("pong")
+                    welcome = await ws.recv()
+                if json.loads(welcome) != WELCOME:
+                    # Отказ сессии (таймаут авторизации) — за ним последует close(1008)
+                    stats["errors"] += 1
+                    await asyncio.sleep(1)
+                    continue
+                stats["latency"][i] = time.perf_counter() - started
+                # Держим сессию до конца шторма (задачу отменяет storm), отвечая на ping
+                async for frame in ws:
+                    if frame == "ping":
+                        await ws.send("pong")
+        except InvalidStatus as e:
+            stats["rejected"] += 1
+            await asyncio.sleep(float(e.response.headers.get("Retry-After", 1)))
+        except (OSError, websockets.exceptions.WebSocketException, asyncio.TimeoutError):
+            # Обрыв после авторизации (сервер не дождался pong) — тоже считаем, но не переподключаемся
+            stats["dropped" if i in stats["latency"] else "errors"] += 1
+            await asyncio.sleep(1)
+
+
+async def storm(args, port: int) -> dict:
+    stats = {"latency": {}, "rejected": 0, "errors": 0, "dropped": 0}
+    stop = asyncio.Event()
+    tasks = [asyncio.create_task(device(i, port, args.per_home, stop, stats)) for i in range(args.devices)]
+    started = time.perf_counter()
+    while len(stats["latency"]) < args.devices and time.perf_counter() - started < args.deadline:
+        await asyncio.sleep(0.1)
+    stats["all_connected"] = time.perf_counter() - started
+    stop.set()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return stats
+
+
+def run_server(db: str, port: int, extra_env: dict) -> subprocess.Popen:
+    env = {**os.environ, "STORAGE_PATH": db, **extra_env}
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+                               "--log-level", "warning", "--backlog", "16384"],
+                              env=env, stdout=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            import socket
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=10_000)
+    parser.add_argument("--per-home", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--deadline", type=float, default=300)
+    parser.add_argument("--no-admission", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "storm.db")
+        seed(db, args.devices)
+        server = run_server(db, args.port, UNLIMITED if args.no_admission else {})
+        try:
+            stats = asyncio.run(storm(args, args.port))
+            rss = peak_rss_mb(server.pid)
+            outcomes = handshake_outcomes(args.port)
+        finally:
+            server.terminate()
+            server.wait()
+
+    latency = sorted(stats["latency"].values())
+    q = lambda p: latency[min(len(latency) - 1, int(len(latency) * p))] if latency else float("nan")
+    print(f"mode:           {'no admission' if args.no_admission else 'admission'}")
+    print(f"connected:      {len(latency)}/{args.devices} in {stats['all_connected']:.1f} s")
+    print(f"rejected (429): {stats['rejected']}, failed attempts: {stats['errors']}, dropped after auth: {stats['dropped']}")
+    print(f"handshake s:    p50 {q(0.5):.2f} | p95 {q(0.95):.2f} | p99 {q(0.99):.2f} | max {q(1):.2f}")
+    print(f"server outcomes: {outcomes}")
+    print(f"server peak RSS: {rss:.0f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Задержка группы/сцены «выключить всё» на 10, 100 и 1000 розеток (app/groups.py).
+Сравниваем:
+  action   — тот же набор устройств одним /v1.0/user/devices/action (ActionPlan,
+             задача на устройство под семафором ACTION_CONCURRENCY);
+  compiled — /v1.0/user/groups/{id}/action сразу после сброса плана (сборка + запуск);
+  cached   — повторный запуск той же группы по готовому плану.
+Розетки — заглушки сокетов за настоящей очередью OutboundSocket, отвечающие ack
+через --rtt секунд (±50%); запросы идут через ASGI-приложение (httpx.ASGITransport).
+--frame bin1 — те же розетки с двоичными кадрами (BinaryDeviceSocket).
+
+Запуск из корня проекта:
+    python -m benchmarks.scene_groups --devices 10 100 1000 --rtt 0.02
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+
+os.environ.setdefault("STORAGE_PATH", ":memory:")
+
+import httpx
+
+from app.devices import add_device
+from app.groups import group_engine, group_key
+from app.main import app
+from app.tokens import token_service
+from app.ws.command_tracker import command_tracker
+from app.ws.framing import COMMAND, BinaryDeviceSocket, decode_ack
+from app.ws.websocket_manager import device_ws_manager
+from config import DB
+
+USER = "bench-user"
+
+
+class AckingSocket:
+    """Розетка, подтверждающая каждую команду через rtt секунд (JSON или сырые кадры bin1)."""
+
+    def __init__(self, device_id: str, rtt: float):
+        self.device_id = device_id
+        self.rtt = rtt
+
+    def _ack(self, command_id: str):
+        asyncio.get_running_loop().call_later(self.rtt * random.uniform(0.5, 1.5), command_tracker.resolve_id,
+                                              self.device_id, command_id)
+
+    async def send_json(self, data):
+        if "id" in data:
+            self._ack(str(data["id"]))
+
+    async def send_text(self, text: str):
+        if text != "ping":
+            self._ack(str(json.loads(text)["id"]))
+
+    async def send_bytes(self, frame: bytes):
+        if frame[0] == COMMAND:
+            self._ack(str(decode_ack(frame)[0]))  # у COMMAND и ACK одинаковая раскладка: тип, u32 id, u8
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+def done(response: httpx.Response) -> bool:
+    return all(d["capabilities"][0]["state"]["action_result"]["status"] == "DONE"
+               for d in response.json()["payload"]["devices"])
+
+
+async def measure(client: httpx.AsyncClient, group_id: str, ids: list[str], repeat: int,
+                  headers: dict) -> dict[str, list[float]]:
+    body = {"payload": {"devices": [{"id": dev_id, "capabilities": [
+        {"type": "devices.capabilities.on_off", "state": {"instance": "on", "value": False}}]} for dev_id in ids]}}
+    samples = {"action": [], "compiled": [], "cached": []}
+    for _ in range(repeat):
+        for name in samples:
+            if name == "compiled":
+                group_engine.invalidate(group_key(USER, group_id))
+            started = time.perf_counter()
+            if name == "action":
+                response = await client.post("/v1.0/user/devices/action", json=body, headers=headers)
+            else:
+                response = await client.post(f"/v1.0/user/groups/{group_id}/action", json={"on": False},
+                                             headers=headers)
+            samples[name].append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200 and done(response), response.text
+    return samples
+
+
+async def run(args):
+    headers = {"Authorization": f"Bearer {token_service.issue_pair(USER, 'my-smart-home')['access_token']}"}
+    DB["users"][USER] = {"id": USER, "name": "bench"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for n in args.devices:
+            ids = [f"group-{n}-{i}" for i in range(n)]
+            for dev_id in ids:
+                add_device({"id": dev_id, "owner_id": USER, "name": dev_id, "kind": "relay",
+                            "capabilities": ["on_off"], "state": {"on": True}})
+                ws = AckingSocket(dev_id, args.rtt)
+                await device_ws_manager.add(dev_id, BinaryDeviceSocket(ws) if args.frame == "bin1" else ws)
+            group_id = f"all-off-{n}"
+            response = await client.put(f"/v1.0/user/groups/{group_id}", json={"name": "Выключить всё", "devices": ids},
+                                        headers=headers)
+            assert response.status_code == 200, response.text
+            samples = await measure(client, group_id, ids, args.repeat, headers)
+            for name, values in samples.items():
+                values.sort()
+                print(f"devices={n:<5} {name:<8} | mean {statistics.mean(values):8.1f} ms"
+                      f" | p95 {values[int(len(values) * 0.95)]:8.1f} ms")
+            for dev_id in ids:
+                await device_ws_manager.remove(dev_id)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--rtt", type=float, default=0.02)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--frame", choices=("json", "bin1"), default="json")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
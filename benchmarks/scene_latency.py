@@ -0,0 +1,113 @@
+"""
+Задержка «сцены» (один action Алисы на N розеток) в зависимости от N.
+Каждое устройство в запросе получает лишнюю пару off -> on. Сравниваем
+прежнюю схему (кадр на каждое умение, по очереди) с ActionPlan:
+один кадр на устройство, все устройства сразу с ограничением параллельности.
+Розетки — заглушки сокетов, отвечающие ack через --rtt секунд (±50%);
+запрос идёт через ASGI-приложение целиком (httpx.ASGITransport).
+
+Запуск из корня проекта:
+    python -m benchmarks.scene_latency --devices 10 50 200 1000 --rtt 0.02
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+
+os.environ.setdefault("STORAGE_PATH", ":memory:")
+
+import httpx
+
+from app.actions import on_off_command
+from app.devices import add_device
+from app.main import app
+from app.tokens import token_service
+from app.ws.command_tracker import command_tracker
+from app.ws.websocket_manager import device_ws_manager
+from config import DB
+
+
+class AckingSocket:
+    """Розетка, подтверждающая каждую команду через rtt секунд."""
+    frames = 0
+
+    def __init__(self, device_id: str, rtt: float):
+        self.device_id = device_id
+        self.rtt = rtt
+
+    async def send_json(self, data):
+        if "id" in data:
+            AckingSocket.frames += 1
+            asyncio.get_running_loop().call_later(self.rtt * random.uniform(0.5, 1.5), command_tracker.resolve,
+                                                  self.device_id, {"id": data["id"], "status": "ok"})
+
+    async def close(self):
+        pass
+
+
+def scene(ids: list[str]) -> dict:
+    return {"payload": {"devices": [
+        {"id": dev_id, "capabilities": [
+            {"type": "devices.capabilities.on_off", "state": {"instance": "on", "value": False}},
+            {"type": "devices.capabilities.on_off", "state": {"instance": "on", "value": True}},
+        ]} for dev_id in ids]}}
+
+
+async def serial(body: dict):
+    # Копия прежнего action_devices: кадр на каждое умение, устройства по очереди
+    for dev in body["payload"]["devices"]:
+        for cap in dev["capabilities"]:
+            await device_ws_manager.send_command(dev["id"], on_off_command(cap["state"]["value"]))
+
+
+async def measure(client: httpx.AsyncClient, ids: list[str], repeat: int, token: str) -> dict[str, list[float]]:
+    body = scene(ids)
+    samples = {"serial": [], "planner": []}
+    frames = {}
+    for name in samples:
+        AckingSocket.frames = 0
+        for _ in range(repeat):
+            started = time.perf_counter()
+            if name == "serial":
+                await serial(body)
+            else:
+                response = await client.post("/v1.0/user/devices/action", json=body,
+                                             headers={"Authorization": f"Bearer {token}"})
+                assert all(d["capabilities"][0]["state"]["action_result"]["status"] == "DONE"
+                           for d in response.json()["payload"]["devices"]), response.text
+            samples[name].append((time.perf_counter() - started) * 1000)
+        frames[name] = AckingSocket.frames // repeat
+    return samples, frames
+
+
+async def run(args):
+    token = token_service.issue_pair("bench-user", "my-smart-home")["access_token"]
+    DB["users"]["bench-user"] = {"id": "bench-user", "name": "bench"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for n in args.devices:
+            ids = [f"scene-{n}-{i}" for i in range(n)]
+            for dev_id in ids:
+                add_device({"id": dev_id, "owner_id": "bench-user", "name": dev_id, "kind": "relay",
+                            "capabilities": ["on_off"], "state": {"on": False}})
+                await device_ws_manager.add(dev_id, AckingSocket(dev_id, args.rtt))
+            samples, frames = await measure(client, ids, args.repeat, token)
+            for name, values in samples.items():
+                values.sort()
+                print(f"devices={n:<5} {name:<8} frames {frames[name]:5d} | mean {statistics.mean(values):8.1f} ms"
+                      f" | p95 {values[int(len(values) * 0.95)]:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, nargs="+", default=[10, 50, 200, 1000])
+    parser.add_argument("--rtt", type=float, default=0.02)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
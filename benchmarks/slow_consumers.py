@@ -0,0 +1,152 @@
+"""
+Изоляция медленных потребителей: --healthy розеток отвечают ack через --rtt,
+а --slow розеток «зависли» (TCP-окно закрыто: send не возвращается). Пока
+фоновые запросы Алисы и поток уведомлений бьют в зависшие розетки, меряем:
+  - время запросов action по пачкам здоровых розеток (p50/p99);
+  - наибольший промежуток между ping у здоровых розеток (heartbeat общий);
+  - сколько зависших отключено по переполнению очереди (high-water mark).
+Сравниваем прогон без зависших и с ними — у здоровых цифры не должны меняться.
+
+Запуск из корня проекта:
+    python -m benchmarks.slow_consumers --healthy 3000 --slow 5
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+os.environ.setdefault("STORAGE_PATH", ":memory:")
+
+import httpx
+
+from app.devices import add_device
+from app.main import app
+from app.metrics import WS_OUTBOUND
+from app.tokens import token_service
+from app.ws.command_tracker import command_tracker
+from app.ws.heartbeat import HeartbeatScheduler
+from app.ws.websocket_manager import device_ws_manager
+from config import DB
+
+USER = "bench-user"
+
+
+class HealthySocket:
+    def __init__(self, device_id: str, rtt: float):
+        self.device_id = device_id
+        self.rtt = rtt
+        self.last_ping = 0.0
+        self.max_gap = 0.0
+
+    async def send_json(self, data):
+        if "id" in data:
+            asyncio.get_running_loop().call_later(self.rtt * random.uniform(0.5, 1.5), command_tracker.resolve,
+                                                  self.device_id, {"id": data["id"], "status": "ok"})
+
+    async def send_text(self, text):
+        now = time.perf_counter()
+        if self.last_ping:
+            self.max_gap = max(self.max_gap, now - self.last_ping)
+        self.last_ping = now
+
+    async def close(self):
+        pass
+
+
+class StalledSocket:
+    """Потребитель, который перестал читать: любая отправка висит."""
+
+    async def send_json(self, data):
+        await asyncio.sleep(3600)
+
+    async def send_text(self, text):
+        await asyncio.sleep(3600)
+
+    async def close(self):
+        pass
+
+
+def action_body(ids: list[str], value: bool) -> dict:
+    return {"payload": {"devices": [
+        {"id": d, "capabilities": [{"type": "devices.capabilities.on_off", "state": {"value": value}}]} for d in ids]}}
+
+
+async def phase(client, headers, label: str, args, slow_count: int):
+    healthy_ids = [f"{label}-ok-{i}" for i in range(args.healthy)]
+    slow_ids = [f"{label}-slow-{i}" for i in range(slow_count)]
+    for dev_id in healthy_ids + slow_ids:
+        add_device({"id": dev_id, "owner_id": USER, "name": dev_id, "kind": "relay",
+                    "capabilities": ["on_off"], "state": {"on": False}})
+    sockets = {d: HealthySocket(d, args.rtt) for d in healthy_ids}
+    heartbeat = HeartbeatScheduler(interval=args.ping_interval, timeout=3600)
+    for dev_id, ws in sockets.items():
+        heartbeat.register(dev_id, await device_ws_manager.add(dev_id, ws))
+    for dev_id in slow_ids:
+        heartbeat.register(dev_id, await device_ws_manager.add(dev_id, StalledSocket()))
+    await asyncio.sleep(args.ping_interval)
+    for ws in sockets.values():
+        ws.last_ping, ws.max_gap = 0.0, 0.0
+    overflow_before = WS_OUTBOUND.labels("overflow").value
+
+    async def hammer():
+        # Фон: Алиса переключает зависшие розетки, а сервер шлёт им уведомления
+        n = 0
+        while True:
+            n += 1
+            asyncio.create_task(client.post("/v1.0/user/devices/action", json=action_body(slow_ids, n % 2 == 0),
+                                            headers=headers))
+            for dev_id in slow_ids:
+                for _ in range(10):
+                    await device_ws_manager.send_personal(dev_id, {"message": "notice"})
+            await asyncio.sleep(0.05)
+
+    background = asyncio.create_task(hammer()) if slow_ids else None
+    latencies = []
+    for n in range(args.actions):
+        batch = [healthy_ids[(n * args.batch + k) % len(healthy_ids)] for k in range(args.batch)]
+        started = time.perf_counter()
+        response = await client.post("/v1.0/user/devices/action", json=action_body(batch, n % 2 == 0),
+                                     headers=headers)
+        latencies.append((time.perf_counter() - started) * 1000)
+        assert all(d["capabilities"][0]["state"]["action_result"]["status"] == "DONE"
+                   for d in response.json()["payload"]["devices"]), response.text
+    if background is not None:
+        background.cancel()
+    await asyncio.sleep(0.1)
+
+    latencies.sort()
+    gap = max(ws.max_gap for ws in sockets.values())
+    dropped = sum(d not in device_ws_manager.active for d in slow_ids)
+    print(f"slow={slow_count:<3} action over {args.batch} healthy: p50 {latencies[len(latencies) // 2]:7.1f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99)]:7.1f} ms | max ping gap {gap:5.2f} s "
+          f"(interval {args.ping_interval:g}) | slow disconnected {dropped}/{slow_count} "
+          f"(overflow {WS_OUTBOUND.labels('overflow').value - overflow_before:.0f})")
+
+    heartbeat._task.cancel()
+    await asyncio.gather(*(device_ws_manager.remove(d) for d in healthy_ids + slow_ids))
+
+
+async def run(args):
+    DB["users"][USER] = {"id": USER, "name": "bench"}
+    headers = {"Authorization": f"Bearer {token_service.issue_pair(USER, 'my-smart-home')['access_token']}"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        await phase(client, headers, "calm", args, 0)
+        await phase(client, headers, "storm", args, args.slow)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--healthy", type=int, default=3000)
+    parser.add_argument("--slow", type=int, default=5)
+    parser.add_argument("--actions", type=int, default=100)
+    parser.add_argument("--batch", type=int, default=50)
+    parser.add_argument("--rtt", type=float, default=0.02)
+    parser.add_argument("--ping-interval", type=float, default=1.0)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
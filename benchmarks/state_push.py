@@ -0,0 +1,103 @@
+"""
+Пуш состояний в Алису против локальной заглушки callback/state:
+устройства «дребезжат» (несколько переключений подряд), часть ответов
+заглушки — 500. Считаем отчёты устройств, реально отправленные запросы
+и итоговое состояние, которое увидела заглушка.
+
+Запуск из корня проекта:
+    python -m benchmarks.state_push --users 200 --devices-per-user 5 --flaps 6 --fail-rate 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault("STORAGE_PATH", ":memory:")
+
+from app.devices import add_device
+from app.notifications import StateNotifier
+from app.ws import websocket_handlers
+from config import DB, NotificationSettings
+
+
+def start_stand_in(fail_rate: float):
+    seen: dict[str, bool] = {}
+    stats = {"requests": 0, "failed": 0}
+
+    class Callback(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            stats["requests"] += 1
+            if random.random() < fail_rate:
+                stats["failed"] += 1
+                self.send_response(500)
+                self.end_headers()
+                return
+            for device in body["payload"]["devices"]:
+                seen[device["id"]] = device["capabilities"][0]["state"]["value"]
+            self.send_response(202)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(b'{"status":"ok"}')
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Callback)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, seen, stats
+
+
+async def run(args, port: int):
+    notifier = StateNotifier(NotificationSettings(
+        enabled=True, skill_id="bench", oauth_token="t", callback_base=f"http://127.0.0.1:{port}",
+        window=0.2, backoff=0.05))
+    # Подменяем глобальный нотификатор, которым пользуется обработчик message_from_device
+    websocket_handlers.state_notifier = notifier
+    await notifier.start()
+
+    ids = []
+    for u in range(args.users):
+        for d in range(args.devices_per_user):
+            dev_id = f"u{u}-d{d}"
+            add_device({"id": dev_id, "owner_id": f"user-{u}", "name": dev_id, "kind": "relay",
+                        "capabilities": ["on_off"], "state": {"on": False}})
+            ids.append(dev_id)
+
+    reports = 0
+    started = time.perf_counter()
+    for flap in range(args.flaps):
+        for dev_id in ids:
+            await websocket_handlers.handle_device_message(dev_id, "on" if flap % 2 == 0 else "off")
+            reports += 1
+        await asyncio.sleep(0.01)
+    await notifier.close()
+    return notifier, reports, time.perf_counter() - started, {i: DB["devices"][i]["state"]["on"] for i in ids}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--devices-per-user", type=int, default=5)
+    parser.add_argument("--flaps", type=int, default=6)
+    parser.add_argument("--fail-rate", type=float, default=0.2)
+    args = parser.parse_args()
+
+    server, seen, stats = start_stand_in(args.fail_rate)
+    notifier, reports, elapsed, final = asyncio.run(run(args, server.server_port))
+    server.shutdown()
+
+    print(f"device reports:       {reports}")
+    print(f"coalesced in window:  {notifier.coalesced}")
+    print(f"callback requests:    {stats['requests']} ({stats['failed']} answered 500 and retried)")
+    print(f"batches delivered:    {notifier.sent}, given up: {notifier.failed}")
+    print(f"final state matches:  {sum(seen.get(i) == v for i, v in final.items())}/{len(final)}")
+    print(f"elapsed:              {elapsed:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
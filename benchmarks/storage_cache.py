@@ -0,0 +1,78 @@
+"""
+Стоимость обращений к хранилищу на один запрос: кэш + write-behind
+против прямой работы с SQLite (cache_size=0, flush_interval=0).
+
+Запрос моделирует action_devices: auth_yandex (tokens + users),
+чтение устройства и сохранение его нового состояния.
+
+Запуск из корня проекта:
+    python -m benchmarks.storage_cache --devices 10000 --requests 20000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from app.storage.sqlite_store import SQLiteStore
+from app.storage.write_behind import WriteBehindStore
+
+
+def seed(backend: WriteBehindStore, devices: int):
+    tokens, users, db_devices = backend.mapping("tokens"), backend.mapping("users"), backend.mapping("devices")
+    for i in range(devices):
+        user_id = f"user-{i // 10}"
+        tokens[f"token-{user_id}"] = user_id
+        users[user_id] = {"id": user_id, "name": user_id}
+        db_devices[f"dev-{i}"] = {"id": f"dev-{i}", "owner_id": user_id, "name": "Розетка", "kind": "relay",
+                                  "capabilities": ["on_off"], "state": {"on": False}}
+    backend.flush()
+
+
+def run(name: str, devices: int, requests: int, **options):
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = WriteBehindStore(SQLiteStore(os.path.join(tmp, "bench.db")), **options)
+        seed(backend, devices)
+        tokens, users, db_devices = backend.mapping("tokens"), backend.mapping("users"), backend.mapping("devices")
+        # 80% запросов приходятся на 20% устройств — «горячие» дома
+        hot = [f"dev-{i}" for i in range(devices // 5)]
+        keys = [random.choice(hot) if random.random() < 0.8 else f"dev-{random.randrange(devices)}"
+                for _ in range(requests)]
+
+        read_time = write_time = 0.0
+        for dev_id in keys:
+            started = time.perf_counter()
+            user_id = tokens.get(f"token-user-{int(dev_id[4:]) // 10}")
+            user = users[user_id]
+            d = db_devices.get(dev_id)
+            middle = time.perf_counter()
+            d["state"]["on"] = not d["state"]["on"]
+            db_devices[dev_id] = d
+            write_time += time.perf_counter() - middle
+            read_time += middle - started
+            assert user["id"] == d["owner_id"]
+
+        started = time.perf_counter()
+        backend.flush()
+        final_flush = time.perf_counter() - started
+        backend.close()
+
+    print(f"{name:<14} reads {read_time / requests * 1e6:8.1f} us/req | "
+          f"writes {write_time / requests * 1e6:8.1f} us/req | final flush {final_flush * 1000:6.1f} ms | "
+          f"cache hit rate {backend.cache.hits / max(backend.cache.hits + backend.cache.misses, 1):.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    random.seed(1)
+    run("cache on", args.devices, args.requests, cache_size=args.devices * 3, flush_interval=0.5)
+    random.seed(1)
+    run("cache off", args.devices, args.requests, cache_size=0, flush_interval=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+TelegramLogHandler против локальной заглушки Bot API: сколько стоит
+logger.warning на вызывающем потоке, сколько сообщений реально ушло,
+сколько записей отброшено и как долго длится close().
+
+Запуск из корня проекта:
+    python -m benchmarks.telegram_handler --records 5000 --api-delay 0.2
+"""
+import argparse
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.logger_module.telegram_handler import TelegramLogHandler
+
+
+def start_stand_in(delay: float) -> tuple[ThreadingHTTPServer, list[bytes]]:
+    received: list[bytes] = []
+
+    class BotApi(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            time.sleep(delay)  # медленный api.telegram.org
+            received.append(body)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(b'{"ok":true}')
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), BotApi)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, received
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=5000)
+    parser.add_argument("--api-delay", type=float, default=0.2)
+    args = parser.parse_args()
+
+    server, received = start_stand_in(args.api_delay)
+    handler = TelegramLogHandler("test-token", "42", batch_interval=0.5, max_per_minute=20,
+                                 api_base=f"http://127.0.0.1:{server.server_port}")
+    logger = logging.getLogger("bench.telegram")
+    logger.propagate = False
+    logger.addHandler(handler)
+
+    started = time.perf_counter()
+    for i in range(args.records):
+        logger.warning(f"[PING] No pong from socket-{i} for >10s")
+    emit_time = time.perf_counter() - started
+
+    time.sleep(2)
+    started = time.perf_counter()
+    handler.close()
+    close_time = time.perf_counter() - started
+    server.shutdown()
+
+    print(f"records:            {args.records}")
+    print(f"emit per record:    {emit_time / args.records * 1e6:.1f} us "
+          f"(synchronous requests.post: >= {args.api_delay * 1000:.0f} ms)")
+    print(f"messages sent:      {handler.sent_messages} (stand-in received {len(received)})")
+    print(f"records dropped:    {handler.dropped}")
+    print(f"close():            {close_time * 1000:.0f} ms (limit {handler.shutdown_timeout:.0f} s)")
+
+
+if __name__ == "__main__":
+    main()
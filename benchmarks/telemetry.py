@@ -0,0 +1,131 @@
+"""
+Приём телеметрии и запросы диапазонов (app/telemetry.py).
+
+1. История: --devices розеток шлют мощность и энергию раз в --interval секунд
+   за последние --days дней (в порядке времени, как пришло бы по сокетам).
+   Меряем показания в секунду (ingest в loop плюс сброс в агрегаты в потоке) и место на диске.
+2. Свежие кадры с разбором: текстовые {"telemetry": ...} и двоичные TELEMETRY —
+   кадры в секунду через ingest_text / ingest_frame.
+3. Запросы диапазонов по случайным устройствам: сутки (1m), 30 и 90 дней (1h),
+   90 дней (1d) — напрямую и через эндпоинт /v1.0/user/devices/{id}/telemetry.
+
+Запуск из корня проекта:
+    python -m benchmarks.telemetry --devices 2000 --days 90
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+
+os.environ.setdefault("STORAGE_PATH", ":memory:")
+OWN_PATH = "TELEMETRY_PATH" not in os.environ
+os.environ.setdefault("TELEMETRY_PATH", tempfile.mkdtemp(prefix="telemetry-bench-"))
+
+import httpx
+
+from app.devices import add_device
+from app.main import app
+from app.telemetry import DAY, telemetry_store
+from app.tokens import token_service
+from app.ws.framing import encode_telemetry
+from config import DB, telemetry_settings
+
+USER = "bench-user"
+
+
+def percentiles(samples: list[float]) -> str:
+    samples.sort()
+    return f"p50 {samples[len(samples) // 2]:7.2f} ms, p99 {samples[int(len(samples) * 0.99)]:7.2f} ms"
+
+
+async def history(args, now: int):
+    devices = [f"plug-{i}" for i in range(args.devices)]
+    start = now - args.days * DAY
+    start -= start % args.interval
+    readings = 0
+    started = time.perf_counter()
+    energy = [0.0] * args.devices
+    for ts in range(start, now, args.interval):
+        for i, device_id in enumerate(devices):
+            power = 50 + 40 * random.random()
+            energy[i] += power * args.interval / 3600
+            readings += telemetry_store.ingest(device_id, ts, ((0, power), (1, energy[i])))
+        await telemetry_store._flush()  # как поток сброса раз в flush_interval: буфер не растёт на всю историю
+    elapsed = time.perf_counter() - started
+    return devices, readings, elapsed
+
+
+async def run(args):
+    now = int(time.time())
+    await telemetry_store.start()
+    devices, readings, elapsed = await history(args, now)
+    for series in telemetry_store.series.values():
+        series.flush()
+    usage = subprocess.run(["du", "-sh", "--apparent-size", telemetry_settings.path], capture_output=True,
+                           text=True).stdout.split()[0]
+    allocated = subprocess.run(["du", "-sh", telemetry_settings.path], capture_output=True,
+                               text=True).stdout.split()[0]
+    print(f"history: {args.devices} devices x {args.days} days every {args.interval} s = {readings} readings "
+          f"in {elapsed:.1f} s -> {readings / elapsed:,.0f} readings/s direct; "
+          f"disk {allocated} allocated ({usage} apparent)")
+
+    frames = [(random.choice(devices), '{"telemetry": {"power": %.1f, "energy": %.2f}}'
+               % (random.uniform(0, 2000), random.uniform(0, 1e5))) for _ in range(args.frames)]
+    started = time.perf_counter()
+    for device_id, msg in frames:
+        telemetry_store.ingest_text(device_id, msg)
+    text_rate = len(frames) / (time.perf_counter() - started)
+    binary = [(device_id, encode_telemetry({"power": random.uniform(0, 2000), "energy": random.uniform(0, 1e5)}))
+              for device_id, _ in frames]
+    started = time.perf_counter()
+    for device_id, frame in binary:
+        telemetry_store.ingest_frame(device_id, frame)
+    binary_rate = len(binary) / (time.perf_counter() - started)
+    await telemetry_store._flush()
+    print(f"live frames (2 readings each): text {text_rate:,.0f} frames/s, binary {binary_rate:,.0f} frames/s")
+
+    DB["users"][USER] = {"id": USER, "name": "bench"}
+    for device_id in devices:
+        add_device({"id": device_id, "owner_id": USER, "name": device_id, "kind": "relay",
+                    "capabilities": ["on_off"], "state": {"on": False}})
+    headers = {"Authorization": f"Bearer {token_service.issue_pair(USER, 'my-smart-home')['access_token']}"}
+    ranges = [("1 day", DAY, "1m"), ("30 days", 30 * DAY, "1h"), ("90 days", 90 * DAY, "1h"),
+              ("90 days", 90 * DAY, "1d")]
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for label, span, step in ranges:
+            direct, http, points = [], [], 0
+            for _ in range(args.queries):
+                device_id = random.choice(devices)
+                started = time.perf_counter()
+                points += len(await telemetry_store.query(device_id, "power", now - span, now, step))
+                direct.append((time.perf_counter() - started) * 1000)
+                started = time.perf_counter()
+                response = await client.get(f"/v1.0/user/devices/{device_id}/telemetry", headers=headers,
+                                            params={"metric": "power", "from": now - span, "to": now, "step": step})
+                http.append((time.perf_counter() - started) * 1000)
+                assert response.status_code == 200, response.text
+            print(f"query {label:>7} step {step}: {points / args.queries:6.0f} points | direct {percentiles(direct)}"
+                  f" | HTTP {percentiles(http)}")
+    await telemetry_store.close()
+    if OWN_PATH:
+        shutil.rmtree(telemetry_settings.path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--interval", type=int, default=900)
+    parser.add_argument("--frames", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Пропускная способность TokenService: выдача пар токенов, проверка
+(попадания и промахи) и уборка просроченных записей. Для уборки часы
+сервиса переводятся вперёд на срок жизни refresh-токена; заодно меряем
+самую долгую паузу event loop, пока работает фоновая уборка.
+
+Запуск из корня проекта:
+    python -m benchmarks.token_service --pairs 1000000 --checks 200000
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+os.environ.setdefault("STORAGE_PATH", ":memory:")
+
+from app import tokens
+from app.tokens import TokenService
+from config import access_tokens, refresh_tokens, auth_codes, storage, REFRESH_TTL
+
+
+def rate(n: int, seconds: float) -> str:
+    return f"{n / seconds:10.0f}/s ({seconds:.2f} s)"
+
+
+async def sweep_with_probe(service: TokenService) -> tuple[int, float, float]:
+    """Фоновая уборка, пока зонд меряет лаг цикла; возвращает (удалено, время, худший лаг в мс)."""
+    worst = 0.0
+    started = time.perf_counter()
+    await service.start()
+    print(f"startup scan   {rate(len(service), time.perf_counter() - started)}")
+    started = time.perf_counter()
+    while len(service):
+        t = time.perf_counter()
+        await asyncio.sleep(0.001)
+        worst = max(worst, (time.perf_counter() - t - 0.001) * 1000)
+    elapsed = time.perf_counter() - started
+    await service.close()
+    return service.swept, elapsed, worst
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pairs", type=int, default=1_000_000)
+    parser.add_argument("--checks", type=int, default=200_000)
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+
+    service = TokenService({"access": access_tokens, "refresh": refresh_tokens, "code": auth_codes},
+                           sweep_interval=0, sweep_batch=args.batch)
+
+    started = time.perf_counter()
+    issued = [service.issue_pair(f"user-{i % 10_000}", "my-smart-home")["access_token"]
+              for i in range(args.pairs)]
+    print(f"issue pair     {rate(args.pairs, time.perf_counter() - started)}")
+    storage.flush()
+
+    sample = random.sample(issued, min(args.checks, len(issued)))
+    started = time.perf_counter()
+    assert all(service.user_id(t) for t in sample)
+    print(f"validate hit   {rate(len(sample), time.perf_counter() - started)}")
+    started = time.perf_counter()
+    assert not any(service.user_id(f"bogus-{i}") for i in range(len(sample)))
+    print(f"validate miss  {rate(len(sample), time.perf_counter() - started)}")
+
+    # Все выданные записи просрочены; start() заново читает их из хранилища, как после перезапуска
+    real_now = tokens.now
+    tokens.now = lambda: real_now() + REFRESH_TTL + 1
+    service._buckets.clear()
+    service._due.clear()
+    swept, elapsed, worst = asyncio.run(sweep_with_probe(service))
+    storage.flush()
+    print(f"sweep          {rate(swept, elapsed)}  worst loop stall {worst:.1f} ms (batch {args.batch})")
+    print(f"left in storage: {len(access_tokens) + len(refresh_tokens)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Нагрузочный тест реестра устройств: N симулированных розеток подключаются
+через Starlette TestClient, затем один запрос Алисы /v1.0/user/devices/action
+переключает их все. Розетки подтверждают команды ack-ом, меряем время до
+подтверждения команды на каждом устройстве.
+
+Запуск из корня проекта:
+    python -m benchmarks.ws_dispatch_load --devices 5000
+"""
+import argparse
+import json
+import os
+import statistics
+import threading
+import time
+
+os.environ.setdefault("STORAGE_PATH", ":memory:")
+# Все розетки TestClient приходят с одного адреса и подряд — допуск к рукопожатию здесь не меряем
+for name in ("MAX_HANDSHAKES", "HANDSHAKE_RATE", "IP_RATE", "IP_BURST"):
+    os.environ.setdefault(f"ADMISSION_{name}", "1000000")
+
+from starlette.testclient import TestClient
+
+from app.devices import add_device
+from app.main import app
+from app.tokens import token_service
+from app.ws.websocket_manager import device_ws_manager
+
+AUTH = {"Authorization": f"Bearer {token_service.issue_pair('user-1', 'my-smart-home')['access_token']}"}
+
+
+def seed_devices(count: int) -> list[str]:
+    ids = [f"bench-{i}" for i in range(count)]
+    for dev_id in ids:
+        add_device({
+            "id": dev_id,
+            "owner_id": "user-1",
+            "name": dev_id,
+            "kind": "relay",
+            "capabilities": ["on_off"],
+            "state": {"on": False},
+        })
+    return ids
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def ack_commands(sockets) -> None:
+    # Каждая розетка читает свои кадры до команды и подтверждает её
+    for ws in sockets:
+        while True:
+            frame = ws.receive_text()
+            if frame.startswith("{") and '"id"' in frame:
+                ws.send_json({"id": json.loads(frame)["id"], "status": "ok"})
+                break
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=5000)
+    args = parser.parse_args()
+
+    ids = seed_devices(args.devices)
+    dispatched: dict[str, float] = {}
+
+    original_command = device_ws_manager.send_command
+
+    async def timed_command(device_id, data, timeout):
+        ack = await original_command(device_id, data, timeout)
+        dispatched[device_id] = time.perf_counter()
+        return ack
+
+    device_ws_manager.send_command = timed_command
+
+    with TestClient(app) as client:
+        sockets = []
+        started = time.perf_counter()
+        for n, dev_id in enumerate(ids, 1):
+            ws = client.websocket_connect(f"/ws/{dev_id}/connect").__enter__()
+            ws.send_json({"auth_token": "abc123"})
+            sockets.append(ws)
+            if n % 500 == 0:
+                # Отвечаем на ping, чтобы сервер не счёл долгие подключения мёртвыми
+                for s in sockets:
+                    s.send_text("pong")
+        connect_time = time.perf_counter() - started
+        while len(device_ws_manager.active) < len(ids):
+            time.sleep(0.01)
+
+        body = {"payload": {"devices": [
+            {"id": dev_id, "capabilities": [{"type": "devices.capabilities.on_off", "state": {"value": True}}]}
+            for dev_id in ids
+        ]}}
+        dispatched.clear()
+        result = {}
+        request = threading.Thread(target=lambda: result.update(
+            response=client.post("/v1.0/user/devices/action", json=body, headers=AUTH)))
+        started = time.perf_counter()
+        request.start()
+        ack_commands(sockets)
+        request.join()
+        total = time.perf_counter() - started
+        response = result["response"]
+        statuses = [d["capabilities"][0]["state"]["action_result"]["status"] for d in response.json()["payload"]["devices"]]
+
+        latencies = [(t - started) * 1000 for t in dispatched.values()]
+        print(f"devices:            {len(ids)}")
+        print(f"connect total:      {connect_time:.2f} s")
+        print(f"action request:     {total * 1000:.1f} ms ({statuses.count('DONE')} DONE)")
+        print(f"acked per device (mean):  {statistics.mean(latencies):.2f} ms")
+        print(f"acked per device p50/p99: {percentile(latencies, 0.5):.2f} / {percentile(latencies, 0.99):.2f} ms")
+
+        for ws in sockets:
+            ws.__exit__(None, None, None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Микробенчмарк маппинга в формат Алисы: прежний путь (сборка dict на каждый
+запрос + jsonable_encoder + JSONResponse) против кэшированных JSON-фрагментов
+app/yandex_format.py.
+
+Запуск из корня проекта:
+    python -m benchmarks.yandex_format
+"""
+import timeit
+from typing import Any, Dict, List
+
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse
+
+from app.yandex_format import discovery_body, query_body, map_caps_to_y_caps, to_yandex_device, state_bytes
+
+
+# --- Прежние реализации из app/main.py ---
+def legacy_kind(kind: str) -> str:
+    return "devices.types.light" if kind == "relay" else "devices.types.other"
+
+
+def legacy_caps(caps: List[str]) -> List[Dict[str, Any]]:
+    return [{"type": "devices.capabilities.on_off"} for c in caps if c == "on_off"]
+
+
+def legacy_device(device: Dict[str, Any]) -> Dict[str, Any]:
+    return {"id": device["id"], "name": device["name"], "type": legacy_kind(device["kind"]),
+            "capabilities": legacy_caps(device["capabilities"])}
+
+
+def legacy_state(device: Dict[str, Any]) -> Dict[str, Any]:
+    caps = []
+    if "on_off" in device["capabilities"]:
+        caps.append({"type": "devices.capabilities.on_off",
+                     "state": {"instance": "on", "value": bool(device["state"].get("on", False))}})
+    return {"id": device["id"], "capabilities": caps}
+
+
+def legacy_discovery(devices):
+    content = {"request_id": "r", "payload": {"user_id": "u", "devices": [legacy_device(d) for d in devices]},
+               "user_id": "u"}
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def legacy_query(devices):
+    content = {"request_id": "r", "payload": {"devices": [legacy_state(d) for d in devices]}}
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def household(size: int) -> List[Dict[str, Any]]:
+    return [{"id": f"socket-{i}", "owner_id": "u", "name": f"Розетка {i}", "kind": "relay",
+             "capabilities": ["on_off"], "state": {"on": i % 2 == 0}} for i in range(size)]
+
+
+def bench(name: str, fn, number: int):
+    per_call = min(timeit.repeat(fn, number=number, repeat=5)) / number
+    print(f"  {name:<22} {per_call * 1e6:10.1f} us")
+    return per_call
+
+
+def main():
+    single = household(1)[0]
+    print("single device")
+    bench("legacy map_caps", lambda: legacy_caps(single["capabilities"]), 100_000)
+    bench("cached map_caps", lambda: map_caps_to_y_caps(single["capabilities"]), 100_000)
+    bench("legacy to_yandex_device", lambda: legacy_device(single), 100_000)
+    bench("cached to_yandex_device", lambda: to_yandex_device(single), 100_000)
+    bench("legacy state + encode", lambda: JSONResponse(jsonable_encoder(legacy_state(single))).body, 20_000)
+    bench("state_bytes", lambda: state_bytes(single), 100_000)
+
+    for size in (10, 100, 1000):
+        devices = household(size)
+        number = max(10, 20_000 // size)
+        print(f"household of {size}")
+        old = bench("legacy discovery", lambda: legacy_discovery(devices), number)
+        new = bench("discovery_body", lambda: discovery_body("r", "u", devices), number)
+        print(f"  {'speedup':<22} {old / new:10.1f}x")
+        old = bench("legacy query", lambda: legacy_query(devices), number)
+        new = bench("query_body", lambda: query_body("r", devices), number)
+        print(f"  {'speedup':<22} {old / new:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,39 +2,203 @@ import time
 
 from fastapi import HTTPException
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from pyee.asyncio import AsyncIOEventEmitter
 from starlette.requests import Request
 
-event_bus = AsyncIOEventEmitter()
+from app.event_bus import EventBus
+from app.storage.sqlite_store import SQLiteStore
+from app.storage.write_behind import WriteBehindStore
+
+event_bus = EventBus(default_workers=1, default_queue_size=1000)
+# События, которые идут потоком от всех устройств сразу, разбираем несколькими воркерами
+event_bus.configure('device_ws_connected', workers=8, queue_size=10_000)
+event_bus.configure('message_from_device', workers=8, queue_size=10_000)
+event_bus.configure('device_ws_disconnected', workers=1, queue_size=10_000)
+event_bus.configure('device_command_replayed', workers=8, queue_size=10_000)
 
 CLIENT_ID = "my-smart-home"
 CLIENT_SECRET = "supersecret123"
 ACCESS_TTL = 3600  # 1 час
 REFRESH_TTL = 30 * 24 * 3600  # 30 дней
+AUTH_CODE_TTL = 600  # 10 минут
+TOKEN_SWEEP_INTERVAL = 1.0  # сек между проходами уборки просроченных токенов
+TOKEN_SWEEP_BATCH = 1000  # записей за один шаг уборки, дальше цикл получает управление
+COMMAND_TIMEOUT = 2.5  # сек на подтверждение команды устройством (Алиса ждёт ~3 с)
+MAX_COMMANDS_IN_FLIGHT = 16  # неподтверждённых команд на одно устройство
+OFFLINE_COMMAND_TTL = 600  # сек, сколько команда ждёт переподключения устройства
+OFFLINE_QUEUE_MAX_DEVICES = 100_000  # устройств с отложенными командами; сверх — вытесняем старые
+OUTBOUND_HIGH_WATER = 256  # кадров в очереди на отправку одному устройству; сверх — отключаем его
+ACTION_CONCURRENCY = 64  # устройств, которым одновременно идут команды одного action
+HEARTBEAT_INTERVAL = 5  # сек между ping одному устройству
+PONG_TIMEOUT = 10  # сек без pong — соединение считаем мёртвым
+
+
+# Настройка хранилища
+
+class StorageSettings(BaseSettings):
+    path: str = "data/smart_home.db"  # ":memory:" — без сохранения на диск
+    cache_size: int = 10_000  # 0 — кэш выключен, каждое чтение идёт в SQLite
+    cache_ttl: float = 30  # сек; через столько воркер перечитывает чужие изменения
+    absent_size: int = 10_000  # промахов (несуществующих ключей) в кэше, с тем же cache_ttl
+    flush_interval: float = 0.5  # сек между сбросами буфера; 0 — запись сразу
+    flush_batch: int = 500  # сбрасываем раньше, если накопилось столько записей
+    busy_timeout: float = 5  # сек, сколько сброс буфера ждёт блокировку записи соседнего воркера
+    read_timeout: float = 0.1  # сек, то же для чтения промаха (идёт в event loop, поэтому коротко)
+    model_config = SettingsConfigDict(
+        env_prefix="storage_",
+        env_file="../.env",
+        env_file_encoding="utf-8",
+        extra='ignore'
+    )
+
 
-# --- Память «для демо» (в проде замени на БД) ---
-auth_codes = {}  # code -> {user_id, client_id, exp, redirect_uri}
-access_tokens = {}  # access_token -> {user_id, client_id, exp, refresh_token}
-refresh_tokens = {}  # refresh_token -> {user_id, client_id, exp}
-device_state = {}  # user_id -> {"relay_1": {"on": bool}}
+storage_settings = StorageSettings()
+storage = WriteBehindStore(
+    SQLiteStore(storage_settings.path, storage_settings.busy_timeout, storage_settings.read_timeout),
+    cache_size=storage_settings.cache_size,
+    cache_ttl=storage_settings.cache_ttl,
+    flush_interval=storage_settings.flush_interval,
+    flush_batch=storage_settings.flush_batch,
+    absent_size=storage_settings.absent_size,
+)
 
-# ====== ВНУТРЕННЕЕ "ЯДРО" (мок) ======
-# Один пользователь и одно устройство-реле
+# --- Состояние хранится в SQLite, горячие ключи — в LRU-кэше процесса ---
+auth_codes = storage.mapping("auth_codes")  # code -> {user_id, client_id, exp, redirect_uri}
+access_tokens = storage.mapping("access_tokens")  # access_token -> {user_id, client_id, exp, refresh_token}
+refresh_tokens = storage.mapping("refresh_tokens")  # refresh_token -> {user_id, client_id, exp}
+device_secrets = storage.mapping("device_secrets")  # device_id -> {salt, hash, iterations}, см. app/ws/credentials.py
+pending_commands = storage.mapping("pending_commands")  # device_id -> {ключ умения: {frame, exp}}
+device_state = storage.mapping("device_state")  # user_id -> {"relay_1": {"on": bool}}
+
+# ====== ВНУТРЕННЕЕ "ЯДРО" ======
 DB = {
-    "users": {"user-1": {"id": "user-1", "name": "Demo User"}},
-    "devices": {
-        "socket-1": {
-            "id": "socket-1",
-            "owner_id": "user-1",
-            "name": "Розетка",
-            "kind": "relay",  # твой внутренний тип
-            "capabilities": ["on_off"],  # твой внутренний список
-            "state": {"on": False},  # текущее состояние
-        }
-    },
-    "tokens": {"alice-demo": "user-1"},  # маппинг токена Алисы -> user_id
+    "users": storage.mapping("users"),
+    "devices": storage.mapping("devices"),
+    "owner_devices": storage.mapping("owner_devices"),  # индекс user_id -> [device_id], см. app/devices.py
+    "groups": storage.mapping("groups"),  # "owner_id:group_id" -> {id, owner_id, name, devices: [device_id]}, см. app/groups.py
+    "owner_groups": storage.mapping("owner_groups"),  # индекс user_id -> [ключ группы]
 }
 
+# Демо-данные: один пользователь и одно устройство-реле (создаются при первом запуске)
+DB["users"].setdefault("user-1", {"id": "user-1", "name": "Demo User"})
+DB["devices"].setdefault("socket-1", {
+    "id": "socket-1",
+    "owner_id": "user-1",
+    "name": "Розетка",
+    "kind": "relay",  # твой внутренний тип
+    "capabilities": ["on_off"],  # твой внутренний список
+    "state": {"on": False},  # текущее состояние
+})
+DB["owner_devices"].setdefault("user-1", ["socket-1"])
+
+
+# Настройка маршрутизации между воркерами
+
+class BrokerSettings(BaseSettings):
+    backend: str = "local"  # "local" — один воркер; "unix" — несколько воркеров на одной машине
+    worker_id: str = ""  # пусто — hostname-pid
+    socket_dir: str = "/tmp/smart-home-broker"
+    presence_path: str = "data/presence.db"
+    model_config = SettingsConfigDict(
+        env_prefix="broker_",
+        env_file="../.env",
+        env_file_encoding="utf-8",
+        extra='ignore'
+    )
+
+
+broker_settings = BrokerSettings()
+
+
+# Настройка допуска устройств к рукопожатию WebSocket
+
+class AdmissionSettings(BaseSettings):
+    max_handshakes: int = 256  # одновременных рукопожатий (accept .. авторизация)
+    handshake_rate: float = 200.0  # новых рукопожатий в секунду на воркер; сверх — запись на время
+    auth_timeout: float = 5.0  # сек на первое сообщение с auth_token
+    ip_rate: float = 50.0  # попыток в секунду с одного IP (за NAT бывает много устройств)
+    ip_burst: float = 200.0
+    device_rate: float = 0.2  # попыток в секунду для одного устройства
+    device_burst: float = 3.0
+    retry_jitter: float = 1.0  # к retry_after добавляется случайное до retry_jitter сек
+    max_tracked_keys: int = 100_000  # корзин на IP и на устройства
+    model_config = SettingsConfigDict(
+        env_prefix="admission_",
+        env_file="../.env",
+        env_file_encoding="utf-8",
+        extra='ignore'
+    )
+
+
+admission_settings = AdmissionSettings()
+
+
+# Настройка проверки секретов устройств
+
+class CredentialSettings(BaseSettings):
+    # Секреты выдаёт сервер (32 случайных байта), так что растяжка — защита при утечке базы,
+    # а не от перебора; цена одной проверки ~6 мс CPU при 10k итераций
+    iterations: int = 10_000  # PBKDF2-SHA256; записи со старым числом перехешируются при входе
+    cache_ttl: float = 300  # сек, сколько помним успешную проверку устройства
+    cache_size: int = 100_000
+    workers: int = 2  # потоков для хеширования
+    # Общий токен прошивок без своего секрета; "" — только свои секреты. Оставлен включённым, чтобы
+    # обновление сервера не отключило уже установленные устройства; порядок перехода — в app/ws/credentials.py
+    legacy_token: str = "abc123"
+    model_config = SettingsConfigDict(
+        env_prefix="device_auth_",
+        env_file="../.env",
+        env_file_encoding="utf-8",
+        extra='ignore'
+    )
+
+
+credential_settings = CredentialSettings()
+
+
+# Настройка пуша состояний в Алису (callback/state)
+
+class NotificationSettings(BaseSettings):
+    enabled: bool = False  # нужен id навыка и OAuth-токен из кабинета разработчика
+    skill_id: str = ""
+    oauth_token: str = ""
+    callback_base: str = "https://dialogs.yandex.net"
+    window: float = 0.3  # сек, за которые изменения одного пользователя склеиваются
+    max_connections: int = 20
+    timeout: float = 5.0
+    max_retries: int = 3
+    backoff: float = 0.5  # сек, удваивается с каждой попыткой
+    max_tracked: int = 100_000  # устройств, чьё последнее отправленное состояние помним
+    model_config = SettingsConfigDict(
+        env_prefix="notify_",
+        env_file="../.env",
+        env_file_encoding="utf-8",
+        extra='ignore'
+    )
+
+
+notification_settings = NotificationSettings()
+
+
+# Настройка приёма телеметрии (app/telemetry.py)
+
+class TelemetrySettings(BaseSettings):
+    path: str = "data/telemetry"  # общий каталог; каждый воркер пишет в свой подкаталог w<N>, запросы читают все
+    flush_interval: float = 1.0  # сек между сбросами сырых показаний на диск
+    raw_retention_days: int = 7  # сырые показания и минутные агрегаты; часовые и суточные хранятся всегда
+    max_clock_skew: int = 300  # сек: показания из будущего дальше этого отбрасываются
+    max_age_days: int = 400  # досланные показания старше этого отбрасываются
+    max_points: int = 5000  # точек в ответе на запрос диапазона
+    open_partitions: int = 32  # открытых (отображённых в память) файлов агрегатов
+    model_config = SettingsConfigDict(
+        env_prefix="telemetry_",
+        env_file="../.env",
+        env_file_encoding="utf-8",
+        extra='ignore'
+    )
+
+
+telemetry_settings = TelemetrySettings()
+
 
 def now() -> int: return int(time.time())
 
@@ -46,14 +210,8 @@ def require_bearer(request: Request) -> str:
     return auth.split(" ", 1)[1].strip()
 
 
-def user_by_token(token: str) -> str:
-    t = access_tokens.get(token)
-    if not t or t["exp"] < now():
-        raise HTTPException(status_code=401, detail="Token expired or invalid")
-    return t["user_id"]
-
-
 def ensure_user_initialized(user_id: str):
+    DB["users"].setdefault(user_id, {"id": user_id, "name": user_id})
     device_state.setdefault(user_id, {"relay_1": {"on": False}})
 
 
@@ -63,6 +221,9 @@ class LoggingSettings(BaseSettings):
     telegram_enabled: bool = True
     telegram_log_bot_token: str = ""
     telegram_chat_id: str = ""
+    telegram_queue_size: int = 1000  # сверх этого записи отбрасываются
+    telegram_batch_interval: float = 2.0  # сек, за которые записи склеиваются в одно сообщение
+    telegram_max_per_minute: int = 20  # лимит Telegram для чатов/групп
     level: str = "INFO"
     log_to_console: bool = True
     log_to_file: bool = False
@@ -71,8 +232,37 @@ class LoggingSettings(BaseSettings):
     backup_count: int = 3
     formatter: str = "[%(asctime)s] [server] [%(levelname)s] %(message)s (%(filename)s:%(lineno)d)"
     telegram_formatter: str = "[%(levelname)s] [server] %(message)s (%(filename)s:%(lineno)d)"
+    log_format: str = "json"  # json — запись одной JSON-строкой, text — по formatter
+    log_queue_size: int = 10000  # записей в очереди к потоку вывода; сверх этого отбрасываются
+    debug_sample_every: int = 100  # из DEBUG-записей одного места в коде выводится каждая N-я (1 — все)
+    capture_uvicorn: bool = True  # логи uvicorn (в т.ч. access) — через ту же очередь и формат
     model_config = SettingsConfigDict(
         env_file="../.env",  # путь до вашего .env
         env_file_encoding="utf-8",  # кодировка .env
         extra='ignore'
     )
+
+
+logging_settings = LoggingSettings()
+
+
+# Настройка сторожа event loop (app/loop_monitor.py)
+
+class LoopMonitorSettings(BaseSettings):
+    enabled: bool = False
+    interval: float = 0.1  # сек между замерами задержки цикла
+    stall_threshold: float = 0.1  # сек: дольше этого цикл считается зависшим, стек пишется в лог
+    sample_interval: float = 0.01  # сек между снимками стека во время зависания и профилирования
+    stall_log_per_minute: int = 10  # сверх этого зависания только считаются, без стека в логе
+    keep_stalls: int = 50  # последних зависаний в /admin/loop
+    profile_max_seconds: float = 60
+    admin_token: str = ""  # Bearer для /admin/loop*; пусто — эндпоинты выключены
+    model_config = SettingsConfigDict(
+        env_prefix="loop_monitor_",
+        env_file="../.env",
+        env_file_encoding="utf-8",
+        extra='ignore'
+    )
+
+
+loop_monitor_settings = LoopMonitorSettings()
@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# Хранилище в памяти и временная телеметрия — до первого импорта config
+os.environ.setdefault("STORAGE_PATH", ":memory:")
+os.environ.setdefault("TELEMETRY_PATH", tempfile.mkdtemp(prefix="telemetry-tests-"))
+os.environ.setdefault("TELEGRAM_ENABLED", "false")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
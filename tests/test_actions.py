@@ -0,0 +1,58 @@
+from app.actions import ON_OFF, ActionPlan
+from app.devices import add_device
+from app.ws.offline_queue import offline_queue
+from config import DB
+
+OWNER = "plan-user"
+
+
+def cap(value, ctype: str = ON_OFF) -> dict:
+    return {"type": ctype, "state": {"instance": "on", "value": value}}
+
+
+def relay(device_id: str):
+    add_device({"id": device_id, "owner_id": OWNER, "name": device_id, "kind": "relay",
+                "capabilities": ["on_off"], "state": {"on": False}})
+
+
+def test_repeated_devices_and_capabilities_collapse_to_one_command():
+    plan = ActionPlan.build([
+        {"id": "a", "capabilities": [cap(True), cap(False)]},
+        {"id": "b", "capabilities": [cap(True)]},
+        {"id": "a", "capabilities": [cap(True)]},
+        {"id": "stranger", "capabilities": [cap(True)]},
+        {"id": "b", "capabilities": [cap(True, "devices.capabilities.range")]},
+    ], owned={"a", "b"})
+    assert plan.collapsed == 2
+    assert list(plan.devices) == ["a", "b", "stranger"]
+    # Чужое устройство команды не получает; победило последнее значение умения
+    assert plan.frames() == {"a": {"action": "turn_on"}, "b": {"action": "turn_on"}}
+
+
+def test_results_follow_acks_and_store_confirmed_state():
+    for device_id in ("plan-ok", "plan-offline", "plan-busy"):
+        relay(device_id)
+    plan = ActionPlan.build([
+        {"id": "plan-ok", "capabilities": [cap(True), cap(True, "devices.capabilities.range")]},
+        {"id": "plan-offline", "capabilities": [cap(True)]},
+        {"id": "plan-busy", "capabilities": [cap(True)]},
+        {"id": "plan-foreign", "capabilities": [cap(True)]},
+    ], owned={"plan-ok", "plan-offline", "plan-busy"})
+
+    results = plan.results({"plan-ok": None, "plan-offline": "DEVICE_UNREACHABLE", "plan-busy": "DEVICE_BUSY"})
+    by_id = {r["id"]: r for r in results}
+
+    assert [r["id"] for r in results] == ["plan-ok", "plan-offline", "plan-busy", "plan-foreign"]
+    ok = {c["type"]: c["state"]["action_result"] for c in by_id["plan-ok"]["capabilities"]}
+    assert ok == {ON_OFF: {"status": "DONE"},
+                  "devices.capabilities.range": {"status": "ERROR", "error_code": "NOT_SUPPORTED"}}
+    assert by_id["plan-offline"]["capabilities"][0]["state"]["action_result"] == \
+        {"status": "ERROR", "error_code": "DEVICE_UNREACHABLE"}
+    assert by_id["plan-busy"]["capabilities"][0]["state"]["action_result"]["error_code"] == "DEVICE_BUSY"
+    assert by_id["plan-foreign"] == {"id": "plan-foreign", "error_code": "DEVICE_NOT_FOUND"}
+
+    # В ядро попадает только подтверждённое; недоступному команда ждёт в очереди, занятому — нет
+    assert DB["devices"]["plan-ok"]["state"]["on"] is True
+    assert DB["devices"]["plan-offline"]["state"]["on"] is False
+    assert [entry["frame"] for _, entry in offline_queue.take("plan-offline")] == [{"action": "turn_on"}]
+    assert offline_queue.take("plan-busy") == []
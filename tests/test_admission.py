@@ -0,0 +1,73 @@
+import pytest
+
+from app.ws.admission import HandshakeAdmission, TokenBuckets
+from config import AdmissionSettings
+
+
+def admission(**overrides) -> HandshakeAdmission:
+    settings = dict(max_handshakes=100, handshake_rate=1000.0, ip_rate=1.0, ip_burst=5.0,
+                    device_rate=0.2, device_burst=3.0, retry_jitter=0.0)
+    return HandshakeAdmission(AdmissionSettings(**{**settings, **overrides}))
+
+
+def test_device_attempts_are_rate_limited_with_retry_after():
+    gate = admission()
+    for _ in range(3):
+        assert gate.admit("10.0.0.1", "relay") is None
+        gate.release()
+    reason, retry_after = gate.admit("10.0.0.1", "relay")
+    assert reason == "device_rate"
+    assert retry_after == pytest.approx(1 / 0.2, rel=0.01)  # до следующего токена корзины устройства
+    assert gate.admit("10.0.0.1", "other-relay") is None
+
+
+def test_throttled_ip_does_not_drain_the_device_bucket():
+    gate = admission()
+    for n in range(5):
+        assert gate.admit("10.0.0.66", f"probe-{n}") is None
+        gate.release()
+    # Адрес исчерпал свою корзину и дальше подставляет id настоящей розетки
+    for _ in range(20):
+        assert gate.admit("10.0.0.66", "victim")[0] == "ip_rate"
+    assert gate.admit("192.168.1.10", "victim") is None
+
+
+def test_busy_retry_after_books_arrivals_at_the_handshake_rate():
+    gate = admission(max_handshakes=2, handshake_rate=10.0)
+    assert gate.admit("10.0.0.1", "a") is None
+    assert gate.admit("10.0.0.2", "b") is None
+    waits = [gate.admit(f"10.0.1.{n}", f"c{n}") for n in range(3)]
+    assert [reason for reason, _ in waits] == ["busy"] * 3
+    # Каждый следующий отказ записывается на 1 / handshake_rate позже предыдущего
+    assert waits[1][1] - waits[0][1] == pytest.approx(0.1, abs=0.01)
+    assert waits[2][1] - waits[1][1] == pytest.approx(0.1, abs=0.01)
+    gate.release()
+    gate.release()
+
+
+def test_failed_auth_penalizes_the_device_and_ip():
+    gate = admission()
+    assert gate.admit("10.0.0.1", "relay") is None
+    gate.release()
+    gate.auth_failed("10.0.0.1", "relay")
+    reason, retry_after = gate.admit("10.0.0.1", "relay")
+    assert reason == "device_rate"
+    # 2 оставшихся токена минус штраф 3: до токена нужно добрать 2 — 10 с при 0.2/с
+    assert retry_after == pytest.approx(2 / 0.2, rel=0.01)
+
+
+def test_prune_keeps_penalized_and_draining_buckets():
+    buckets = TokenBuckets(rate=1.0, burst=2.0, max_keys=2)
+    assert buckets.take("spender") == 0
+    assert buckets.take("penalized") == 0
+    buckets.penalize("penalized", 10)
+    # Выбросить нечего: новый ключ ждёт, штраф и расход остальных сохраняются
+    wait = buckets.take("newcomer")
+    assert 0 < wait <= 1.0
+    assert set(buckets.buckets) == {"spender", "penalized"}
+    assert buckets.take("penalized") > 9
+
+    buckets.buckets["spender"][1] -= 5  # корзина давно восстановилась
+    buckets._next_full = 0.0
+    assert buckets.take("newcomer") == 0
+    assert set(buckets.buckets) == {"penalized", "newcomer"}
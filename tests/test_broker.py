@@ -0,0 +1,89 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.broker.base import Broker
+from app.broker.presence import SQLitePresence
+from app.broker.unix_socket import UnixSocketBroker
+from app.ws.command_tracker import CommandError
+
+
+def test_broker_is_abstract():
+    with pytest.raises(TypeError):
+        Broker("w0")
+
+
+def test_presence_keeps_operation_order(tmp_path):
+    presence = SQLitePresence(str(tmp_path / "presence.db"))
+    for _ in range(100):
+        presence.delete("d1", "w1")  # disconnect старого сокета...
+        presence.set("d1", "w1")  # ...и сразу новое подключение к тому же воркеру
+    presence.delete("d2", "w2")
+    presence.flush()
+    assert presence.get("d1") == "w1"
+    assert presence.get("d2") is None
+    assert presence.batches < 100  # операции шторма легли пачками, а не по транзакции на каждую
+    presence.close()
+
+
+def test_writes_do_not_block_caller_while_database_is_locked(tmp_path):
+    path = str(tmp_path / "presence.db")
+    presence = SQLitePresence(path)
+    holder = SQLitePresence(path)
+    locked, release = threading.Event(), threading.Event()
+
+    def hold_lock():
+        with holder._lock:
+            holder._conn.execute("BEGIN IMMEDIATE")
+            locked.set()
+            release.wait()
+            holder._conn.execute("ROLLBACK")
+
+    thread = threading.Thread(target=hold_lock)
+    thread.start()
+    locked.wait()
+
+    async def register():
+        broker = UnixSocketBroker("w1", str(tmp_path / "sockets"), presence)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for i in range(100):
+            await broker.register(f"d{i}")
+        return loop.time() - started
+
+    assert asyncio.run(register()) < 0.1
+    release.set()
+    thread.join()
+    presence.flush()
+    assert presence.get("d99") == "w1"
+    presence.close()
+    holder.close()
+
+
+def test_command_is_routed_to_owner_worker(tmp_path):
+    async def run():
+        presence = SQLitePresence(str(tmp_path / "presence.db"))
+        owner = UnixSocketBroker("w1", str(tmp_path / "sockets"), presence)
+        caller = UnixSocketBroker("w2", str(tmp_path / "sockets"), presence)
+
+        async def ack(device_id, data, timeout):
+            return {"id": data["id"], "status": "ok", "device": device_id}
+
+        async def no_devices(device_id, data, timeout):
+            raise CommandError("DEVICE_UNREACHABLE")
+
+        await owner.start(ack)
+        await caller.start(no_devices)
+        await owner.register("d1")
+        await asyncio.to_thread(presence.flush)
+        assert await caller.route("d1", {"id": "7"}, 1) == {"id": "7", "status": "ok", "device": "d1"}
+        await owner.unregister("d1")
+        await asyncio.to_thread(presence.flush)
+        with pytest.raises(CommandError):
+            await caller.route("d1", {"id": "8"}, 1)
+        await caller.close()
+        await owner.close()
+        presence.close()
+
+    asyncio.run(run())
@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+from app.ws.command_tracker import ID_LIMIT, CommandError, CommandTracker, command_tracker
+from app.ws.framing import ACK, command_template, decode_ack, encode_command, encode_message
+from app.ws.websocket_manager import device_ws_manager
+from benchmarks.slow_consumers import HealthySocket
+
+
+class SilentSocket:
+    """Принимает команды, но никогда не отвечает ack."""
+
+    async def send_json(self, data):
+        pass
+
+    async def send_text(self, text):
+        pass
+
+    async def close(self):
+        pass
+
+
+def test_ack_resolves_the_command_with_the_same_id():
+    async def scenario():
+        tracker = CommandTracker()
+        first, first_future = tracker.open("dev")
+        second, second_future = tracker.open("dev")
+        assert first != second
+        assert tracker.resolve("dev", {"id": second, "status": "ok", "on": True})
+        assert not tracker.resolve("dev", {"id": "unknown"})
+        assert not tracker.resolve("other", {"id": first})
+        assert second_future.result() == {"id": second, "status": "ok", "on": True}
+        assert not first_future.done()
+
+        assert tracker.resolve("dev", {"id": first, "status": "error", "error_code": "INVALID_VALUE"})
+        with pytest.raises(CommandError) as error:
+            first_future.result()
+        assert error.value.error_code == "INVALID_VALUE"
+
+        tracker.discard("dev", first)
+        tracker.discard("dev", second)
+        assert tracker.in_flight("dev") == 0 and "dev" not in tracker.pending
+
+    asyncio.run(scenario())
+
+
+def test_in_flight_limit_per_device():
+    async def scenario():
+        tracker = CommandTracker(max_in_flight=2)
+        tracker.open("dev")
+        command_id, _ = tracker.open("dev")
+        with pytest.raises(CommandError) as error:
+            tracker.open("dev")
+        assert error.value.error_code == "DEVICE_BUSY"
+        tracker.open("other")  # лимит на устройство, а не общий
+        tracker.discard("dev", command_id)
+        tracker.open("dev")
+
+    asyncio.run(scenario())
+
+
+def test_lost_connection_fails_pending_commands():
+    async def scenario():
+        tracker = CommandTracker()
+        _, future = tracker.open("dev")
+        tracker.fail_device("dev")
+        with pytest.raises(CommandError) as error:
+            await future
+        assert error.value.error_code == "DEVICE_UNREACHABLE"
+        assert tracker.in_flight("dev") == 0
+
+    asyncio.run(scenario())
+
+
+def test_command_without_ack_times_out_and_is_released():
+    async def scenario():
+        await device_ws_manager.add("tracker-silent", SilentSocket())
+        await device_ws_manager.add("tracker-acking", HealthySocket("tracker-acking", rtt=0.01))
+        try:
+            with pytest.raises(CommandError) as error:
+                await device_ws_manager.send_local_command("tracker-silent", {"action": "turn_on"}, timeout=0.05)
+            assert error.value.error_code == "DEVICE_UNREACHABLE"
+            assert command_tracker.in_flight("tracker-silent") == 0
+            ack = await device_ws_manager.send_local_command("tracker-acking", {"action": "turn_on"}, timeout=1.0)
+            assert ack["status"] == "ok"
+        finally:
+            await device_ws_manager.remove("tracker-silent")
+            await device_ws_manager.remove("tracker-acking")
+
+    asyncio.run(scenario())
+
+
+def test_command_ids_wrap_within_u32_and_skip_zero():
+    async def scenario():
+        tracker = CommandTracker()
+        tracker._last_id = ID_LIMIT - 2
+        ids = [tracker.open("dev")[0] for _ in range(3)]
+        assert ids == [str(ID_LIMIT - 1), "1", "2"]
+        for command_id in ids:
+            frame = encode_message({"action": "turn_on", "id": command_id})
+            assert frame == encode_command("turn_on", int(command_id))
+            # Заранее собранный кадр рассылки групп (app/groups.py) кодирует id так же
+            _, head, tail = command_template("turn_on", binary=True)
+            assert head + int(command_id).to_bytes(4, "little") + tail == frame
+            ack = bytes([ACK]) + int(command_id).to_bytes(4, "little") + b"\x00"
+            assert decode_ack(ack) == (int(command_id), None)
+            assert tracker.resolve_id("dev", str(decode_ack(ack)[0]))
+
+        # Номер, ещё ждущий ack у этого устройства, после круга не выдаётся повторно
+        tracker._last_id = ID_LIMIT - 2
+        assert tracker.open("dev")[0] == "3"
+
+    asyncio.run(scenario())
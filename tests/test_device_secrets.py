@@ -0,0 +1,65 @@
+import pytest
+from fastapi import status
+from starlette.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.devices import add_device
+from app.main import app
+from app.tokens import token_service
+from config import DB, credential_settings
+
+DEVICE_ID = "provisioned-relay"
+
+
+@pytest.fixture
+def client():
+    for user_id in ("secret-owner", "secret-stranger"):
+        DB["users"][user_id] = {"id": user_id, "name": user_id}
+    add_device({"id": DEVICE_ID, "owner_id": "secret-owner", "name": DEVICE_ID, "kind": "relay",
+                "capabilities": ["on_off"], "state": {"on": False}})
+    return TestClient(app)
+
+
+def bearer(user_id: str) -> dict:
+    return {"Authorization": f"Bearer {token_service.issue_pair(user_id, 'my-smart-home')['access_token']}"}
+
+
+def connect(client: TestClient, auth_token: str) -> dict:
+    with client.websocket_connect(f"/ws/{DEVICE_ID}/connect") as ws:
+        ws.send_json({"auth_token": auth_token})
+        return ws.receive_json()
+
+
+def test_owner_provisions_a_secret_that_replaces_the_legacy_token(client):
+    assert connect(client, credential_settings.legacy_token) == {"message": "Вы подключились"}
+
+    response = client.post(f"/v1.0/user/devices/{DEVICE_ID}/secret", headers=bearer("secret-owner"))
+    assert response.status_code == 200
+    secret = response.json()["auth_token"]
+
+    assert connect(client, secret) == {"message": "Вы подключились"}
+    with client.websocket_connect(f"/ws/{DEVICE_ID}/connect") as ws:
+        ws.send_json({"auth_token": credential_settings.legacy_token})
+        assert ws.receive_json() == {"message": "Неверный auth_token"}
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_text()
+    assert closed.value.code == status.WS_1008_POLICY_VIOLATION
+
+
+def test_secret_is_issued_only_to_the_owner(client):
+    response = client.post(f"/v1.0/user/devices/{DEVICE_ID}/secret", headers=bearer("secret-stranger"))
+    assert response.status_code == 404
+
+
+def test_secrets_survive_an_app_restart(client):
+    device_id = "restarted-relay"
+    add_device({"id": device_id, "owner_id": "secret-owner", "name": device_id, "kind": "relay",
+                "capabilities": ["on_off"], "state": {"on": False}})
+    for _ in range(2):
+        # Второй lifespan в том же процессе: пул хеширования после close() должен подняться снова
+        with TestClient(app) as running:
+            response = running.post(f"/v1.0/user/devices/{device_id}/secret", headers=bearer("secret-owner"))
+            assert response.status_code == 200
+            with running.websocket_connect(f"/ws/{device_id}/connect") as ws:
+                ws.send_json({"auth_token": response.json()["auth_token"]})
+                assert ws.receive_json() == {"message": "Вы подключились"}
@@ -0,0 +1,132 @@
+import asyncio
+
+from app.event_bus import EventBus, handler_name
+from app.metrics import registry
+
+
+def test_handler_latency_and_errors_are_exported():
+    bus = EventBus()
+
+    async def slow(device_id):
+        await asyncio.sleep(0.01)
+
+    def broken(device_id):
+        raise ValueError(device_id)
+
+    bus.on("tests.changed", slow)
+    bus.on("tests.changed", broken)
+
+    async def run():
+        for i in range(3):
+            bus.emit("tests.changed", f"d{i}")
+        await asyncio.sleep(0.1)
+        await bus.close()
+
+    asyncio.run(run())
+    text = registry.render()
+    slow_name, broken_name = handler_name(slow), handler_name(broken)
+    assert f'event_bus_handler_duration_seconds_count{{event="tests.changed",handler="{slow_name}"}} 3' in text
+    assert f'event_bus_handler_errors_total{{event="tests.changed",handler="{broken_name}"}} 3' in text
+    stats = bus.stats()["tests.changed"]["handlers"][slow_name]
+    assert stats["calls"] == 3 and stats["avg_ms"] >= 10
+
+
+def test_single_worker_keeps_fifo_order():
+    bus = EventBus(default_workers=1)
+    seen = []
+
+    async def handler(n):
+        # Разные задержки: при параллельной обработке порядок бы перемешался
+        await asyncio.sleep(0.001 * (n % 3))
+        seen.append(n)
+
+    bus.on("tests.fifo", handler)
+
+    async def run():
+        for n in range(30):
+            assert bus.emit("tests.fifo", n)
+        await asyncio.sleep(0.2)
+        await bus.close()
+
+    asyncio.run(run())
+    assert seen == list(range(30))
+
+
+def test_events_of_one_key_stay_ordered_across_workers():
+    bus = EventBus()
+    bus.configure("tests.keyed", workers=4)
+    seen: dict[str, list[int]] = {}
+
+    async def handler(device_id, n):
+        await asyncio.sleep(0.001 * (n % 2))
+        seen.setdefault(device_id, []).append(n)
+
+    bus.on("tests.keyed", handler)
+
+    async def run():
+        for n in range(20):
+            for device_id in ("a", "b", "c"):
+                bus.emit("tests.keyed", device_id, n)
+        await asyncio.sleep(0.3)
+        await bus.close()
+
+    asyncio.run(run())
+    assert seen == {d: list(range(20)) for d in ("a", "b", "c")}
+
+
+def test_full_queue_drops_and_counts():
+    bus = EventBus(default_workers=1, default_queue_size=5)
+    handled = []
+    bus.on("tests.full", handled.append)
+
+    async def run():
+        # Воркер не получает управления, пока идут emit: в очередь влезает только queue_size событий
+        accepted = [bus.emit("tests.full", n) for n in range(8)]
+        await asyncio.sleep(0.05)
+        await bus.close()
+        return accepted
+
+    accepted = asyncio.run(run())
+    assert accepted == [True] * 5 + [False] * 3
+    assert bus.dropped() == {"tests.full": 3}
+    assert handled == [0, 1, 2, 3, 4]
+
+
+def test_publish_waits_for_room_instead_of_dropping():
+    bus = EventBus(default_workers=1, default_queue_size=2)
+    handled = []
+    bus.on("tests.backpressure", handled.append)
+
+    async def run():
+        for n in range(10):
+            assert await bus.publish("tests.backpressure", n)
+        await asyncio.sleep(0.05)
+        await bus.close()
+
+    asyncio.run(run())
+    assert handled == list(range(10))
+    assert bus.dropped() == {"tests.backpressure": 0}
+
+
+def test_failing_handler_does_not_stop_the_others():
+    bus = EventBus()
+    handled = []
+
+    def broken(n):
+        if n % 2:
+            raise RuntimeError(n)
+
+    bus.on("tests.isolated", broken)
+    bus.on("tests.isolated", handled.append)
+
+    async def run():
+        for n in range(4):
+            bus.emit("tests.isolated", n)
+        await asyncio.sleep(0.05)
+        await bus.close()
+
+    asyncio.run(run())
+    assert handled == [0, 1, 2, 3]
+    assert bus.stats()["tests.isolated"]["processed"] == 4
+    assert f'event_bus_handler_errors_total{{event="tests.isolated",handler="{handler_name(broken)}"}} 2' \
+        in registry.render()
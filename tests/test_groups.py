@@ -0,0 +1,157 @@
+import asyncio
+
+import httpx
+
+from app.devices import add_device, remove_device, transfer_device
+from app.groups import group_engine, group_key, save_group
+from app.main import app
+from app.tokens import token_service
+from app.ws.framing import BinaryDeviceSocket
+from app.ws.websocket_manager import device_ws_manager
+from benchmarks.scene_groups import AckingSocket
+from config import DB
+
+
+class SilentSocket:
+    """Розетка на связи, но на команды не отвечает."""
+
+    async def send_text(self, text):
+        pass
+
+    async def send_json(self, data):
+        pass
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+def relay(owner_id: str, device_id: str):
+    DB["users"][owner_id] = {"id": owner_id, "name": owner_id}
+    add_device({"id": device_id, "owner_id": owner_id, "name": device_id, "kind": "relay",
+                "capabilities": ["on_off"], "state": {"on": True}})
+
+
+def bearer(user_id: str) -> dict:
+    return {"Authorization": f"Bearer {token_service.issue_pair(user_id, 'my-smart-home')['access_token']}"}
+
+
+def client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+def outcome(devices: list[dict]) -> dict[str, str]:
+    """device_id -> DONE или код ошибки (у чужих и удалённых устройств он на уровне устройства)."""
+    result = {}
+    for d in devices:
+        if "error_code" in d:
+            result[d["id"]] = d["error_code"]
+        else:
+            action_result = d["capabilities"][0]["state"]["action_result"]
+            result[d["id"]] = action_result.get("error_code") or action_result["status"]
+    return result
+
+
+def test_same_group_id_is_separate_per_owner():
+    relay("groups-alice", "alice-lamp")
+    relay("groups-bob", "bob-lamp")
+
+    async def scenario():
+        async with client() as c:
+            put = [await c.put("/v1.0/user/groups/all-off", json={"name": "Всё", "devices": [device_id]},
+                               headers=bearer(user_id))
+                   for user_id, device_id in (("groups-alice", "alice-lamp"), ("groups-bob", "bob-lamp"))]
+            # Чужое устройство в свою группу не добавить
+            foreign = await c.put("/v1.0/user/groups/mine", json={"devices": ["alice-lamp"]},
+                                  headers=bearer("groups-bob"))
+            action = await c.post("/v1.0/user/groups/all-off/action", json={"on": False},
+                                  headers=bearer("groups-bob"))
+            deleted = await c.delete("/v1.0/user/groups/all-off", headers=bearer("groups-bob"))
+            missing = await c.delete("/v1.0/user/groups/all-off", headers=bearer("groups-bob"))
+            listed = {user_id: (await c.get("/v1.0/user/groups", headers=bearer(user_id))).json()["payload"]["groups"]
+                      for user_id in ("groups-alice", "groups-bob")}
+            return put, foreign, action, deleted, missing, listed
+
+    put, foreign, action, deleted, missing, listed = asyncio.run(scenario())
+    assert [r.status_code for r in put] == [200, 200]
+    assert foreign.status_code == 400
+    assert action.status_code == 200 and list(outcome(action.json()["payload"]["devices"])) == ["bob-lamp"]
+    assert deleted.status_code == 200 and missing.status_code == 404
+    assert [(g["id"], g["devices"]) for g in listed["groups-alice"]] == [("all-off", ["alice-lamp"])]
+    assert listed["groups-bob"] == []
+    assert DB["devices"]["alice-lamp"]["state"]["on"] is True
+
+
+def test_action_requires_boolean_on():
+    relay("groups-strict", "strict-lamp")
+    save_group("groups-strict", "strict", "Строгая", ["strict-lamp"])
+
+    async def scenario():
+        async with client() as c:
+            return [(await c.post("/v1.0/user/groups/strict/action", json=body, headers=bearer("groups-strict")))
+                    .status_code for body in ({}, {"on": "false"}, {"on": 0}, {"on": None}, {"on": False})]
+
+    assert asyncio.run(scenario()) == [400, 400, 400, 400, 200]
+
+
+def test_plan_is_rebuilt_after_group_or_device_changes():
+    owner = "groups-cache"
+    for device_id in ("cache-a", "cache-b"):
+        relay(owner, device_id)
+    key = group_key(owner, "cached")
+
+    async def scenario():
+        def run():
+            return group_engine.execute(owner, "cached", False, timeout=0.05)
+
+        compiled = []
+        save_group(owner, "cached", "Кэш", ["cache-a", "cache-b"])
+        await run()
+        await run()
+        compiled.append(group_engine.compiled)
+        # Состав группы
+        save_group(owner, "cached", "Кэш", ["cache-a"])
+        assert key not in group_engine._plans
+        await run()
+        compiled.append(group_engine.compiled)
+        # Подключение члена группы к воркеру
+        await device_ws_manager.add("cache-a", AckingSocket("cache-a", 0.001))
+        assert key not in group_engine._plans
+        connected = await run()
+        compiled.append(group_engine.compiled)
+        # Смена владельца устройства
+        transfer_device("cache-a", "groups-cache-new")
+        assert key not in group_engine._plans
+        transferred = await run()
+        await device_ws_manager.remove("cache-a")
+        return compiled, connected, transferred
+
+    compiled, connected, transferred = asyncio.run(scenario())
+    assert compiled[1] - compiled[0] == 1 and compiled[2] - compiled[1] == 1
+    assert outcome(connected) == {"cache-a": "DONE"}
+    assert outcome(transferred) == {"cache-a": "DEVICE_NOT_FOUND"}
+
+
+def test_fan_out_reports_each_member():
+    owner = "groups-fan"
+    members = ["fan-json", "fan-bin1", "fan-silent", "fan-offline", "fan-removed"]
+    for device_id in members:
+        relay(owner, device_id)
+    save_group(owner, "fan", "Веер", members)
+    remove_device("fan-removed")
+
+    async def scenario():
+        await device_ws_manager.add("fan-json", AckingSocket("fan-json", 0.001))
+        await device_ws_manager.add("fan-bin1", BinaryDeviceSocket(AckingSocket("fan-bin1", 0.001)))
+        await device_ws_manager.add("fan-silent", SilentSocket())
+        try:
+            return await group_engine.execute(owner, "fan", False, timeout=0.2)
+        finally:
+            for device_id in ("fan-json", "fan-bin1", "fan-silent"):
+                await device_ws_manager.remove(device_id)
+
+    assert outcome(asyncio.run(scenario())) == {
+        "fan-json": "DONE", "fan-bin1": "DONE", "fan-silent": "DEVICE_UNREACHABLE",
+        "fan-offline": "DEVICE_UNREACHABLE", "fan-removed": "DEVICE_NOT_FOUND"}
+    assert DB["devices"]["fan-json"]["state"]["on"] is False
+    assert DB["devices"]["fan-bin1"]["state"]["on"] is False
+    assert DB["devices"]["fan-silent"]["state"]["on"] is True
@@ -0,0 +1,32 @@
+import json
+import logging
+
+from app.logger_module.logging_config import LoggingConfig
+from app.logger_module.structured import JsonFormatter
+from config import LoggingSettings
+
+
+def format_json(**extra) -> dict:
+    record = logging.LogRecord("tests.logging", logging.INFO, __file__, 1, "Token issued", (), None)
+    record.__dict__.update(extra)
+    return json.loads(JsonFormatter().format(record))
+
+
+def test_extra_fields_are_redacted():
+    entry = format_json(auth_token="device-secret", status_code=200,
+                        request={"headers": {"Authorization": "Bearer abc.def"}, "refresh_token": "r-1"},
+                        url="https://api.telegram.org/bot123:AAH-secret/sendMessage")
+    assert entry["auth_token"] == "***"
+    assert entry["status_code"] == 200
+    assert entry["request"] == {"headers": {"Authorization": "Bearer ***"}, "refresh_token": "***"}
+    assert entry["url"] == "https://api.telegram.org/bot***/sendMessage"
+
+
+def test_close_restores_record_flags():
+    before = (logging.logThreads, logging.logProcesses, logging.logMultiprocessing)
+    config = LoggingConfig(LoggingSettings(log_format="json", log_to_console=False, telegram_enabled=False,
+                                           capture_uvicorn=False))
+    config.setup()
+    assert (logging.logThreads, logging.logProcesses, logging.logMultiprocessing) == (False, False, False)
+    config.close()
+    assert (logging.logThreads, logging.logProcesses, logging.logMultiprocessing) == before
@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from app.notifications import StateNotifier
+from benchmarks.state_push import start_stand_in
+from config import NotificationSettings
+
+
+def make_notifier(port: int, **overrides) -> StateNotifier:
+    settings = dict(enabled=True, skill_id="test", oauth_token="t", callback_base=f"http://127.0.0.1:{port}",
+                    window=0.05, backoff=0.001)
+    return StateNotifier(NotificationSettings(**{**settings, **overrides}))
+
+
+def relay(dev_id: str, on: bool, owner_id: str = "user-1") -> dict:
+    return {"id": dev_id, "owner_id": owner_id, "capabilities": ["on_off"], "state": {"on": on}}
+
+
+@pytest.fixture
+def callback():
+    def start(fail_rate: float = 0.0):
+        server, seen, stats = start_stand_in(fail_rate)
+        servers.append(server)
+        return server.server_port, seen, stats
+
+    servers = []
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def test_flapping_is_coalesced_into_one_request(callback):
+    port, seen, stats = callback()
+
+    async def scenario():
+        notifier = make_notifier(port)
+        await notifier.start()
+        for n in range(5):
+            notifier.notify(relay("a", n % 2 == 0))
+            notifier.notify(relay("b", True))
+        await asyncio.sleep(0.2)
+        await notifier.close()
+        return notifier
+
+    notifier = asyncio.run(scenario())
+    assert stats["requests"] == 1  # оба устройства одного пользователя — одним запросом
+    assert notifier.coalesced == 8
+    assert seen == {"a": True, "b": True}
+
+
+def test_state_alice_already_knows_is_not_pushed(callback):
+    port, seen, stats = callback()
+
+    async def scenario():
+        notifier = make_notifier(port)
+        await notifier.start()
+        notifier.known_by_alice(relay("a", True))
+        notifier.notify(relay("a", True))
+        await asyncio.sleep(0.2)
+        await notifier.close()
+
+    asyncio.run(scenario())
+    assert stats["requests"] == 0
+
+
+def test_failed_requests_are_retried_until_delivered(callback):
+    port, seen, stats = callback(fail_rate=0.5)
+
+    async def scenario():
+        notifier = make_notifier(port, max_retries=20)
+        await notifier.start()
+        for n in range(10):
+            notifier.notify(relay(f"d{n}", True, owner_id=f"user-{n}"))
+        await notifier.close()
+        return notifier
+
+    notifier = asyncio.run(scenario())
+    assert notifier.sent == 10 and notifier.failed == 0
+    assert stats["requests"] == 10 + stats["failed"]
+    assert seen == {f"d{n}": True for n in range(10)}
+
+
+def test_gives_up_after_max_retries(callback):
+    port, seen, stats = callback(fail_rate=1.0)
+
+    async def scenario():
+        notifier = make_notifier(port, max_retries=2)
+        await notifier.start()
+        notifier.notify(relay("a", True))
+        await notifier.close()
+        return notifier
+
+    notifier = asyncio.run(scenario())
+    assert stats["requests"] == 3
+    assert notifier.sent == 0 and notifier.failed == 1
+
+
+def test_pushed_states_are_bounded_and_forgotten():
+    notifier = StateNotifier(NotificationSettings(enabled=False, max_tracked=2))
+    notifier.known_by_alice(relay("a", True))
+    assert len(notifier.last_pushed) == 0  # пуш выключен — помнить нечего
+
+    notifier._client = object()  # как после start(), без сети
+    for dev_id in ("a", "b", "c"):
+        notifier.known_by_alice(relay(dev_id, True))
+    assert len(notifier.last_pushed) == 2
+
+    notifier.forget("c")
+    assert len(notifier.last_pushed) == 1
@@ -0,0 +1,130 @@
+import asyncio
+
+import httpx
+
+from app.actions import ON_OFF, on_off_command
+from app.devices import add_device
+from app.main import app
+from app.tokens import token_service
+from app.ws.command_tracker import command_tracker
+from app.ws.offline_queue import offline_queue
+from app.ws.websocket_manager import device_ws_manager
+from config import DB
+
+USER_ID = "offline-user"
+
+
+class DeviceSocket:
+    """Розетка без сети: запоминает команды с id; подтверждает их сама, только если acking."""
+
+    def __init__(self, device_id: str, acking: bool = True):
+        self.device_id = device_id
+        self.acking = acking
+        self.commands: list[dict] = []
+
+    async def send_json(self, data):
+        if "id" not in data:
+            return
+        self.commands.append(data)
+        if self.acking:
+            self.ack(data)
+
+    def ack(self, command: dict):
+        asyncio.get_running_loop().call_soon(command_tracker.resolve, self.device_id,
+                                             {"id": command["id"], "status": "ok"})
+
+    async def send_text(self, data):
+        pass
+
+    async def close(self):
+        pass
+
+
+def relay(device_id: str):
+    DB["users"][USER_ID] = {"id": USER_ID, "name": USER_ID}
+    add_device({"id": device_id, "owner_id": USER_ID, "name": device_id, "kind": "relay",
+                "capabilities": ["on_off"], "state": {"on": False}})
+
+
+def action(device_id: str, on: bool) -> dict:
+    return {"payload": {"devices": [{"id": device_id, "capabilities": [
+        {"type": ON_OFF, "state": {"instance": "on", "value": on}}]}]}}
+
+
+async def wait_for(condition, timeout: float = 5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition() and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(0.01)
+    assert condition()
+
+
+async def post_action(device_id: str, on: bool) -> str:
+    headers = {"Authorization": f"Bearer {token_service.issue_pair(USER_ID, 'my-smart-home')['access_token']}"}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.post("/v1.0/user/devices/action", json=action(device_id, on), headers=headers)
+    cap = response.json()["payload"]["devices"][0]["capabilities"][0]
+    return cap["state"]["action_result"].get("error_code") or cap["state"]["action_result"]["status"]
+
+
+def test_command_queued_offline_is_replayed_on_reconnect():
+    device_id = "offline-replay"
+    relay(device_id)
+
+    async def scenario():
+        assert await post_action(device_id, True) == "DEVICE_UNREACHABLE"
+        ws = DeviceSocket(device_id)
+        await device_ws_manager.add(device_id, ws)
+        await wait_for(lambda: DB["devices"][device_id]["state"]["on"])
+        await device_ws_manager.remove(device_id)
+        return ws
+
+    ws = asyncio.run(scenario())
+    assert [c["action"] for c in ws.commands] == ["turn_on"]
+    assert offline_queue.take(device_id) == []
+
+
+def test_undelivered_replay_is_restored():
+    device_id = "offline-restore"
+    relay(device_id)
+
+    async def scenario():
+        assert await post_action(device_id, True) == "DEVICE_UNREACHABLE"
+        ws = DeviceSocket(device_id, acking=False)
+        await device_ws_manager.add(device_id, ws)
+        await wait_for(lambda: ws.commands)
+        await device_ws_manager.remove(device_id)  # обрыв до ack
+        await asyncio.sleep(0.05)
+
+    asyncio.run(scenario())
+    assert [entry["frame"] for _, entry in offline_queue.take(device_id)] == [on_off_command(True)]
+
+
+def test_replay_superseded_by_acked_command_is_not_restored():
+    device_id = "offline-superseded"
+    relay(device_id)
+
+    async def scenario():
+        # Пока розетка офлайн, её включают — команда ждёт в очереди
+        assert await post_action(device_id, True) == "DEVICE_UNREACHABLE"
+        # Розетка вернулась, досылка turn_on ушла и ждёт ack
+        ws = DeviceSocket(device_id, acking=False)
+        await device_ws_manager.add(device_id, ws)
+        await wait_for(lambda: len(ws.commands) == 1)
+        # Пользователь выключает её, и этот turn_off розетка подтверждает
+        turn_off = asyncio.create_task(post_action(device_id, False))
+        await wait_for(lambda: len(ws.commands) == 2)
+        ws.ack(ws.commands[1])
+        assert await turn_off == "DONE"
+        # Обрыв: досылка turn_on так и не получила ack
+        await device_ws_manager.remove(device_id)
+        await asyncio.sleep(0.05)
+        # Следующее подключение не должно снова включить реле
+        ws = DeviceSocket(device_id)
+        await device_ws_manager.add(device_id, ws)
+        await asyncio.sleep(0.05)
+        await device_ws_manager.remove(device_id)
+        return ws
+
+    ws = asyncio.run(scenario())
+    assert ws.commands == []
+    assert DB["devices"][device_id]["state"]["on"] is False
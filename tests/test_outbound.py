@@ -0,0 +1,124 @@
+import asyncio
+
+from app.devices import add_device
+from app.ws.outbound import OutboundSocket
+from app.ws.websocket_manager import device_ws_manager
+from benchmarks.slow_consumers import HealthySocket, StalledSocket
+
+
+class RecordingSocket:
+    def __init__(self):
+        self.sent: list = []
+
+    async def send_json(self, data):
+        self.sent.append(data)
+
+    async def send_text(self, text):
+        self.sent.append(text)
+
+    async def close(self):
+        pass
+
+
+def test_queue_past_high_water_fails_once_without_blocking():
+    failures = []
+
+    async def on_failure(out):
+        failures.append(out.device_id)
+
+    async def scenario():
+        out = OutboundSocket(StalledSocket(), "stalled", on_failure, high_water=8)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        accepted = [out.put("send_json", {"n": n}) for n in range(20)]
+        elapsed = loop.time() - started
+        await asyncio.sleep(0)
+        await out.close()
+        return accepted, elapsed
+
+    accepted, elapsed = asyncio.run(scenario())
+    # Писатель ещё не запускался: high_water + 1-й кадр переполняет очередь, дальше — отказ
+    assert accepted == [True] * 9 + [False] * 11
+    assert failures == ["stalled"]
+    assert elapsed < 0.1
+
+
+def test_stale_frames_are_coalesced():
+    async def scenario():
+        ws = RecordingSocket()
+
+        async def on_failure(_):
+            raise AssertionError("not expected")
+
+        out = OutboundSocket(ws, "coalesce", on_failure)
+        await out.send_text("ping")
+        await out.send_json({"action": "turn_on"})
+        await out.send_json({"action": "turn_on", "id": "1"})
+        await out.send_text("ping")
+        await out.send_json({"action": "turn_off"})
+        await asyncio.sleep(0.01)
+        await out.close()
+        return ws.sent
+
+    assert asyncio.run(scenario()) == ["ping", {"action": "turn_on", "id": "1"}, {"action": "turn_off"}]
+
+
+def test_stalled_device_is_disconnected_and_healthy_ones_are_not_held():
+    healthy = [f"isolation-ok-{i}" for i in range(50)]
+    stalled = [f"isolation-slow-{i}" for i in range(3)]
+    for dev_id in healthy + stalled:
+        add_device({"id": dev_id, "owner_id": "isolation-user", "name": dev_id, "kind": "relay",
+                    "capabilities": ["on_off"], "state": {"on": False}})
+
+    async def scenario():
+        for dev_id in healthy:
+            await device_ws_manager.add(dev_id, HealthySocket(dev_id, rtt=0.01))
+        for dev_id in stalled:
+            await device_ws_manager.add(dev_id, StalledSocket())
+        stuck = asyncio.create_task(device_ws_manager.command_many({d: {"action": "turn_on"} for d in stalled},
+                                                                   timeout=1.0))
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        errors = await device_ws_manager.command_many({d: {"action": "turn_on"} for d in healthy}, timeout=1.0)
+        elapsed = loop.time() - started
+        errors.update(await stuck)
+        # Поток уведомлений в зависшие розетки: очередь растёт до high-water, и розетку отключают
+        for n in range(1000):
+            for dev_id in stalled:
+                await device_ws_manager.send_personal(dev_id, {"message": n})
+        await asyncio.sleep(0.05)
+        online = {d: device_ws_manager.is_online(d) for d in healthy + stalled}
+        for dev_id in healthy:
+            await device_ws_manager.remove(dev_id)
+        return errors, elapsed, online
+
+    errors, elapsed, online = asyncio.run(scenario())
+    assert all(errors[d] is None for d in healthy)
+    assert all(errors[d] == "DEVICE_UNREACHABLE" for d in stalled)
+    assert elapsed < 0.5  # команды зависшим ждут свой дедлайн, здоровые отвечают за rtt
+    assert all(online[d] for d in healthy)
+    assert not any(online[d] for d in stalled)
+
+
+def test_writer_runs_only_while_frames_are_queued():
+    async def scenario():
+        ws = RecordingSocket()
+
+        async def on_failure(_):
+            raise AssertionError("not expected")
+
+        out = OutboundSocket(ws, "idle", on_failure)
+        idle = out._writer
+        await out.send_json({"n": 1})
+        await out.send_json({"n": 2})
+        busy = out._writer is not None
+        await asyncio.sleep(0.01)
+        drained = out._writer
+        await out.send_text("ping")
+        await asyncio.sleep(0.01)
+        await out.close()
+        return idle, busy, drained, ws.sent
+
+    idle, busy, drained, sent = asyncio.run(scenario())
+    assert idle is None and busy and drained is None
+    assert sent == [{"n": 1}, {"n": 2}, "ping"]
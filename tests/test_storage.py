@@ -0,0 +1,85 @@
+import asyncio
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from app.storage.sqlite_store import DELETED, SQLiteStore
+from app.storage.write_behind import WriteBehindStore
+
+
+class CountingStore(SQLiteStore):
+    def __init__(self):
+        super().__init__(":memory:")
+        self.reads = 0
+
+    def get(self, namespace, key):
+        self.reads += 1
+        return super().get(namespace, key)
+
+
+def test_miss_is_cached():
+    store = CountingStore()
+    devices = WriteBehindStore(store, flush_interval=0).mapping("devices")
+    for _ in range(100):
+        assert "ghost" not in devices
+    assert store.reads == 1
+
+
+def test_write_replaces_cached_miss():
+    store = CountingStore()
+    devices = WriteBehindStore(store, flush_interval=0).mapping("devices")
+    assert "d1" not in devices
+    devices["d1"] = {"id": "d1"}
+    assert devices["d1"] == {"id": "d1"}
+    del devices["d1"]
+    assert "d1" not in devices
+    assert store.reads == 1
+
+
+def test_misses_do_not_evict_hot_keys():
+    store = CountingStore()
+    devices = WriteBehindStore(store, cache_size=10, flush_interval=0, absent_size=10).mapping("devices")
+    devices["hot"] = {"id": "hot"}
+    for i in range(1000):
+        assert f"ghost-{i}" not in devices
+    reads = store.reads
+    assert devices["hot"] == {"id": "hot"}
+    assert store.reads == reads
+
+
+def test_full_scan_refused_on_event_loop():
+    devices = WriteBehindStore(SQLiteStore(":memory:"), flush_interval=0).mapping("devices")
+    devices["d1"] = {"id": "d1"}
+
+    async def scan_on_loop():
+        return len(devices)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(scan_on_loop())
+    assert asyncio.run(asyncio.to_thread(len, devices)) == 1
+    assert devices.items() == [("d1", {"id": "d1"})]
+
+
+def test_miss_read_does_not_wait_for_a_blocked_flush(tmp_path):
+    path = str(tmp_path / "store.db")
+    store = SQLiteStore(path, busy_timeout=2)
+    store.write_batch([("devices", "d1", {"id": "d1"})])
+    # Соседний воркер держит блокировку записи: сброс буфера ждёт её до busy_timeout
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    flush = threading.Thread(target=store.write_batch, args=([("devices", "d2", {"id": "d2"})],))
+    flush.start()
+    time.sleep(0.1)
+    try:
+        started = time.perf_counter()
+        assert store.get("devices", "d1") == {"id": "d1"}
+        assert store.get("devices", "ghost") is DELETED
+        assert time.perf_counter() - started < 0.5
+    finally:
+        other.execute("COMMIT")
+        flush.join()
+        other.close()
+    assert store.get("devices", "d2") == {"id": "d2"}
+    store.close()
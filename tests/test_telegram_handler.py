@@ -0,0 +1,109 @@
+import logging
+import time
+from urllib.parse import parse_qs
+
+import pytest
+
+from app.logger_module.telegram_handler import TelegramLogHandler, error_logger
+from benchmarks.telegram_handler import start_stand_in
+
+
+@pytest.fixture
+def bot_api():
+    server, received = start_stand_in(0.0)
+    yield f"http://127.0.0.1:{server.server_port}", received
+    server.shutdown()
+
+
+def texts(received: list[bytes]) -> list[str]:
+    return [parse_qs(body.decode())["text"][0] for body in received]
+
+
+def make_logger(handler: TelegramLogHandler, name: str) -> logging.Logger:
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    logger.handlers = [handler]
+    return logger
+
+
+def wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_records_are_batched_into_one_message(bot_api):
+    api_base, received = bot_api
+    handler = TelegramLogHandler("123:abc", "42", batch_interval=0.3, api_base=api_base)
+    logger = make_logger(handler, "tests.telegram.batch")
+    for i in range(10):
+        logger.warning(f"record {i}")
+    wait_for(lambda: handler.sent_messages >= 1)
+    handler.close()
+    assert handler.sent_messages == 1
+    [text] = texts(received)
+    assert all(f"record {i}" in text for i in range(10))
+
+
+def test_messages_stay_under_telegram_limit(bot_api):
+    api_base, received = bot_api
+    handler = TelegramLogHandler("123:abc", "42", batch_interval=0.1, max_per_minute=600, api_base=api_base)
+    logger = make_logger(handler, "tests.telegram.limit")
+    for i in range(200):
+        logger.warning(f"{i:04d} " + "x" * 200)
+    handler.close()
+    sent = texts(received)
+    assert len(sent) > 1
+    assert all(len(text) <= TelegramLogHandler.MAX_MESSAGE_LEN for text in sent)
+    assert sum(text.count(" xxx") for text in sent) == 200
+
+
+def test_rate_limit_holds_messages_and_close_drops_the_rest(bot_api):
+    api_base, received = bot_api
+    handler = TelegramLogHandler("123:abc", "42", batch_interval=0.0, max_per_minute=2, shutdown_timeout=0.5,
+                                 api_base=api_base)
+    logger = make_logger(handler, "tests.telegram.rate")
+    for i in range(5):
+        logger.warning("y" * 4000)  # по записи на сообщение
+    wait_for(lambda: handler.sent_messages >= 2)
+    time.sleep(0.3)
+    assert handler.sent_messages == 2  # лимит в минуту выбран, остальное ждёт
+    started = time.monotonic()
+    handler.close()
+    assert time.monotonic() - started < 2
+    assert len(received) == 2
+    assert handler.dropped == 3
+
+
+def test_full_queue_drops_without_blocking(bot_api):
+    api_base, _ = bot_api
+    handler = TelegramLogHandler("123:abc", "42", queue_size=10, batch_interval=1.0, max_per_minute=1,
+                                 shutdown_timeout=0.1, api_base=api_base)
+    logger = make_logger(handler, "tests.telegram.queue")
+    started = time.perf_counter()
+    for i in range(1000):
+        logger.warning(f"record {i}")
+    assert time.perf_counter() - started < 0.5
+    assert handler.dropped > 0
+    assert handler.sent_messages <= 1
+    handler.close()
+
+
+def test_send_errors_do_not_leak_the_bot_token():
+    records = []
+
+    class Collect(logging.Handler):
+        def emit(self, record):
+            records.append(self.format(record))
+
+    collect = Collect()
+    error_logger.addHandler(collect)
+    try:
+        # Порт 9 никто не слушает: requests бросит ошибку с URL запроса, где есть токен
+        handler = TelegramLogHandler("123:very-secret", "42", batch_interval=0.05, api_base="http://127.0.0.1:9")
+        make_logger(handler, "tests.telegram.leak").warning("record")
+        wait_for(lambda: records)
+        handler.close()
+    finally:
+        error_logger.removeHandler(collect)
+    assert records and not any("very-secret" in r for r in records)
@@ -0,0 +1,150 @@
+import asyncio
+import os
+import time
+
+from fastapi.testclient import TestClient
+
+from app.devices import add_device
+from app.main import app
+from app.telemetry import DAY, TelemetryStore, pick_step, telemetry_store
+from app.tokens import token_service
+from config import DB, TelemetrySettings
+
+POWER = 0  # номер метрики power в METRICS
+
+
+def hour_ago() -> int:
+    """Начало прошлого часа: все его минуты, час и сутки лежат в пределах хранения."""
+    current = int(time.time())
+    return current - current % 3600 - 3600
+
+
+def store(path) -> TelemetryStore:
+    return TelemetryStore(TelemetrySettings(path=str(path)))
+
+
+def test_readings_update_minute_hour_and_day_rollups(tmp_path):
+    base = hour_ago()
+    telemetry = store(tmp_path)
+
+    async def scenario():
+        await telemetry.start()
+        for offset, value in ((10, 1.0), (20, 3.0), (70, 5.0)):
+            assert telemetry.ingest("plug", base + offset, [(POWER, value)]) == 1
+        # До сброса показания лежат только в буфере loop
+        before = await telemetry.query("plug", "power", base, base + 3600, "1m")
+        await telemetry._flush()
+        result = {step: await telemetry.query("plug", "power", base - DAY, base + 3600, step)
+                  for step in ("1m", "1h", "1d")}
+        await telemetry.close()
+        return before, result
+
+    before, result = asyncio.run(scenario())
+    assert before == []
+    assert result["1m"] == [{"ts": base, "count": 2, "avg": 2.0, "min": 1.0, "max": 3.0},
+                            {"ts": base + 60, "count": 1, "avg": 5.0, "min": 5.0, "max": 5.0}]
+    assert result["1h"] == [{"ts": base, "count": 3, "avg": 3.0, "min": 1.0, "max": 5.0}]
+    assert result["1d"] == [{"ts": base - base % DAY, "count": 3, "avg": 3.0, "min": 1.0, "max": 5.0}]
+
+
+def test_late_future_and_non_finite_readings_are_rejected(tmp_path):
+    telemetry = store(tmp_path)
+    s = telemetry.settings
+    current = int(time.time())
+    assert telemetry.ingest("plug", current + s.max_clock_skew + 60, [(POWER, 1.0)]) == 0
+    assert telemetry.ingest("plug", current - (s.max_age_days + 1) * DAY, [(POWER, 1.0)]) == 0
+    assert telemetry.ingest("plug", current, [(POWER, float("nan")), (POWER, float("inf"))]) == 0
+    # Старше срока хранения сырых, но в пределах max_age — только в часовые и суточные
+    late = current - (s.raw_retention_days + 2) * DAY
+    assert telemetry.ingest("plug", late, [(POWER, 7.0)]) == 1
+
+    async def scenario():
+        await telemetry._flush()
+        minute = await telemetry.query("plug", "power", late - 60, late + 60, "1m")
+        hour = await telemetry.query("plug", "power", late - 3600, late + 3600, "1h")
+        await telemetry.close()
+        return minute, hour
+
+    minute, hour = asyncio.run(scenario())
+    assert minute == []
+    assert [(p["count"], p["avg"]) for p in hour] == [(1, 7.0)]
+
+
+def test_retention_drops_raw_and_minute_files_only(tmp_path):
+    telemetry = store(tmp_path)
+    telemetry.settings.raw_retention_days = 30
+    old = int(time.time()) - 10 * DAY
+    assert telemetry.ingest("plug", old, [(POWER, 2.0)]) == 1
+
+    async def scenario():
+        await telemetry._flush()
+        raw_files = sorted(os.listdir(telemetry.raw.dir))
+        telemetry.settings.raw_retention_days = 7
+        await telemetry._sweep()
+        result = (raw_files, sorted(os.listdir(telemetry.raw.dir)),
+                  await telemetry.query("plug", "power", old - 60, old + 60, "1m"),
+                  await telemetry.query("plug", "power", old - 3600, old + 3600, "1h"))
+        await telemetry.close()
+        return result
+
+    raw_before, raw_after, minute, hour = asyncio.run(scenario())
+    assert raw_before == [f"{old // DAY}.{suffix}" for suffix in ("dev", "met", "ts", "val")]
+    assert raw_after == []
+    assert minute == []
+    assert [p["count"] for p in hour] == [1]
+
+
+def test_workers_write_own_directories_and_queries_merge_them(tmp_path):
+    base = hour_ago()
+    first, second = store(tmp_path), store(tmp_path)
+
+    async def scenario():
+        await first.start()
+        await second.start()
+        # Устройство переподключилось к другому воркеру; у второго ещё и своё устройство
+        first.ingest("plug", base + 10, [(POWER, 1.0)])
+        second.ingest("other", base + 5, [(POWER, 100.0)])
+        second.ingest("plug", base + 20, [(POWER, 5.0)])
+        await first._flush()
+        await second._flush()
+        merged = [await w.query("plug", "power", base, base + 60, "1m") for w in (first, second)]
+        dirs = first.dir, second.dir
+        await first.close()
+        await second.close()
+        # Перезапуск берёт первый свободный подкаталог и видит историю обоих
+        await first.start()
+        reopened = first.dir, await first.query("plug", "power", base, base + 60, "1m")
+        await first.close()
+        return merged, dirs, reopened
+
+    merged, dirs, reopened = asyncio.run(scenario())
+    expected = [{"ts": base, "count": 2, "avg": 3.0, "min": 1.0, "max": 5.0}]
+    assert merged == [expected, expected]
+    assert [os.path.basename(d) for d in dirs] == ["w0", "w1"]
+    assert reopened == (dirs[0], expected)
+
+
+def test_step_is_picked_by_range_width():
+    assert pick_step(2 * DAY) == "1m"
+    assert pick_step(2 * DAY + 1) == "1h"
+    assert pick_step(90 * DAY) == "1h"
+    assert pick_step(90 * DAY + 1) == "1d"
+
+    user_id, device_id = "telemetry-user", "telemetry-plug"
+    DB["users"][user_id] = {"id": user_id, "name": user_id}
+    add_device({"id": device_id, "owner_id": user_id, "name": device_id, "kind": "socket",
+                "capabilities": ["on_off"], "state": {"on": False}})
+    base = hour_ago()
+    telemetry_store.ingest(device_id, base + 30, [(POWER, 4.0)])
+    asyncio.run(telemetry_store._flush())
+    headers = {"Authorization": f"Bearer {token_service.issue_pair(user_id, 'my-smart-home')['access_token']}"}
+    client = TestClient(app)
+    url = f"/v1.0/user/devices/{device_id}/telemetry"
+
+    hourly = client.get(url, params={"from": base, "to": base + 3600}, headers=headers).json()
+    assert hourly["step"] == "1m" and [p["avg"] for p in hourly["points"]] == [4.0]
+    monthly = client.get(url, params={"from": base - 30 * DAY, "to": base + 3600}, headers=headers).json()
+    assert monthly["step"] == "1h" and [p["ts"] for p in monthly["points"]] == [base]
+    too_wide = client.get(url, params={"from": base - 30 * DAY, "to": base + 3600, "step": "1m"}, headers=headers)
+    assert too_wide.status_code == 400
+    asyncio.run(telemetry_store.close())
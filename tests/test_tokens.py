@@ -0,0 +1,68 @@
+import pytest
+
+from app import tokens
+from app.tokens import TokenService
+from config import ACCESS_TTL, AUTH_CODE_TTL, REFRESH_TTL, access_tokens, auth_codes, refresh_tokens
+
+
+@pytest.fixture
+def service():
+    return TokenService({"access": access_tokens, "refresh": refresh_tokens, "code": auth_codes})
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    current = [1_000_000]
+    monkeypatch.setattr(tokens, "now", lambda: current[0])
+    return current
+
+
+def test_access_token_validates_until_expiry(service, clock):
+    pair = service.issue_pair("user-t", "client")
+    assert pair["expires_in"] == ACCESS_TTL
+    assert service.user_id(pair["access_token"]) == "user-t"
+    assert service.user_id("forged") is None
+    clock[0] += ACCESS_TTL + 1
+    assert service.user_id(pair["access_token"]) is None
+
+
+def test_code_is_single_use_and_bound_to_client(service, clock):
+    code = service.issue_code("user-t", "client", "https://example/cb")
+    assert service.consume_code(code, "other-client") is None
+    assert service.consume_code(code, "client") is None  # первое предъявление уже сожгло код
+    code = service.issue_code("user-t", "client", "https://example/cb")
+    assert service.consume_code(code, "client")["user_id"] == "user-t"
+    assert service.consume_code(code, "client") is None
+    code = service.issue_code("user-t", "client", "https://example/cb")
+    clock[0] += AUTH_CODE_TTL + 1
+    assert service.consume_code(code, "client") is None
+
+
+def test_refresh_rotates_the_pair(service, clock):
+    pair = service.issue_pair("user-t", "client")
+    assert service.rotate(pair["refresh_token"], "other-client") is None
+    rotated = service.rotate(pair["refresh_token"], "client")
+    assert service.user_id(rotated["access_token"]) == "user-t"
+    assert service.rotate(pair["refresh_token"], "client") is None  # старый refresh больше не действует
+    clock[0] += REFRESH_TTL + 1
+    assert service.rotate(rotated["refresh_token"], "client") is None
+
+
+def test_sweep_removes_expired_records_in_expiry_order(service, clock):
+    early = [service.issue_pair(f"user-{i}", "client") for i in range(3)]
+    clock[0] += 10
+    late = [service.issue_pair(f"user-{i}", "client") for i in range(3)]
+    assert len(service) == 12
+
+    assert service.sweep(100) == 0  # ещё ничего не истекло
+    clock[0] += ACCESS_TTL  # истекли access первой пачки, но не второй
+    assert service.sweep(2) == 2  # не больше limit за проход
+    assert service.sweep(100) == 1
+    assert all(pair["access_token"] not in access_tokens for pair in early)
+    assert all(pair["access_token"] in access_tokens for pair in late)
+    assert all(pair["refresh_token"] in refresh_tokens for pair in early)
+
+    clock[0] += REFRESH_TTL
+    assert service.sweep(100) == 9
+    assert len(service) == 0 and service.swept == 12
+    assert not any(pair["refresh_token"] in refresh_tokens for pair in early + late)
@@ -0,0 +1,28 @@
+import pytest
+from fastapi import status
+from starlette.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.main import app
+
+
+def refusal(first_frame: dict) -> tuple[dict, int]:
+    client = TestClient(app)
+    with client.websocket_connect("/ws/socket-1/connect") as ws:
+        ws.send(first_frame)
+        message = ws.receive_json()
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_text()
+    return message, closed.value.code
+
+
+def test_binary_auth_frame_is_refused_cleanly():
+    message, code = refusal({"type": "websocket.receive", "bytes": b'{"auth_token": "abc123"}'})
+    assert code == status.WS_1003_UNSUPPORTED_DATA
+    assert "auth_token" in message["message"]
+
+
+def test_malformed_auth_frame_is_a_wrong_token():
+    message, code = refusal({"type": "websocket.receive", "text": "not json"})
+    assert code == status.WS_1008_POLICY_VIOLATION
+    assert message == {"message": "Неверный auth_token"}